@@ -0,0 +1,94 @@
+"""Compare loading drivers one ORM object at a time with the bulk importer.
+
+Run with::
+
+    python -m benchmarks.bulk_import --drivers 50000
+"""
+
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from whatsapp_ride_service.bulk_import import BulkImporter, read_records
+from whatsapp_ride_service.models import Base, Driver
+
+
+def write_fleet(path, drivers, rng):
+    """Write a fleet CSV with a few duplicate and malformed rows mixed in."""
+    with open(path, "w", newline="") as target:
+        writer = csv.writer(target)
+        writer.writerow(
+            ["name", "phone_number", "current_latitude", "current_longitude"]
+        )
+        for i in range(drivers):
+            phone = f"+1 555 {i:07d}"
+            if i % 500 == 1:
+                phone = f"+1 555 {i - 1:07d}"
+            elif i % 1000 == 7:
+                phone = "unknown"
+            writer.writerow(
+                [
+                    f"Driver {i}",
+                    phone,
+                    40.6 + rng.random() * 0.3,
+                    -74.1 + rng.random() * 0.3,
+                ]
+            )
+
+
+def fresh_engine(directory, name):
+    engine = create_engine(f"sqlite:///{os.path.join(directory, name)}")
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def load_one_by_one(engine, path):
+    """The previous approach: add and commit one Driver per record."""
+    session = sessionmaker(bind=engine)()
+    for record in read_records(path):
+        driver = Driver(
+            name=record["name"],
+            phone_number=record["phone_number"].replace(" ", ""),
+            current_latitude=float(record["current_latitude"]),
+            current_longitude=float(record["current_longitude"]),
+        )
+        session.add(driver)
+        try:
+            session.commit()
+        except Exception:
+            session.rollback()
+    session.close()
+
+
+def main():
+    """Load the same fleet file both ways."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--drivers", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=1_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "fleet.csv")
+        write_fleet(path, args.drivers, random.Random(42))
+
+        start = time.perf_counter()
+        load_one_by_one(fresh_engine(directory, "orm.db"), path)
+        elapsed = time.perf_counter() - start
+        print(f"one by one: {args.drivers / elapsed:10,.0f} rows/s")
+
+        importer = BulkImporter(
+            fresh_engine(directory, "bulk.db"), batch_size=args.batch_size
+        )
+        report = importer.import_drivers(read_records(path))
+        print(f"bulk:       {report.rows_per_second:10,.0f} rows/s")
+        print(f"            {report.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Simulate time-to-match for different dispatch strategies.
+
+Each simulated driver either ignores an offer or accepts it after a random
+delay. The baseline strategy mirrors the old behaviour: one driver, waiting
+for the whole request timeout. Run with::
+
+    python -m benchmarks.dispatch_simulation --rides 2000
+"""
+
+import argparse
+import random
+import statistics
+
+from whatsapp_ride_service.config import Config
+from whatsapp_ride_service.dispatch import Candidate, Dispatcher
+
+
+def simulate(rides, candidates_per_ride, accept_rate, wave_size, wave_timeout, seed):
+    """Return (time-to-match samples, waits of unmatched rides) for one strategy."""
+    rng = random.Random(seed)
+    samples = []
+    unmatched = []
+
+    for ride_id in range(rides):
+        now = [0.0]
+        offers = []
+        dispatcher = Dispatcher(
+            notify=lambda _ride, candidate, _ctx: offers.append(candidate),
+            wave_size=wave_size,
+            wave_timeout=wave_timeout,
+            clock=lambda: now[0],
+        )
+        behaviour = {
+            i: rng.expovariate(1 / 20) if rng.random() < accept_rate else None
+            for i in range(candidates_per_ride)
+        }
+        candidates = [Candidate(i, "", float(i)) for i in range(candidates_per_ride)]
+
+        accepts = []
+        seen = 0
+        dispatcher.start(ride_id, candidates)
+        while True:
+            for candidate in offers[seen:]:
+                delay = behaviour[candidate.driver_id]
+                if delay is not None:
+                    accepts.append(now[0] + delay)
+            seen = len(offers)
+
+            deadline = dispatcher.next_deadline()
+            first_accept = min(accepts) if accepts else None
+            if first_accept is not None and (
+                deadline is None or first_accept < deadline
+            ):
+                samples.append(first_accept)
+                break
+            if deadline is None:
+                unmatched.append(now[0])
+                break
+            now[0] = deadline
+            dispatcher.tick()
+
+    return samples, unmatched
+
+
+def main():
+    """Run the simulation and print a comparison table."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rides", type=int, default=1000)
+    parser.add_argument("--accept-rate", type=float, default=0.4)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    timeout = Config.RIDE_REQUEST_TIMEOUT_MINUTES * 60
+    strategies = [
+        ("single driver (baseline)", 1, 1, timeout),
+        ("sequential cascade", Config.DISPATCH_MAX_CANDIDATES, 1, 30),
+        (
+            "parallel waves",
+            Config.DISPATCH_MAX_CANDIDATES,
+            Config.DISPATCH_WAVE_SIZE,
+            Config.DISPATCH_WAVE_TIMEOUT_SECONDS,
+        ),
+    ]
+
+    print(
+        f"{'strategy':<26}{'matched':>9}{'median s':>10}{'p90 s':>9}"
+        f"{'mean wait s':>13}"
+    )
+    for name, candidates, wave_size, wave_timeout in strategies:
+        samples, unmatched = simulate(
+            args.rides, candidates, args.accept_rate, wave_size, wave_timeout, args.seed
+        )
+        matched = len(samples) / args.rides
+        median = statistics.median(samples) if samples else float("nan")
+        p90 = (
+            statistics.quantiles(samples, n=10)[-1]
+            if len(samples) > 1
+            else float("nan")
+        )
+        # Riders who were never matched still waited until dispatch gave up
+        mean_wait = statistics.mean(samples + unmatched)
+        print(f"{name:<26}{matched:>9.1%}{median:>10.1f}{p90:>9.1f}{mean_wait:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
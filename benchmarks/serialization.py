@@ -0,0 +1,115 @@
+"""Compare the /user/rides body built from ORM objects with compiled serializers.
+
+Run with::
+
+    python -m benchmarks.serialization --rides 5000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from whatsapp_ride_service import serializers
+from whatsapp_ride_service.database_ops import DatabaseOps
+from whatsapp_ride_service.models import Base, Ride, RideStatus, User
+from whatsapp_ride_service.serializers import RIDE
+
+
+def seed(engine, rides, rng):
+    """Insert one rider with ``rides`` rides."""
+    start = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(User.__table__).values(
+                id=1,
+                name="Rider",
+                email="r@example.com",
+                phone_number="+15550000001",
+                password_hash="x",
+            )
+        )
+        connection.execute(
+            insert(Ride.__table__),
+            [
+                {
+                    "user_id": 1,
+                    "pickup_latitude": 40.6 + rng.random() * 0.3,
+                    "pickup_longitude": -74.1 + rng.random() * 0.3,
+                    "dropoff_latitude": 40.6 + rng.random() * 0.3,
+                    "dropoff_longitude": -74.1 + rng.random() * 0.3,
+                    "status": RideStatus.COMPLETED,
+                    "created_at": start + timedelta(minutes=i),
+                }
+                for i in range(rides)
+            ],
+        )
+
+
+def orm_body(session):
+    """The previous path: ORM objects, a dict per ride and ``jsonify``."""
+    rides = DatabaseOps(session).get_user_rides(1)
+    return jsonify(
+        {
+            "rides": [
+                {
+                    "id": ride.id,
+                    "pickup_latitude": ride.pickup_latitude,
+                    "pickup_longitude": ride.pickup_longitude,
+                    "dropoff_latitude": ride.dropoff_latitude,
+                    "dropoff_longitude": ride.dropoff_longitude,
+                    "status": ride.status,
+                    "driver_id": ride.driver_id,
+                    "created_at": str(ride.created_at),
+                }
+                for ride in rides
+            ]
+        }
+    ).get_data()
+
+
+def row_body(session):
+    """Core rows through the compiled ``RIDE`` serializer."""
+    rows = DatabaseOps(session).get_user_ride_rows(1)
+    return serializers.json_response({"rides": RIDE.many(rows)}).get_data()
+
+
+def timed(build, engine, repeat):
+    """Return the mean milliseconds per body, each built in a fresh session."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        with Session(engine) as session:
+            build(session)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    """Build the same ride history body three ways."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rides", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    seed(engine, args.rides, random.Random(42))
+
+    with Flask(__name__).app_context():
+        orm = timed(orm_body, engine, args.repeat)
+        print(f"orm + jsonify:     {orm:8.1f} ms")
+        with mock.patch.object(serializers, "orjson", None):
+            stdlib = timed(row_body, engine, args.repeat)
+        print(f"rows + json:       {stdlib:8.1f} ms ({orm / stdlib:.1f}x)")
+        if serializers.orjson is not None:
+            fast = timed(row_body, engine, args.repeat)
+            print(f"rows + orjson:     {fast:8.1f} ms ({orm / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Measure cold start: importing the package and building the app.
+
+Each run is a fresh interpreter started with ``python -X importtime``, so
+the numbers include every module the app pulls in. Run with::
+
+    python -m benchmarks.startup --runs 5
+
+Pass ``--legacy`` to time importing the ``whatsapp_ride_service.app``
+module instead, with a ``config`` module built from ``TestingConfig``.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STARTUP = "from whatsapp_ride_service import create_app; create_app()"
+LEGACY_STARTUP = "import whatsapp_ride_service.app"
+# The legacy module imports its settings as a top-level ``config`` module
+LEGACY_FILES = {
+    "config.py": (
+        "import os\n"
+        "from whatsapp_ride_service.config import TestingConfig as _Config\n"
+        "globals().update({k: getattr(_Config, k) for k in dir(_Config) if k.isupper()})\n"
+        'DATABASE_URL = os.environ["DATABASE_URL"]\n'
+    )
+}
+
+
+class ImportTime(NamedTuple):
+    """One line of ``-X importtime`` output, in microseconds."""
+
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(stderr: str) -> List[ImportTime]:
+    """Parse the ``import time:`` lines a ``-X importtime`` run writes."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        name = module.lstrip()
+        depth = (len(module) - len(name) - 1) // 2
+        imports.append(ImportTime(name, int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def run_startup(
+    code: str = STARTUP,
+    env: Optional[Dict[str, str]] = None,
+    files: Optional[Dict[str, str]] = None,
+):
+    """Start the app in a fresh interpreter on an in-memory database.
+
+    Args:
+        code: Python source run by the interpreter.
+        env: Extra environment variables, e.g. settings read by the config.
+        files: Contents of files to create in the working directory, by name.
+
+    Returns:
+        ``(wall_seconds, imports)`` for the run.
+    """
+    env = dict(os.environ, DATABASE_URL="sqlite://", PYTHONPATH=ROOT, **(env or {}))
+    with tempfile.TemporaryDirectory() as directory:
+        for name, content in (files or {}).items():
+            with open(os.path.join(directory, name), "w") as f:
+                f.write(content)
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=directory,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        elapsed = time.perf_counter() - start
+    return elapsed, parse_importtime(result.stderr)
+
+
+def main():
+    """Report start-up wall time and the slowest top-level imports."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--legacy", action="store_true")
+    args = parser.parse_args()
+
+    startup = (LEGACY_STARTUP, None, LEGACY_FILES) if args.legacy else (STARTUP,)
+    walls = []
+    for _ in range(args.runs):
+        elapsed, imports = run_startup(*startup)
+        walls.append(elapsed)
+    total = sum(i.self_us for i in imports)
+
+    print(f"startup:  {statistics.median(walls) * 1000:8.1f} ms median wall time")
+    print(f"imports:  {total / 1000:8.1f} ms across {len(imports)} modules")
+    top_level = [i for i in imports if i.depth == 0]
+    for item in sorted(top_level, key=lambda i: -i.cumulative_us)[: args.top]:
+        print(f"  {item.cumulative_us / 1000:8.1f} ms  {item.module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Replay Stripe webhook events through the old and the batched pipeline.
+
+Run with::
+
+    python -m benchmarks.stripe_replay --payments 5000
+    python -m benchmarks.stripe_replay --events recorded_events.jsonl
+
+``--events`` takes one Stripe event JSON object per line (for example the
+output of ``stripe events list``); otherwise events are synthesised, with
+a share of them redelivered as Stripe does on retries.
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from whatsapp_ride_service.models import (
+    Base,
+    Driver,
+    Payment,
+    PaymentStatus,
+    Ride,
+    User,
+)
+from whatsapp_ride_service.stripe_events import StripeEventConsumer, record_event
+
+
+def synthesise_events(payments, redelivery_rate, rng):
+    """Return succeeded events for every payment, some of them twice."""
+    events = []
+    for index in range(payments):
+        event = {
+            "id": f"evt_{index}",
+            "type": "payment_intent.succeeded",
+            "data": {"object": {"id": f"pi_{index}"}},
+        }
+        events.append(event)
+        if rng.random() < redelivery_rate:
+            events.append(event)
+    rng.shuffle(events)
+    return events
+
+
+def seed(Session, intent_ids):
+    """Create one pending payment per PaymentIntent id."""
+    session = Session()
+    user = User(
+        name="Rider", email="r@example.com", phone_number="+1", password_hash=""
+    )
+    driver = Driver(name="Driver", phone_number="+2")
+    session.add_all([user, driver])
+    session.flush()
+    for intent_id in intent_ids:
+        ride = Ride(
+            user_id=user.id,
+            driver_id=driver.id,
+            pickup_latitude=0,
+            pickup_longitude=0,
+            dropoff_latitude=0,
+            dropoff_longitude=0,
+        )
+        session.add(ride)
+        session.flush()
+        session.add(
+            Payment(
+                user_id=user.id,
+                ride_id=ride.id,
+                amount=10.0,
+                stripe_payment_intent_id=intent_id,
+            )
+        )
+    session.commit()
+    session.close()
+
+
+def replay_inline(Session, events):
+    """The previous webhook: one lookup and commit per delivery."""
+    sent = 0
+    for event in events:
+        if event["type"] != "payment_intent.succeeded":
+            continue
+        session = Session()
+        payment = (
+            session.query(Payment)
+            .filter_by(stripe_payment_intent_id=event["data"]["object"]["id"])
+            .first()
+        )
+        if payment:
+            payment.status = PaymentStatus.COMPLETED
+            session.commit()
+            ride = payment.ride
+            sent += len([ride.user.phone_number, ride.driver.phone_number])
+        session.close()
+    return sent
+
+
+def replay_batched(Session, events, batch_size):
+    """Record every delivery as the webhook does, then drain the consumer."""
+    sent = []
+    for event in events:
+        session = Session()
+        record_event(session, event["id"], event["type"], json.dumps(event))
+        session.close()
+    acked = time.perf_counter()
+    consumer = StripeEventConsumer(
+        Session, notify=lambda phone, body: sent.append(phone), batch_size=batch_size
+    )
+    consumer.drain()
+    return acked, len(sent)
+
+
+def run(label, events, intent_ids, replay):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'replay.db')}")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        seed(Session, intent_ids)
+        start = time.perf_counter()
+        result = replay(Session)
+        elapsed = time.perf_counter() - start
+        engine.dispose()
+    print(f"{label:8} {len(events) / elapsed:10,.0f} events/s  {result}")
+
+
+def main():
+    """Replay the same deliveries through both implementations."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", help="JSONL file of recorded Stripe events")
+    parser.add_argument("--payments", type=int, default=5_000)
+    parser.add_argument("--redelivery-rate", type=float, default=0.2)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.events:
+        with open(args.events) as recorded:
+            events = [json.loads(line) for line in recorded if line.strip()]
+    else:
+        rng = random.Random(42)
+        events = synthesise_events(args.payments, args.redelivery_rate, rng)
+    intent_ids = sorted(
+        {
+            event["data"]["object"]["id"]
+            for event in events
+            if event["type"].startswith("payment_intent.")
+        }
+    )
+    print(f"{len(events)} deliveries for {len(intent_ids)} payments")
+
+    run(
+        "inline",
+        events,
+        intent_ids,
+        lambda Session: f"{replay_inline(Session, events)} messages",
+    )
+
+    def batched(Session):
+        start = time.perf_counter()
+        acked, sent = replay_batched(Session, events, args.batch_size)
+        return f"{sent} messages, acked in {acked - start:.2f}s"
+
+    run("batched", events, intent_ids, batched)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Measure surge engine event throughput.
+
+Run with::
+
+    python -m benchmarks.surge_events --events 200000
+"""
+
+import argparse
+import random
+import time
+
+from whatsapp_ride_service.surge import SurgeEngine
+
+
+def main():
+    """Feed random requests and driver moves through the engine."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--drivers", type=int, default=5_000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    engine = SurgeEngine()
+    points = [
+        (40.6 + rng.random() * 0.3, -74.1 + rng.random() * 0.3) for _ in range(10_000)
+    ]
+
+    start = time.perf_counter()
+    for i in range(args.events):
+        latitude, longitude = points[i % len(points)]
+        if i % 2:
+            engine.record_request(latitude, longitude)
+        else:
+            engine.update_driver(i % args.drivers, latitude, longitude)
+    elapsed = time.perf_counter() - start
+
+    recompute_start = time.perf_counter()
+    multipliers = engine.recompute()
+    recompute_elapsed = time.perf_counter() - recompute_start
+
+    lookups = 100_000
+    lookup_start = time.perf_counter()
+    for i in range(lookups):
+        engine.multiplier(*points[i % len(points)])
+    lookup_elapsed = time.perf_counter() - lookup_start
+
+    print(f"events:    {args.events / elapsed:,.0f}/s")
+    print(
+        f"recompute: {recompute_elapsed * 1000:.1f} ms ({len(multipliers)} surging cells)"
+    )
+    print(f"lookups:   {lookups / lookup_elapsed:,.0f}/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ from tests import config
 from whatsapp_ride_service.models import Base, Driver, Payment, Ride, User
 from whatsapp_ride_service import create_app
 from whatsapp_ride_service.auth import UserManager
+from whatsapp_ride_service.phones import PhoneDirectory
 import json
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -29,10 +30,14 @@ class TestApp(unittest.TestCase):
         Session = sessionmaker(bind=cls.engine)
         cls.session = Session()
         cls.app.db_session = cls.session
+        cls.app.phone_directory.disconnect()
+        cls.app.phone_directory = PhoneDirectory(Session)
+        cls.app.phone_directory.connect()
 
     @classmethod
     def tearDownClass(cls):
         """Clean up test environment after all tests."""
+        cls.app.phone_directory.disconnect()
         cls.session.close()
         Base.metadata.drop_all(cls.engine)
         cls.app_context.pop()
@@ -47,6 +52,8 @@ class TestApp(unittest.TestCase):
             db.query(User).delete()
             db.query(Driver).delete()
             db.commit()
+        self.app.response_cache.clear()
+        self.app.phone_directory.clear()
 
     def create_test_user(self):
         """Create a test user for testing."""
@@ -186,6 +193,168 @@ class TestApp(unittest.TestCase):
         self.assertIn("id", response_data)
         self.assertEqual(response_data["status"], "requested")
 
+    def test_quote_ride(self):
+        """Test fare quote endpoint does not create a ride."""
+        self.create_test_user()
+        auth_response = self.client.post(
+            "/auth/login",
+            data=json.dumps(
+                {"phone_number": "+1234567890", "password": "TestPass123!"}
+            ),
+            content_type="application/json",
+        )
+        token = json.loads(auth_response.data)["token"]
+
+        response = self.client.get(
+            "/rides/quote?pickup_latitude=40.7128&pickup_longitude=-74.0060"
+            "&dropoff_latitude=40.7589&dropoff_longitude=-73.9851",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        json_data = json.loads(response.data)
+        self.assertGreater(json_data["fare"], 5.0)
+        self.assertEqual(json_data["surge_multiplier"], 1.0)
+        self.assertEqual(self.app.db_session.query(Ride).count(), 0)
+
+        response = self.client.get(
+            "/rides/quote?pickup_latitude=40.7128",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_track_ride(self):
+        """Test live tracking endpoints answer from the location hub."""
+        user = self.create_test_user()
+        auth_response = self.client.post(
+            "/auth/login",
+            data=json.dumps(
+                {"phone_number": "+1234567890", "password": "TestPass123!"}
+            ),
+            content_type="application/json",
+        )
+        headers = {"Authorization": f"Bearer {json.loads(auth_response.data)['token']}"}
+
+        response = self.client.get("/rides/99/location", headers=headers)
+        self.assertEqual(response.status_code, 404)
+
+        hub = self.app.location_hub
+        hub.bind_ride(99, driver_id=5, user_id=user.id)
+        hub.publish(5, 40.7128, -74.0060)
+
+        response = self.client.get("/rides/99/location", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        event = json.loads(response.data)
+        self.assertEqual(event["latitude"], 40.7128)
+
+        response = self.client.get("/rides/99/track", headers=headers)
+        self.assertEqual(response.mimetype, "text/event-stream")
+        first_chunk = next(response.response)
+        first_chunk = (
+            first_chunk.decode() if isinstance(first_chunk, bytes) else first_chunk
+        )
+        self.assertTrue(first_chunk.startswith("data: "))
+        response.close()
+        hub.unbind_ride(99)
+
+    def test_complete_ride_as_driver(self):
+        """Test drivers are matched to rides by driver id, not user id."""
+        user = self.create_test_user()
+        driver = Driver(
+            id=user.id + 100,
+            name="Test User",
+            phone_number=user.phone_number,
+            is_available=False,
+        )
+        ride = Ride(
+            user_id=user.id,
+            driver_id=driver.id,
+            pickup_latitude=40.7128,
+            pickup_longitude=-74.0060,
+            dropoff_latitude=40.7589,
+            dropoff_longitude=-73.9851,
+            status="accepted",
+        )
+        self.app.db_session.add_all([driver, ride])
+        self.app.db_session.commit()
+        auth_response = self.client.post(
+            "/auth/login",
+            data=json.dumps(
+                {"phone_number": "+1234567890", "password": "TestPass123!"}
+            ),
+            content_type="application/json",
+        )
+        headers = {"Authorization": f"Bearer {json.loads(auth_response.data)['token']}"}
+
+        response = self.client.post(f"/rides/{ride.id}/complete", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)["status"], "completed")
+        self.assertTrue(self.app.db_session.get(Driver, driver.id).is_available)
+
+    def test_export_rides(self):
+        """Test the admin export streams CSV and requires the admin key."""
+        user = self.create_test_user()
+        ride = Ride(
+            user_id=user.id,
+            pickup_latitude=40.7128,
+            pickup_longitude=-74.0060,
+            dropoff_latitude=40.7589,
+            dropoff_longitude=-73.9851,
+            created_at=datetime(2024, 5, 2),
+        )
+        self.app.db_session.add(ride)
+        self.app.db_session.commit()
+        url = "/admin/exports/rides?start=2024-05-01&end=2024-06-01"
+
+        self.app.config["ADMIN_API_KEY"] = "admin-secret"
+        try:
+            response = self.client.get(url, headers={"X-Admin-Key": "wrong"})
+            self.assertEqual(response.status_code, 403)
+
+            response = self.client.get(url, headers={"X-Admin-Key": "admin-secret"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, "text/csv")
+            lines = response.get_data(as_text=True).splitlines()
+            self.assertEqual(len(lines), 2)
+            self.assertTrue(lines[1].startswith(f"{ride.id},{user.id},"))
+        finally:
+            self.app.config["ADMIN_API_KEY"] = None
+
+    def test_profile_etag(self):
+        """Test cached profiles answer 304 and are refreshed on update."""
+        self.create_test_user()
+        auth_response = self.client.post(
+            "/auth/login",
+            data=json.dumps(
+                {"phone_number": "+1234567890", "password": "TestPass123!"}
+            ),
+            content_type="application/json",
+        )
+        headers = {"Authorization": f"Bearer {json.loads(auth_response.data)['token']}"}
+
+        response = self.client.get("/user/profile", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"]
+
+        response = self.client.get(
+            "/user/profile", headers={**headers, "If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+
+        self.client.put(
+            "/user/profile",
+            data=json.dumps({"name": "Renamed"}),
+            headers=headers,
+            content_type="application/json",
+        )
+        response = self.client.get(
+            "/user/profile", headers={**headers, "If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)["name"], "Renamed")
+        self.assertNotEqual(response.headers["ETag"], etag)
+
     def test_update_profile(self):
         """Test profile update endpoint."""
         # Create test user and get token
@@ -0,0 +1,195 @@
+"""Test suite for ride and payment archiving."""
+
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from whatsapp_ride_service.archive import Archiver
+from whatsapp_ride_service.database_ops import DatabaseOps
+from whatsapp_ride_service.models import (
+    ArchivedPayment,
+    ArchivedRide,
+    Base,
+    Driver,
+    Payment,
+    PaymentStatus,
+    Ride,
+    RideStatus,
+    User,
+)
+
+NOW = datetime(2024, 6, 1)
+
+
+def memory_engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return engine
+
+
+class TestArchiver(unittest.TestCase):
+    """Test cases for moving rides between tiers."""
+
+    def setUp(self):
+        self.engine = memory_engine()
+        session = Session(self.engine)
+        session.add_all(
+            [
+                User(
+                    id=1,
+                    name="Rider",
+                    email="r@example.com",
+                    phone_number="+1",
+                    password_hash="x",
+                ),
+                Driver(id=1, name="Driver", phone_number="+2"),
+            ]
+        )
+        rides = [
+            # (status, age in days, payment status)
+            (RideStatus.COMPLETED, 200, PaymentStatus.COMPLETED),
+            (RideStatus.CANCELLED, 150, None),
+            (RideStatus.COMPLETED, 120, PaymentStatus.PENDING),
+            (RideStatus.IN_PROGRESS, 100, None),
+            (RideStatus.COMPLETED, 10, PaymentStatus.COMPLETED),
+        ]
+        for ride_id, (status, age, payment_status) in enumerate(rides, start=1):
+            created = NOW - timedelta(days=age)
+            session.add(
+                Ride(
+                    id=ride_id,
+                    user_id=1,
+                    driver_id=1,
+                    pickup_latitude=0,
+                    pickup_longitude=0,
+                    dropoff_latitude=0,
+                    dropoff_longitude=0,
+                    status=status,
+                    created_at=created,
+                    completed_at=created,
+                )
+            )
+            if payment_status:
+                session.add(
+                    Payment(
+                        user_id=1,
+                        ride_id=ride_id,
+                        amount=10.0 * ride_id,
+                        status=payment_status,
+                        created_at=created,
+                    )
+                )
+        session.commit()
+        session.close()
+
+    def test_only_settled_terminal_rides_are_archived(self):
+        archiver = Archiver(self.engine, batch_size=1, clock=lambda: NOW)
+        result = archiver.archive(older_than_days=90)
+
+        self.assertEqual((result.rides, result.payments), (2, 1))
+        with Session(self.engine) as session:
+            self.assertEqual(sorted(ride.id for ride in session.query(Ride)), [3, 4, 5])
+            self.assertEqual(
+                sorted(ride.id for ride in session.query(ArchivedRide)), [1, 2]
+            )
+            archived = session.get(ArchivedRide, 1)
+            self.assertEqual(archived.status, RideStatus.COMPLETED)
+            self.assertEqual(archived.payment.amount, 10.0)
+            self.assertEqual(archived.archived_at, NOW)
+
+        self.assertEqual(archiver.archive(older_than_days=90).rides, 0)
+
+    def test_reads_span_both_tiers(self):
+        Archiver(self.engine, clock=lambda: NOW).archive(older_than_days=90)
+
+        with Session(self.engine) as session:
+            ops = DatabaseOps(session)
+            history = ops.get_user_ride_history(1, limit=10)
+            self.assertEqual([ride.id for ride, _ in history], [5, 4, 3, 2, 1])
+            self.assertEqual(history[-1][1].amount, 10.0)
+            self.assertEqual(
+                [ride.id for ride, _ in ops.get_user_ride_history(1, limit=2)], [5, 4]
+            )
+            self.assertEqual(len(ops.get_user_rides(1)), 5)
+            self.assertEqual(len(ops.get_user_payments(1)), 3)
+            self.assertEqual(
+                ops.get_user_stats(1),
+                {"total_rides": 5, "completed_rides": 3, "total_spent": 60.0},
+            )
+
+    def test_rows_left_by_an_interrupted_run_are_not_copied_twice(self):
+        archiver = Archiver(self.engine, clock=lambda: NOW)
+        with self.engine.begin() as connection:
+            ride = connection.execute(select(Ride.__table__).where(Ride.id == 1))
+            archiver._copy(connection, ride.mappings().all(), [])
+
+        self.assertEqual(archiver.archive(older_than_days=90).rides, 2)
+        with Session(self.engine) as session:
+            self.assertEqual(session.query(ArchivedRide).count(), 2)
+            self.assertIsNone(session.get(Ride, 1))
+
+    def test_rides_with_reused_ids_are_skipped_and_reported(self):
+        archiver = Archiver(self.engine, batch_size=1, clock=lambda: NOW)
+        with Session(self.engine) as session:
+            session.add_all(
+                [
+                    ArchivedRide(
+                        id=2,
+                        user_id=1,
+                        pickup_latitude=1,
+                        pickup_longitude=1,
+                        dropoff_latitude=1,
+                        dropoff_longitude=1,
+                        status=RideStatus.COMPLETED,
+                        archived_at=NOW,
+                    ),
+                    # Ride 1's payment id, on another ride
+                    ArchivedPayment(
+                        id=1,
+                        user_id=1,
+                        ride_id=99,
+                        amount=5.0,
+                        status=PaymentStatus.COMPLETED,
+                        archived_at=NOW,
+                    ),
+                ]
+            )
+            session.commit()
+
+        with self.assertLogs("whatsapp_ride_service.archive", "WARNING"):
+            result = archiver.archive(older_than_days=90)
+
+        self.assertEqual((result.rides, result.payments), (0, 0))
+        self.assertEqual(result.skipped, [1, 2])
+        with Session(self.engine) as session:
+            self.assertEqual(session.get(ArchivedRide, 2).pickup_latitude, 1)
+            self.assertIsNone(session.get(ArchivedRide, 1))
+            self.assertEqual(session.query(Ride).count(), 5)
+            self.assertEqual(session.query(Payment).count(), 3)
+
+        # Once the archived rows are sorted out, the next run moves them
+        with Session(self.engine) as session:
+            session.query(ArchivedRide).delete()
+            session.query(ArchivedPayment).delete()
+            session.commit()
+        result = archiver.archive(older_than_days=90)
+        self.assertEqual((result.rides, result.payments, result.skipped), (2, 1, []))
+
+    def test_separate_archive_database(self):
+        archive_engine = create_engine("sqlite://", poolclass=StaticPool)
+        archiver = Archiver(self.engine, archive_engine, clock=lambda: NOW)
+        archiver.create_tables()
+        archiver.archive(older_than_days=90)
+
+        with Session(self.engine) as session, Session(archive_engine) as archive:
+            self.assertEqual(session.query(ArchivedRide).count(), 0)
+            self.assertEqual(archive.query(ArchivedPayment).count(), 1)
+            ops = DatabaseOps(session, archive)
+            self.assertEqual(len(ops.get_user_rides(1)), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
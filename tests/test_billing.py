@@ -0,0 +1,103 @@
+"""Test suite for lazy Stripe customer management."""
+
+import threading
+import time
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from whatsapp_ride_service.billing import CustomerDirectory
+from whatsapp_ride_service.models import Base, User
+
+
+class FakeStripe:
+    """Records customer creations and tracks peak concurrency."""
+
+    def __init__(self):
+        self.created = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def create_customer(self, user):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.created.append(user.id)
+        time.sleep(0.01)
+        with self._lock:
+            self.active -= 1
+        return f"cus_{user.id}"
+
+
+class TestCustomerDirectory(unittest.TestCase):
+    """Test cases for customer creation, caching and backfill."""
+
+    def setUp(self):
+        engine = create_engine(
+            "sqlite://",
+            poolclass=StaticPool,
+            connect_args={"check_same_thread": False},
+        )
+        Base.metadata.create_all(engine)
+        self.Session = sessionmaker(bind=engine)
+        self.stripe = FakeStripe()
+        self.directory = CustomerDirectory(
+            self.Session, create_customer=self.stripe.create_customer
+        )
+
+        session = self.Session()
+        session.add_all(
+            User(
+                name=f"User {index}",
+                email=f"u{index}@example.com",
+                phone_number=f"+1555000{index:04d}",
+                password_hash="x",
+            )
+            for index in range(25)
+        )
+        session.commit()
+        session.close()
+
+    def load_user(self, user_id):
+        session = self.Session()
+        user = session.get(User, user_id)
+        session.close()
+        return user
+
+    def test_customer_is_created_once_and_cached(self):
+        user = self.load_user(1)
+        self.assertEqual(self.directory.customer_id_for(user), "cus_1")
+        self.assertEqual(self.load_user(1).stripe_customer_id, "cus_1")
+
+        # The stale row still has no customer id, but the cache does
+        self.assertEqual(self.directory.customer_id_for(user), "cus_1")
+        self.assertEqual(self.stripe.created, [1])
+
+    def test_existing_customer_is_reused(self):
+        session = self.Session()
+        session.get(User, 2).stripe_customer_id = "cus_existing"
+        session.commit()
+        session.close()
+
+        self.assertEqual(
+            self.directory.customer_id_for(self.load_user(2)), "cus_existing"
+        )
+        self.assertEqual(self.stripe.created, [])
+
+    def test_backfill_uses_bounded_concurrency(self):
+        self.directory.customer_id_for(self.load_user(1))
+
+        created = self.directory.backfill(batch_size=10, max_workers=3)
+
+        self.assertEqual(created, 24)
+        self.assertEqual(sorted(self.stripe.created), list(range(1, 26)))
+        self.assertLessEqual(self.stripe.peak, 3)
+        self.assertEqual(self.directory.cached(25), "cus_25")
+        self.assertEqual(self.directory.backfill(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+"""Test suite for area broadcasts to drivers."""
+
+import os
+import tempfile
+import threading
+import unittest
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from whatsapp_ride_service.broadcast import (
+    Broadcaster,
+    Checkpoint,
+    template_message,
+    text_message,
+)
+from whatsapp_ride_service.messages import TEMPLATES
+from whatsapp_ride_service.models import Base, Driver
+
+
+class FakeClock:
+    """Time source advanced by the fake sleep."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = 0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps += 1
+        self.now += seconds
+
+
+class TestBroadcaster(unittest.TestCase):
+    """Test cases for chunked, paced and resumable broadcasts."""
+
+    def setUp(self):
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        # Ten drivers at the airport, every third one busy, and one downtown
+        drivers = [
+            {
+                "id": i,
+                "name": f"Driver {i}",
+                "phone_number": f"+1555000{i:04d}",
+                "current_latitude": 40.64,
+                "current_longitude": -73.78,
+                "is_available": i % 3 != 0,
+            }
+            for i in range(1, 11)
+        ]
+        drivers.append(
+            {
+                "id": 11,
+                "name": "Downtown",
+                "phone_number": "+5215550000011",
+                "current_latitude": 40.71,
+                "current_longitude": -74.0,
+                "is_available": True,
+            }
+        )
+        with engine.begin() as connection:
+            connection.execute(insert(Driver.__table__), drivers)
+        self.Session = sessionmaker(bind=engine)
+        self.sent = []
+        self.lock = threading.Lock()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "broadcast.json")
+
+    def send(self, phone_number, body):
+        with self.lock:
+            self.sent.append((phone_number, body))
+
+    def broadcaster(self, **kwargs):
+        clock = FakeClock()
+        kwargs.setdefault("messages_per_second", 1000)
+        return Broadcaster(
+            self.Session,
+            self.send,
+            chunk_size=4,
+            clock=clock,
+            sleep=clock.sleep,
+            **kwargs,
+        )
+
+    def test_every_driver_in_the_area_once(self):
+        report = self.broadcaster().broadcast(
+            40.64, -73.78, 3, text_message("High demand at JFK")
+        )
+        self.assertEqual(report.recipients, 10)
+        self.assertEqual(report.sent, 10)
+        self.assertEqual(len({phone for phone, _ in self.sent}), 10)
+
+        self.sent.clear()
+        report = self.broadcaster().broadcast(
+            40.71,
+            -74.0,
+            50,
+            template_message("high_demand", area="JFK"),
+            available_only=True,
+        )
+        self.assertEqual(report.recipients, 8)
+        body = TEMPLATES.render("high_demand", "+5215550000011", area="JFK")
+        self.assertIn(("+5215550000011", body), self.sent)
+        self.assertTrue(body.startswith("¡Alta demanda"))
+
+    def test_resumes_from_the_checkpoint(self):
+        checkpoint = Checkpoint(self.path, Checkpoint.key_for("jfk"))
+
+        def crash(progress):
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.broadcaster().broadcast(
+                40.64, -73.78, 3, text_message("hi"), checkpoint, on_progress=crash
+            )
+        self.assertEqual(checkpoint.load().last_driver_id, 4)
+        self.assertEqual(len(self.sent), 4)
+
+        report = self.broadcaster().broadcast(
+            40.64, -73.78, 3, text_message("hi"), checkpoint
+        )
+        self.assertEqual(report.recipients, 6)
+        self.assertEqual(checkpoint.load().sent, 10)
+        self.assertEqual(len({phone for phone, _ in self.sent}), 10)
+
+        self.assertEqual(
+            self.broadcaster()
+            .broadcast(40.64, -73.78, 3, text_message("hi"), checkpoint)
+            .recipients,
+            0,
+        )
+        other = Checkpoint(self.path, Checkpoint.key_for("lga"))
+        self.assertEqual(other.load().last_driver_id, 0)
+
+    def test_send_rate_is_bounded(self):
+        broadcaster = self.broadcaster(workers=1, messages_per_second=2)
+        report = broadcaster.broadcast(40.64, -73.78, 3, text_message("hi"))
+        # Two sends fit in the initial burst, the other eight wait 0.5s each
+        self.assertEqual(report.sent, 10)
+        self.assertAlmostEqual(report.seconds, 4.0)
+        self.assertEqual(broadcaster.clock.sleeps, 8)
+
+    def test_failed_sends_are_counted(self):
+        def flaky(phone_number, body):
+            if phone_number.endswith("2"):
+                raise RuntimeError("Twilio error")
+
+        broadcaster = self.broadcaster()
+        broadcaster.send = flaky
+        report = broadcaster.broadcast(40.64, -73.78, 3, text_message("hi"))
+        self.assertEqual((report.sent, report.failed), (9, 1))
+
+    def test_failed_drivers_are_retried_by_the_next_run(self):
+        checkpoint = Checkpoint(self.path, Checkpoint.key_for("jfk"))
+        down = {"+15550000002", "+15550000007"}
+
+        def flaky(phone_number, body):
+            if phone_number in down:
+                raise RuntimeError("Twilio error")
+            self.send(phone_number, body)
+
+        broadcaster = self.broadcaster()
+        broadcaster.send = flaky
+        report = broadcaster.broadcast(40.64, -73.78, 3, text_message("hi"), checkpoint)
+        self.assertEqual((report.sent, report.failed), (8, 2))
+        self.assertEqual(checkpoint.load().failed_driver_ids, (2, 7))
+
+        down.discard("+15550000002")
+        self.sent.clear()
+        report = broadcaster.broadcast(40.64, -73.78, 3, text_message("hi"), checkpoint)
+        self.assertEqual((report.recipients, report.sent, report.failed), (2, 1, 1))
+        self.assertEqual(self.sent, [("+15550000002", "hi")])
+        progress = checkpoint.load()
+        self.assertEqual((progress.sent, progress.failed), (9, 1))
+        self.assertEqual(progress.failed_driver_ids, (7,))
+
+        down.clear()
+        broadcaster.broadcast(40.64, -73.78, 3, text_message("hi"), checkpoint)
+        self.assertEqual(checkpoint.load().failed_driver_ids, ())
+        self.assertEqual(
+            broadcaster.broadcast(
+                40.64, -73.78, 3, text_message("hi"), checkpoint
+            ).recipients,
+            0,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
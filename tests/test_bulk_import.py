@@ -0,0 +1,136 @@
+"""Test suite for bulk driver and user imports."""
+
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+import bcrypt
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from whatsapp_ride_service.bulk_import import (
+    BulkImporter,
+    normalize_phone_numbers,
+    read_records,
+)
+from whatsapp_ride_service.models import Base, Driver, User
+
+FLEET_CSV = """name,phone_number,current_latitude,current_longitude,is_available
+Ana,+1 (201) 555-0101,40.71,-74.00,true
+Ben,+12015550102,,,
+Cy,not-a-number,40.7,-74.0,yes
+Dee,+12015550101,40.7,-74.0,no
+,+12015550104,40.7,-74.0,no
+Eve,+12015550105,40.7,-74.0,0
+"""
+
+
+class TestBulkImport(unittest.TestCase):
+    """Test cases for validated batch inserts."""
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://", poolclass=StaticPool)
+        Base.metadata.create_all(self.engine)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(path, "wt") as target:
+            target.write(content)
+        return path
+
+    def test_phone_numbers_are_normalized_per_batch(self):
+        self.assertEqual(
+            normalize_phone_numbers(
+                [
+                    "+1 (201) 555-0101",
+                    "+44 (0)20 7946 0018",
+                    "555",
+                    None,
+                    "+0123",
+                    "+1 (201) 555-0101",
+                ]
+            ),
+            ["+12015550101", "+442079460018", None, None, None, "+12015550101"],
+        )
+
+    def test_drivers_are_inserted_and_problems_reported(self):
+        with Session(self.engine) as session:
+            session.add(Driver(name="Existing", phone_number="+12015550105"))
+            session.commit()
+
+        report = BulkImporter(self.engine, batch_size=2).import_drivers(
+            read_records(self.write("fleet.csv", FLEET_CSV))
+        )
+
+        self.assertEqual(report.inserted, 2)
+        self.assertEqual(report.duplicates, [(4, "+12015550101"), (6, "+12015550105")])
+        self.assertEqual([line for line, _ in report.invalid], [3, 5])
+        with Session(self.engine) as session:
+            drivers = session.query(Driver).order_by(Driver.id).all()
+            self.assertEqual([d.name for d in drivers], ["Existing", "Ana", "Ben"])
+            self.assertTrue(drivers[1].is_available)
+            self.assertFalse(drivers[2].is_available)
+            self.assertIsNone(drivers[2].current_latitude)
+            self.assertIsNotNone(drivers[1].created_at)
+
+    def test_users_from_gzipped_jsonl(self):
+        hashed = bcrypt.hashpw(b"Hashed123!", bcrypt.gensalt(rounds=4)).decode()
+        records = [
+            {
+                "name": "Rider",
+                "email": "rider@example.com",
+                "phone_number": "+12015551301",
+                "password": "TestPass123!",
+            },
+            {
+                "name": "Twin",
+                "email": "rider@example.com",
+                "phone_number": "+12015551302",
+                "password_hash": hashed,
+            },
+            {
+                "name": "NoPass",
+                "email": "n@example.com",
+                "phone_number": "+12015551305",
+            },
+            {
+                "name": "Hashed",
+                "email": "h@example.com",
+                "phone_number": "+12015551303",
+                "password_hash": hashed,
+            },
+            {
+                "name": "BadHash",
+                "email": "b@example.com",
+                "phone_number": "+12015551304",
+                "password_hash": "hash",
+            },
+        ]
+        path = self.write(
+            "riders.jsonl.gz", "".join(json.dumps(r) + "\n" for r in records)
+        )
+
+        report = BulkImporter(self.engine).import_users(read_records(path))
+
+        self.assertEqual(report.inserted, 2)
+        self.assertEqual(report.duplicates, [(2, "rider@example.com")])
+        self.assertEqual(
+            report.invalid, [(3, "missing password"), (5, "invalid password hash")]
+        )
+        with Session(self.engine) as session:
+            rider, imported = session.query(User).order_by(User.id).all()
+            self.assertTrue(rider.check_password("TestPass123!"))
+            self.assertTrue(imported.check_password("Hashed123!"))
+            self.assertFalse(imported.check_password("TestPass123!"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""Test suite for multi-step WhatsApp booking."""
+
+import unittest
+
+from whatsapp_ride_service.conversations import (
+    BookingFlow,
+    Conversation,
+    ConversationStore,
+    Stage,
+)
+from whatsapp_ride_service.pricing import FareQuote
+
+PHONE = "+15550000001"
+QUOTE = FareQuote(12.5, 5.0, 1.0, (0, 0), (1, 1))
+
+
+class FakeClock:
+    """Manually advanced time source."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestConversationStore(unittest.TestCase):
+    """Test cases for per-phone state with inactivity expiry."""
+
+    def test_idle_conversations_expire(self):
+        clock = FakeClock()
+        store = ConversationStore(ttl_seconds=60, clock=clock)
+        store.put("a", Conversation(Stage.PICKUP))
+        clock.now += 30
+        store.put("b", Conversation(Stage.PICKUP))
+        clock.now += 40
+        self.assertIsNone(store.get("a"))
+        self.assertEqual(store.get("b").stage, Stage.PICKUP)
+        self.assertEqual(len(store), 1)
+
+    def test_size_is_bounded(self):
+        store = ConversationStore(max_conversations=2, clock=FakeClock())
+        for phone in "abc":
+            store.put(phone, Conversation(Stage.PICKUP))
+        self.assertIsNone(store.get("a"))
+        self.assertEqual(len(store), 2)
+
+
+class TestBookingFlow(unittest.TestCase):
+    """Test cases for moving a rider through a booking."""
+
+    def setUp(self):
+        self.quotes = []
+        self.booked = []
+        self.flow = BookingFlow(
+            quote=self.quote,
+            book=lambda *ride: self.booked.append(ride) or "Looking for a driver",
+            store=ConversationStore(clock=FakeClock()),
+        )
+
+    def quote(self, pickup, dropoff):
+        self.quotes.append((pickup, dropoff))
+        return QUOTE
+
+    def test_pins_and_typed_coordinates(self):
+        self.assertIn("pick you up", self.flow.handle(PHONE, 1, "Ride"))
+        self.assertIn("pick you up", self.flow.handle(PHONE, 1, "somewhere"))
+        self.assertIn("going", self.flow.handle(PHONE, 1, "", (40.7, -74.0)))
+        reply = self.flow.handle(PHONE, 1, "40.75, -73.98")
+        self.assertIn("$12.50", reply)
+        self.assertEqual(self.quotes, [((40.7, -74.0), (40.75, -73.98))])
+
+        self.assertEqual(self.flow.handle(PHONE, 1, "yes"), "Looking for a driver")
+        self.assertEqual(
+            self.booked, [(PHONE, 1, (40.7, -74.0), (40.75, -73.98), QUOTE)]
+        )
+        self.assertFalse(self.flow.active(PHONE))
+
+    def test_pin_starts_a_booking_and_cancel_ends_it(self):
+        self.assertIsNone(self.flow.handle(PHONE, 1, "hello"))
+        self.flow.handle(PHONE, 1, "", (40.7, -74.0))
+        self.assertEqual(self.flow.store.get(PHONE).pickup, (40.7, -74.0))
+        self.assertEqual(self.flow.handle(PHONE, 1, "cancel"), "Booking cancelled.")
+        self.assertFalse(self.flow.active(PHONE))
+
+    def test_prompts_follow_the_riders_language(self):
+        phone = "+5215550000001"
+        self.assertIn("¿Dónde te recogemos?", self.flow.handle(phone, 1, "ride"))
+        self.flow.handle(phone, 1, "40.7,-74.0")
+        reply = self.flow.handle(phone, 1, "40.75,-73.98")
+        self.assertIn("Tarifa estimada: $12.50", reply)
+        self.assertEqual(self.flow.handle(phone, 1, "cancel"), "Reserva cancelada.")
+
+    def test_one_line_commands_pass_through(self):
+        self.flow.handle(PHONE, 1, "ride")
+        self.assertIsNone(self.flow.handle(PHONE, 1, "ride 40.7,-74.0 to 40.8,-73.9"))
+        self.assertFalse(self.flow.active(PHONE))
+
+        surged = QUOTE._replace(fare=20.0, surge_multiplier=1.6)
+        self.flow.remember_quote(PHONE, (40.7, -74.0), (40.8, -73.9), surged)
+        self.flow.handle(PHONE, 1, "ok")
+        # The confirmed quote is booked as shown, without quoting again
+        self.assertEqual(
+            self.booked, [(PHONE, 1, (40.7, -74.0), (40.8, -73.9), surged)]
+        )
+        self.assertEqual(self.quotes, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
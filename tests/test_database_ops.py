@@ -6,7 +6,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from whatsapp_ride_service.auth import UserManager
 from whatsapp_ride_service.database_ops import DatabaseOps
-from whatsapp_ride_service.models import Base, User, Driver, Ride, Payment
+from whatsapp_ride_service.models import Base, User, Driver, Ride, RideStatus, Payment
 import os
 
 
@@ -190,6 +190,19 @@ class TestDatabaseOps(unittest.TestCase):
         self.assertEqual(updated_driver.current_latitude, new_lat)
         self.assertEqual(updated_driver.current_longitude, new_lng)
 
+    def test_cancelled_ride_can_no_longer_be_claimed(self):
+        user = self.create_test_user()
+        driver = self.create_test_driver()
+        ride = self.create_test_ride(user, driver, status="requested")
+        ride.driver_id = None
+        self.session.commit()
+
+        self.assertEqual(self.db_ops.cancel_unclaimed_ride(ride.id), user.id)
+        self.assertFalse(self.db_ops.claim_ride(ride.id, driver.id))
+        self.assertIsNone(self.db_ops.cancel_unclaimed_ride(ride.id))
+        self.session.refresh(ride)
+        self.assertEqual(ride.status, RideStatus.CANCELLED)
+
 
 if __name__ == "__main__":
     unittest.main()
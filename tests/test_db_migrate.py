@@ -0,0 +1,266 @@
+"""Test suite for versioned schema migrations."""
+
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.pool import StaticPool
+
+from whatsapp_ride_service import db_migrate
+from whatsapp_ride_service.db_migrate import (
+    LATEST_VERSION,
+    current_version,
+    ensure_schema,
+    migrate,
+)
+from whatsapp_ride_service.models import Base
+
+# The schema db_migrate.py used to create from scratch
+LEGACY_SCHEMA = [
+    """CREATE TABLE users (
+        id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL,
+        email VARCHAR(120) NOT NULL UNIQUE, phone_number VARCHAR(20) NOT NULL UNIQUE,
+        password_hash VARCHAR(128) NOT NULL, created_at DATETIME)""",
+    """CREATE TABLE drivers (
+        id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL,
+        phone_number VARCHAR(20) NOT NULL UNIQUE, current_latitude FLOAT,
+        current_longitude FLOAT, is_available BOOLEAN, created_at DATETIME)""",
+    """CREATE TABLE rides (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id),
+        driver_id INTEGER REFERENCES drivers (id), pickup_latitude FLOAT NOT NULL,
+        pickup_longitude FLOAT NOT NULL, dropoff_latitude FLOAT NOT NULL,
+        dropoff_longitude FLOAT NOT NULL, status VARCHAR(11),
+        created_at DATETIME, completed_at DATETIME)""",
+    """CREATE TABLE payments (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id),
+        ride_id INTEGER NOT NULL REFERENCES rides (id), amount FLOAT NOT NULL,
+        status VARCHAR(9), created_at DATETIME, completed_at DATETIME)""",
+]
+
+
+def memory_engine():
+    return create_engine("sqlite://", poolclass=StaticPool)
+
+
+def schema_of(engine):
+    inspector = inspect(engine)
+    return {
+        table: (
+            sorted(column["name"] for column in inspector.get_columns(table)),
+            sorted(
+                (index["name"], index["unique"])
+                for index in inspector.get_indexes(table)
+            ),
+        )
+        for table in inspector.get_table_names()
+        if table != "schema_version"
+    }
+
+
+class TestMigrations(unittest.TestCase):
+    """Test cases for the migration runner."""
+
+    def test_fresh_database_matches_models(self):
+        migrated = memory_engine()
+        self.assertEqual(migrate(migrated), list(range(1, LATEST_VERSION + 1)))
+        self.assertEqual(current_version(migrated), LATEST_VERSION)
+
+        declared = memory_engine()
+        Base.metadata.create_all(declared)
+        self.assertEqual(schema_of(migrated), schema_of(declared))
+
+    def test_legacy_database_is_upgraded_in_place(self):
+        engine = memory_engine()
+        with engine.begin() as connection:
+            for ddl in LEGACY_SCHEMA:
+                connection.execute(text(ddl))
+            connection.execute(
+                text(
+                    "INSERT INTO users (id, name, email, phone_number, password_hash)"
+                    " VALUES (1, 'Rider', 'r@example.com', '+1', 'x')"
+                )
+            )
+            connection.execute(
+                text(
+                    "INSERT INTO rides (id, user_id, pickup_latitude, pickup_longitude,"
+                    " dropoff_latitude, dropoff_longitude, status, completed_at)"
+                    " VALUES (1, 1, 0, 0, 0, 0, 'COMPLETED', '2024-01-01 10:00:00')"
+                )
+            )
+            connection.execute(
+                text(
+                    "INSERT INTO payments (id, user_id, ride_id, amount, status)"
+                    " VALUES (1, 1, 1, 9.5, 'COMPLETED')"
+                )
+            )
+        self.assertIsNone(current_version(engine))
+
+        migrate(engine)
+
+        declared = memory_engine()
+        Base.metadata.create_all(declared)
+        self.assertEqual(schema_of(engine), schema_of(declared))
+        with engine.connect() as connection:
+            completed_at = connection.execute(
+                text("SELECT completed_at FROM payments WHERE id = 1")
+            ).scalar()
+            rider = connection.execute(text("SELECT name FROM users")).scalar()
+        self.assertEqual(completed_at, str(datetime(2024, 1, 1, 10, 0)))
+        self.assertEqual(rider, "Rider")
+
+    def test_migrations_can_stop_at_a_target(self):
+        engine = memory_engine()
+        self.assertEqual(migrate(engine, target=2), [1, 2])
+        self.assertEqual(migrate(engine), list(range(3, LATEST_VERSION + 1)))
+        self.assertEqual(migrate(engine), [])
+
+    def test_phone_numbers_are_normalized(self):
+        engine = memory_engine()
+        migrate(engine, target=9)
+        with engine.begin() as connection:
+            for user_id, phone in enumerate(
+                ("+1 650-253-0000", "+1 (650) 253-0001", "+16502530001", "garbage"),
+                start=1,
+            ):
+                connection.execute(
+                    text(
+                        "INSERT INTO users (id, name, email, phone_number,"
+                        " password_hash) VALUES (:id, 'Rider', :email, :phone, 'x')"
+                    ),
+                    {"id": user_id, "email": f"r{user_id}@example.com", "phone": phone},
+                )
+            connection.execute(
+                text(
+                    "INSERT INTO drivers (id, name, phone_number)"
+                    " VALUES (1, 'Driver', 'whatsapp:+1-650-253-0002')"
+                )
+            )
+
+        with self.assertLogs("whatsapp_ride_service.db_migrate") as logs:
+            migrate(engine)
+        with engine.connect() as connection:
+            users = connection.execute(
+                text("SELECT phone_number FROM users ORDER BY id")
+            ).scalars()
+            driver = connection.execute(text("SELECT phone_number FROM drivers"))
+            self.assertEqual(
+                list(users),
+                ["+16502530000", "+1 (650) 253-0001", "+16502530001", "garbage"],
+            )
+            self.assertEqual(driver.scalar(), "+16502530002")
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("users.id=2", logs.output[0])
+
+    def test_phone_numbers_are_normalized_in_batches(self):
+        engine = memory_engine()
+        migrate(engine)
+        with engine.begin() as connection:
+            for driver_id in range(1, 6):
+                connection.execute(
+                    text(
+                        "INSERT INTO drivers (id, name, phone_number)"
+                        " VALUES (:id, 'Driver', :phone)"
+                    ),
+                    {"id": driver_id, "phone": f"+1 650 253 000{driver_id}"},
+                )
+
+        commits = []
+        event.listen(engine, "commit", lambda conn: commits.append(1))
+        collisions = db_migrate.normalize_phone_numbers(
+            engine, Base.metadata.tables["drivers"], batch_size=2
+        )
+        self.assertEqual(collisions, [])
+        self.assertEqual(len(commits), 4)
+
+    def test_workers_booting_together_migrate_once(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        url = f"sqlite:///{os.path.join(directory.name, 'rides.db')}"
+        start = threading.Barrier(4)
+        errors = []
+
+        def boot():
+            engine = create_engine(url)
+            start.wait()
+            try:
+                ensure_schema(engine)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                engine.dispose()
+
+        workers = [threading.Thread(target=boot) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(30)
+
+        self.assertEqual(errors, [])
+        engine = create_engine(url)
+        with engine.connect() as connection:
+            versions = connection.execute(
+                text("SELECT version FROM schema_version ORDER BY version")
+            ).scalars()
+            self.assertEqual(list(versions), list(range(1, LATEST_VERSION + 1)))
+        engine.dispose()
+
+    def test_backfill_commits_in_batches(self):
+        engine = memory_engine()
+        migrate(engine, target=4)
+        with engine.begin() as connection:
+            connection.execute(
+                text(
+                    "INSERT INTO users (id, name, email, phone_number, password_hash)"
+                    " VALUES (1, 'Rider', 'r@example.com', '+1', 'x')"
+                )
+            )
+            for i in range(1, 8):
+                connection.execute(
+                    text(
+                        "INSERT INTO payments (id, user_id, ride_id, amount, status,"
+                        " created_at) VALUES (:id, 1, 1, 1, 'COMPLETED', :created)"
+                    ),
+                    {"id": i, "created": "2024-01-01 00:00:00"},
+                )
+
+        commits = []
+        event.listen(engine, "commit", lambda conn: commits.append(1))
+        updated = db_migrate.backfill(
+            engine,
+            Base.metadata.tables["payments"],
+            "completed_at = created_at",
+            "completed_at IS NULL",
+            batch_size=3,
+        )
+        self.assertEqual(updated, 7)
+        self.assertEqual(len(commits), 3)
+
+
+class TestEnsureSchema(unittest.TestCase):
+    """Test cases for the startup check."""
+
+    def test_current_schema_is_a_single_query(self):
+        engine = memory_engine()
+        ensure_schema(engine)
+
+        statements = []
+        event.listen(
+            engine,
+            "before_cursor_execute",
+            lambda conn, cursor, statement, *args: statements.append(statement),
+        )
+        ensure_schema(engine)
+        self.assertEqual(len(statements), 1)
+
+    def test_outdated_schema_without_auto_migrate(self):
+        engine = memory_engine()
+        migrate(engine, target=1)
+        with self.assertRaises(RuntimeError):
+            ensure_schema(engine, auto_migrate=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+"""Test suite for cascading dispatch."""
+
+import time
+import unittest
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from whatsapp_ride_service.database_ops import DatabaseOps
+from whatsapp_ride_service.dispatch import Candidate, Dispatcher, rank_drivers
+from whatsapp_ride_service.models import Base, Driver, Ride, RideStatus, User
+
+
+def make_driver(driver_id, latitude, longitude):
+    return SimpleNamespace(
+        id=driver_id,
+        phone_number=f"+1555000{driver_id:04d}",
+        current_latitude=latitude,
+        current_longitude=longitude,
+    )
+
+
+class TestRankDrivers(unittest.TestCase):
+    """Test cases for candidate ranking."""
+
+    def test_ranks_nearest_first_and_drops_far_drivers(self):
+        drivers = [
+            make_driver(1, 40.7300, -74.0060),
+            make_driver(2, 40.7130, -74.0060),
+            make_driver(3, 34.0522, -118.2437),
+            make_driver(4, None, None),
+        ]
+        candidates = rank_drivers(40.7128, -74.0060, drivers, limit=5)
+        self.assertEqual([c.driver_id for c in candidates], [2, 1])
+
+    def test_limit(self):
+        drivers = [make_driver(i, 40.7128 + i * 0.001, -74.0060) for i in range(10)]
+        candidates = rank_drivers(40.7128, -74.0060, drivers, limit=3)
+        self.assertEqual([c.driver_id for c in candidates], [0, 1, 2])
+
+
+class TestDispatcher(unittest.TestCase):
+    """Test cases for wave-based offers."""
+
+    def setUp(self):
+        self.now = 0.0
+        self.offers = []
+        self.exhausted = []
+        self.dispatcher = Dispatcher(
+            notify=lambda ride_id, c, ctx: self.offers.append((ride_id, c.driver_id)),
+            on_exhausted=self.exhausted.append,
+            wave_size=2,
+            wave_timeout=10,
+            clock=lambda: self.now,
+        )
+        self.candidates = [Candidate(i, f"+1555{i}", float(i)) for i in range(5)]
+
+    def test_waves_until_exhausted(self):
+        self.dispatcher.start(7, self.candidates)
+        self.assertEqual(self.offers, [(7, 0), (7, 1)])
+
+        self.now = 5
+        self.dispatcher.tick()
+        self.assertEqual(len(self.offers), 2)
+
+        self.now = 10
+        self.dispatcher.tick()
+        self.assertEqual(self.offers[2:], [(7, 2), (7, 3)])
+
+        self.now = 20
+        self.dispatcher.tick()
+        self.assertEqual(self.offers[4:], [(7, 4)])
+        self.assertTrue(self.dispatcher.was_offered(7, 0))
+
+        self.now = 30
+        self.assertEqual(self.dispatcher.tick(), [7])
+        self.assertEqual(self.exhausted, [7])
+        self.assertFalse(self.dispatcher.was_offered(7, 0))
+
+    def test_settle_stops_further_waves(self):
+        self.dispatcher.start(7, self.candidates)
+        self.dispatcher.settle(7)
+        self.now = 100
+        self.dispatcher.tick()
+        self.assertEqual(len(self.offers), 2)
+        self.assertIsNone(self.dispatcher.next_deadline())
+
+    def test_failed_offers_do_not_stop_dispatch(self):
+        def notify(ride_id, candidate, context):
+            if candidate.driver_id % 2 == 0:
+                raise RuntimeError("Twilio is down")
+            self.offers.append((ride_id, candidate.driver_id))
+
+        def on_exhausted(ride_id):
+            self.exhausted.append(ride_id)
+            raise RuntimeError("database is locked")
+
+        self.dispatcher.notify = notify
+        self.dispatcher.on_exhausted = on_exhausted
+        with self.assertLogs("whatsapp_ride_service.dispatch") as logs:
+            self.dispatcher.start(7, self.candidates)
+            self.dispatcher.start(8, self.candidates[:1])
+            for self.now in (10, 20, 30):
+                self.dispatcher.tick()
+        self.assertEqual(self.offers, [(7, 1), (7, 3)])
+        self.assertEqual(sorted(self.exhausted), [7, 8])
+        self.assertEqual(len(logs.records), 6)
+
+    def test_background_loop_survives_errors(self):
+        ticks = []
+
+        def tick(now=None):
+            # The daemon thread outlives the test, so only fail a few times
+            ticks.append(now)
+            if len(ticks) <= 3:
+                raise RuntimeError("Twilio is down")
+
+        self.dispatcher.tick = tick
+        with self.assertLogs("whatsapp_ride_service.dispatch"):
+            self.dispatcher.run_in_background(interval=0.01)
+            for _ in range(100):
+                if len(ticks) > 3:
+                    break
+                time.sleep(0.01)
+        self.assertGreater(len(ticks), 3)
+        self.assertTrue(self.dispatcher._timer.is_alive())
+
+
+class TestClaimRide(unittest.TestCase):
+    """Test cases for the conditional ride claim."""
+
+    def setUp(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.db_ops = DatabaseOps(self.session)
+
+        user = User(
+            name="Rider", email="r@example.com", phone_number="+1", password_hash="x"
+        )
+        self.drivers = [
+            Driver(name=f"D{i}", phone_number=f"+2{i}", is_available=True)
+            for i in range(2)
+        ]
+        self.session.add_all([user, *self.drivers])
+        self.session.flush()
+        self.rides = [
+            Ride(
+                user_id=user.id,
+                pickup_latitude=0,
+                pickup_longitude=0,
+                dropoff_latitude=0,
+                dropoff_longitude=0,
+                status=RideStatus.REQUESTED,
+            )
+            for _ in range(2)
+        ]
+        self.session.add_all(self.rides)
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_first_accept_wins(self):
+        ride = self.rides[0]
+        self.assertTrue(self.db_ops.claim_ride(ride.id, self.drivers[0].id))
+        self.assertFalse(self.db_ops.claim_ride(ride.id, self.drivers[1].id))
+
+        self.session.refresh(ride)
+        self.assertEqual(ride.driver_id, self.drivers[0].id)
+        self.assertEqual(ride.status, RideStatus.ACCEPTED)
+        self.session.refresh(self.drivers[1])
+        self.assertTrue(self.drivers[1].is_available)
+
+    def test_driver_cannot_take_two_rides(self):
+        driver = self.drivers[0]
+        self.assertTrue(self.db_ops.claim_ride(self.rides[0].id, driver.id))
+        self.assertFalse(self.db_ops.claim_ride(self.rides[1].id, driver.id))
+
+        self.session.refresh(self.rides[1])
+        self.assertIsNone(self.rides[1].driver_id)
+
+    def test_offers_are_recorded_while_the_ride_is_open(self):
+        ride, (first, second) = self.rides[0], self.drivers
+        self.assertTrue(self.db_ops.record_offer(ride.id, first.id))
+        self.assertTrue(self.db_ops.was_offered(ride.id, first.id))
+        self.assertFalse(self.db_ops.was_offered(ride.id, second.id))
+
+        self.assertTrue(self.db_ops.claim_ride(ride.id, first.id))
+        self.assertFalse(self.db_ops.record_offer(ride.id, second.id))
+        self.assertFalse(self.db_ops.was_offered(ride.id, second.id))
+
+
+if __name__ == "__main__":
+    unittest.main()
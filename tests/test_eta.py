@@ -0,0 +1,154 @@
+"""Test suite for road-graph ETA estimation."""
+
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from whatsapp_ride_service.dispatch import rank_drivers
+from whatsapp_ride_service.eta import EtaEstimator, RoadGraph
+
+# A 3x3 grid of nodes ~1.1km apart; node = row * 3 + col
+GRID = [(40.70 + 0.01 * r, -74.00 + 0.01 * c) for r in range(3) for c in range(3)]
+
+OSM_EXTRACT = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="40.70" lon="-74.00"/>
+  <node id="2" lat="40.71" lon="-74.00"/>
+  <node id="3" lat="40.72" lon="-74.00"/>
+  <node id="4" lat="40.80" lon="-74.10"/>
+  <way id="10">
+    <nd ref="1"/><nd ref="2"/><nd ref="3"/>
+    <tag k="highway" v="residential"/>
+    <tag k="maxspeed" v="25 mph"/>
+    <tag k="oneway" v="yes"/>
+  </way>
+  <way id="11">
+    <nd ref="3"/><nd ref="4"/>
+    <tag k="waterway" v="river"/>
+  </way>
+</osm>
+"""
+
+
+def grid_edges(speed=36):
+    edges = []
+    for r in range(3):
+        for c in range(3):
+            node = r * 3 + c
+            if c < 2:
+                edges += [(node, node + 1, speed), (node + 1, node, speed)]
+            if r < 2:
+                edges += [(node, node + 3, speed), (node + 3, node, speed)]
+    return edges
+
+
+class TestRoadGraph(unittest.TestCase):
+    """Test cases for the CSR road graph."""
+
+    def setUp(self):
+        self.graph = RoadGraph.build(GRID, grid_edges())
+
+    def test_shortest_route(self):
+        route = self.graph.route_between(0, 8)
+        self.assertAlmostEqual(route.meters / 1000, 4 * 1.0, delta=0.5)
+        self.assertAlmostEqual(route.seconds, route.meters / 10, delta=1)
+        self.assertEqual(self.graph.route_between(4, 4).seconds, 0)
+
+    def test_routes_are_cached(self):
+        self.graph.route_between(0, 8)
+        self.graph.route_between(0, 8)
+        self.assertEqual(self.graph.route_between.cache_info().hits, 1)
+
+    def test_many_to_one_matches_point_to_point(self):
+        routes = self.graph.routes_to(4, [0, 2, 8])
+        for source in (0, 2, 8):
+            expected = self.graph.route_between(source, 4)
+            self.assertAlmostEqual(routes[source].seconds, expected.seconds, places=3)
+
+    def test_unreachable_nodes(self):
+        graph = RoadGraph.build(GRID[:3], [(0, 1, 30)])
+        self.assertIsNone(graph.route_between(1, 0))
+        self.assertEqual(graph.routes_to(0, [1, 2]), {})
+
+    def test_nearest_node(self):
+        self.assertEqual(self.graph.nearest_node(40.7101, -73.9899), 4)
+        self.assertIsNone(self.graph.nearest_node(0.0, 0.0))
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "city.graph")
+            self.graph.save(path)
+            loaded = RoadGraph.load(path)
+        self.assertEqual(loaded.edge_count, self.graph.edge_count)
+        self.assertEqual(
+            loaded.route_between(0, 8).seconds, self.graph.route_between(0, 8).seconds
+        )
+
+    def test_from_osm(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "city.osm")
+            with open(path, "w") as extract:
+                extract.write(OSM_EXTRACT)
+            graph = RoadGraph.from_osm(path)
+
+        self.assertEqual(graph.node_count, 3)
+        self.assertEqual(graph.edge_count, 2)
+        route = graph.route_between(0, 2)
+        self.assertAlmostEqual(route.seconds, route.meters / (25 * 1.609344 / 3.6), 1)
+        self.assertIsNone(graph.route_between(2, 0))
+
+
+class TestEtaEstimator(unittest.TestCase):
+    """Test cases for the ETA facade."""
+
+    def test_fallback_without_graph(self):
+        estimator = EtaEstimator(fallback_speed_kmh=36, detour_factor=1.5)
+        route = estimator.route(GRID[0], GRID[1])
+        self.assertAlmostEqual(route.meters, 1.5 * 1000 * 0.8435, delta=10)
+        self.assertAlmostEqual(route.seconds, route.meters / 10)
+
+    def test_graph_file_is_read_on_first_use(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "graph.bin")
+            estimator = EtaEstimator.from_file(path)
+            RoadGraph.build(GRID, grid_edges()).save(path)
+            self.assertEqual(estimator.graph.node_count, len(GRID))
+
+    def test_batched_times_match_single_queries(self):
+        estimator = EtaEstimator(RoadGraph.build(GRID, grid_edges()))
+        origins = [GRID[0], GRID[8], (40.7151, -73.9851)]
+        times = estimator.travel_times_to(GRID[4], origins)
+        for origin, seconds in zip(origins, times):
+            self.assertAlmostEqual(
+                seconds, estimator.route(origin, GRID[4]).seconds, places=3
+            )
+
+    def test_dispatch_ranks_by_travel_time(self):
+        # Driver 1 is closer in a straight line but only reachable the long way
+        coordinates = [(40.70, -74.00), (40.70, -73.99), (40.72, -73.99)]
+        edges = [(1, 2, 30), (2, 1, 30), (2, 0, 30), (0, 2, 30)]
+        estimator = EtaEstimator(RoadGraph.build(coordinates, edges))
+        drivers = [
+            SimpleNamespace(
+                id=1,
+                phone_number="+1",
+                current_latitude=40.70,
+                current_longitude=-73.99,
+            ),
+            SimpleNamespace(
+                id=2,
+                phone_number="+2",
+                current_latitude=40.718,
+                current_longitude=-73.99,
+            ),
+        ]
+        straight = rank_drivers(40.70, -74.00, drivers)
+        by_eta = rank_drivers(40.70, -74.00, drivers, eta=estimator)
+        self.assertEqual([c.driver_id for c in straight], [1, 2])
+        self.assertEqual([c.driver_id for c in by_eta], [2, 1])
+        self.assertIsNotNone(by_eta[0].eta_seconds)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""Test suite for streaming ride and payment exports."""
+
+import csv
+import gzip
+import io
+import json
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from whatsapp_ride_service.archive import Archiver
+from whatsapp_ride_service.export import COLUMNS, iter_csv, iter_jsonl_gz, iter_rows
+from whatsapp_ride_service.models import (
+    Base,
+    Payment,
+    PaymentStatus,
+    Ride,
+    RideStatus,
+    User,
+)
+
+MAY = datetime(2024, 5, 1)
+JUNE = datetime(2024, 6, 1)
+
+
+class TestExport(unittest.TestCase):
+    """Test cases for export rows and encoders."""
+
+    def setUp(self):
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        self.engine = engine
+        self.session = Session(engine)
+        self.session.add(
+            User(
+                id=1,
+                name="Rider",
+                email="r@example.com",
+                phone_number="+1",
+                password_hash="x",
+            )
+        )
+        rides = [
+            (MAY - timedelta(days=1), RideStatus.COMPLETED, PaymentStatus.COMPLETED),
+            (MAY, RideStatus.COMPLETED, PaymentStatus.COMPLETED),
+            (MAY + timedelta(days=3), RideStatus.CANCELLED, None),
+            (MAY + timedelta(days=9), RideStatus.COMPLETED, PaymentStatus.FAILED),
+            (JUNE, RideStatus.COMPLETED, PaymentStatus.COMPLETED),
+        ]
+        for ride_id, (created, status, payment_status) in enumerate(rides, start=1):
+            self.session.add(
+                Ride(
+                    id=ride_id,
+                    user_id=1,
+                    pickup_latitude=40.7,
+                    pickup_longitude=-74.0,
+                    dropoff_latitude=40.8,
+                    dropoff_longitude=-73.9,
+                    status=status,
+                    created_at=created,
+                    completed_at=created,
+                )
+            )
+            if payment_status:
+                self.session.add(
+                    Payment(
+                        user_id=1,
+                        ride_id=ride_id,
+                        amount=12.5,
+                        status=payment_status,
+                        created_at=created,
+                    )
+                )
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_date_range_and_filters(self):
+        rows = list(iter_rows(self.session, MAY, JUNE))
+        self.assertEqual([row["ride_id"] for row in rows], [2, 3, 4])
+        self.assertEqual(set(rows[0]), set(COLUMNS))
+        self.assertEqual(rows[0]["ride_status"], "completed")
+        self.assertEqual(rows[0]["ride_created_at"], MAY.isoformat())
+        self.assertIsNone(rows[1]["payment_id"])
+
+        completed = iter_rows(
+            self.session, MAY, JUNE, payment_status=PaymentStatus.COMPLETED
+        )
+        self.assertEqual([row["ride_id"] for row in completed], [2])
+        cancelled = iter_rows(self.session, MAY, JUNE, ride_status=RideStatus.CANCELLED)
+        self.assertEqual([row["ride_id"] for row in cancelled], [3])
+
+    def test_archived_rides_are_included(self):
+        Archiver(self.engine, clock=lambda: JUNE + timedelta(days=100)).archive(90)
+        rows = list(iter_rows(self.session, MAY, JUNE, batch_size=1))
+        self.assertEqual(sorted(row["ride_id"] for row in rows), [2, 3, 4])
+        self.assertTrue(all(row["archived"] for row in rows))
+
+    def test_csv_is_written_in_chunks(self):
+        chunks = list(iter_csv(iter_rows(self.session, MAY, JUNE), chunk_rows=2))
+        self.assertEqual(len(chunks), 2)
+        records = list(csv.DictReader(io.StringIO("".join(chunks))))
+        self.assertEqual([r["ride_id"] for r in records], ["2", "3", "4"])
+        self.assertEqual(records[1]["amount"], "")
+
+    def test_jsonl_is_gzipped(self):
+        data = b"".join(iter_jsonl_gz(iter_rows(self.session, MAY, JUNE)))
+        lines = gzip.decompress(data).decode().splitlines()
+        self.assertEqual([json.loads(line)["ride_id"] for line in lines], [2, 3, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
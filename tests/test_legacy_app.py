@@ -0,0 +1,149 @@
+"""Test suite for the legacy ``whatsapp_ride_service.app`` webhook module."""
+
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+from benchmarks.startup import LEGACY_FILES, ROOT
+
+# Imports the module in a fresh interpreter, with Stripe answering locally
+# but failing the way the real API does when no key was set
+PRELUDE = """
+import types
+
+import stripe
+
+def _reply(object_id):
+    if not stripe.api_key:
+        raise stripe.error.AuthenticationError("No API key provided")
+    return types.SimpleNamespace(id=object_id)
+
+stripe.Customer.create = lambda **kwargs: _reply("cus_1")
+stripe.PaymentIntent.create = lambda **kwargs: _reply("pi_1")
+stripe.PaymentIntent.cancel = lambda intent_id, **kwargs: _reply(intent_id)
+stripe.PaymentLink.create = lambda **kwargs: types.SimpleNamespace(url="https://pay")
+
+from whatsapp_ride_service import app as legacy
+from whatsapp_ride_service.models import Driver, Payment, Ride, User
+
+Session = legacy.session_factory()
+with Session() as session:
+    rider = User(name="Rider", email="r@example.com", phone_number="+16502530000")
+    rider.set_password("TestPass123!")
+    session.add(rider)
+    session.add(
+        Driver(
+            name="Driver",
+            phone_number="+16502530001",
+            current_latitude=40.7128,
+            current_longitude=-74.0060,
+            is_available=True,
+        )
+    )
+    session.commit()
+    RIDER_ID = rider.id
+SENT = []
+legacy.twilio_client = lambda: types.SimpleNamespace(
+    messages=types.SimpleNamespace(create=lambda **kwargs: SENT.append(kwargs))
+)
+legacy.dispatcher.run_in_background = lambda: None
+"""
+
+
+def run_legacy(code: str) -> str:
+    """Run ``code`` after ``PRELUDE`` and return what it printed."""
+    with tempfile.TemporaryDirectory() as directory:
+        for name, content in LEGACY_FILES.items():
+            with open(os.path.join(directory, name), "w") as f:
+                f.write(content)
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{os.path.join(directory, 'rides.db')}",
+            PYTHONPATH=ROOT,
+            STRIPE_SECRET_KEY="sk_test_legacy",
+            TWILIO_VALIDATE_SIGNATURES="false",
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", PRELUDE + textwrap.dedent(code)],
+            cwd=directory,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+    if result.returncode:
+        raise AssertionError(result.stderr)
+    return result.stdout
+
+
+class TestLegacyBooking(unittest.TestCase):
+    """Test cases for booking through the legacy webhook module."""
+
+    def test_first_booking_creates_the_customer(self):
+        # A fresh worker: nothing has called stripe_api() yet
+        output = run_legacy(
+            """
+            assert legacy.stripe_api.cache_info().currsize == 0
+            route = (40.7128, -74.0060), (40.7589, -73.9851)
+            print(legacy.book_ride("+16502530000", RIDER_ID, *route))
+            with Session() as session:
+                print(session.get(User, RIDER_ID).stripe_customer_id)
+                print(session.query(Payment).one().stripe_payment_intent_id)
+            """
+        )
+        self.assertIn("Looking for a driver", output)
+        self.assertEqual(output.split()[-2:], ["cus_1", "pi_1"])
+
+    def test_booked_ride_is_confirmed_when_dispatch_fails(self):
+        output = run_legacy(
+            """
+            def start(*args):
+                raise RuntimeError("dispatcher is down")
+
+            legacy.dispatcher.start = start
+            route = (40.7128, -74.0060), (40.7589, -73.9851)
+            print(legacy.book_ride("+16502530000", RIDER_ID, *route))
+            with Session() as session:
+                print(session.query(Ride).count(), session.query(Payment).count())
+            """
+        )
+        self.assertIn("Looking for a driver", output)
+        self.assertEqual(output.split()[-2:], ["1", "1"])
+
+    def test_accepts_reach_any_worker(self):
+        output = run_legacy(
+            """
+            from whatsapp_ride_service.dispatch import Dispatcher
+
+            with Session() as session:
+                # Too far away to be offered the ride
+                session.add(Driver(name="Far", phone_number="+16502530002"))
+                session.commit()
+            route = (40.7128, -74.0060), (40.7589, -73.9851)
+            legacy.book_ride("+16502530000", RIDER_ID, *route)
+            print(len(SENT))
+
+            # Another worker, whose dispatcher never saw the booking
+            legacy.dispatcher = Dispatcher(notify=legacy.offer_ride_to_driver)
+            client = legacy.app.test_client()
+            for sender in ("+16502530002", "+16502530001"):
+                reply = client.post(
+                    "/webhook",
+                    data={"From": f"whatsapp:{sender}", "Body": "accept 1"},
+                )
+                print(reply.get_data(as_text=True))
+            with Session() as session:
+                print(session.get(Ride, 1).driver_id)
+            """
+        )
+        lines = output.splitlines()
+        self.assertEqual(lines[0], "1")
+        self.assertIn("no longer available", lines[1])
+        self.assertIn("You've accepted the ride", lines[-2])
+        self.assertEqual(lines[-1], "1")
+
+
+if __name__ == "__main__":
+    unittest.main()
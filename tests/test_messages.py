@@ -0,0 +1,65 @@
+"""Test suite for localized message templates."""
+
+import unittest
+
+from whatsapp_ride_service.messages import (
+    CATALOG,
+    TEMPLATES,
+    Template,
+    TemplateRegistry,
+)
+
+
+class TestTemplate(unittest.TestCase):
+    """Test cases for compiled templates."""
+
+    def test_renders_like_str_format(self):
+        text = "Fare {{est.}}: ${fare:.2f} for {name!r}, ride {ride_id}"
+        template = Template(text)
+        values = {"fare": 12.5, "name": "Ana", "ride_id": 7}
+        self.assertEqual(template(**values), text.format(**values))
+        self.assertEqual(template.fields, ("fare", "name", "ride_id"))
+        self.assertEqual(Template("No fields")(), "No fields")
+
+    def test_fields_must_be_given_and_simple(self):
+        with self.assertRaises(TypeError):
+            Template("Ride {ride_id}")()
+        with self.assertRaises(ValueError):
+            Template("Pickup {pickup[0]}")
+
+
+class TestTemplateRegistry(unittest.TestCase):
+    """Test cases for picking and rendering a recipient's language."""
+
+    def test_language_follows_the_calling_code(self):
+        self.assertEqual(TEMPLATES.language_for("+5215550000001"), "es")
+        self.assertEqual(TEMPLATES.language_for("+5511999990000"), "pt")
+        self.assertEqual(TEMPLATES.language_for("+5932000000"), "es")
+        self.assertEqual(TEMPLATES.language_for("+15550000001"), "en")
+        self.assertEqual(TEMPLATES.language_for(None), "en")
+        self.assertEqual(
+            TEMPLATES.render("payment_received", "+34600000000", amount=9),
+            "Se recibió el pago de $9.00 por el viaje.",
+        )
+
+    def test_every_translation_has_the_english_fields(self):
+        TemplateRegistry(CATALOG)
+        broken = {"en": {"greet": "Hi {name}"}, "es": {"greet": "Hola {nombre}"}}
+        with self.assertRaises(ValueError):
+            TemplateRegistry(broken)
+        partial = TemplateRegistry({"en": {"a": "A", "b": "B"}, "es": {"a": "Á"}})
+        self.assertEqual(partial.render("b", language="es"), "B")
+
+    def test_batches_render_once_per_language(self):
+        registry = TemplateRegistry(
+            {"en": {"surge": "Busy: {zone}"}, "es": {"surge": "Alta demanda: {zone}"}}
+        )
+        phones = ["+15550000001", "+5215550000001", "+15550000002"]
+        batch = registry.render_batch("surge", phones, zone="Downtown")
+        self.assertEqual([phone for phone, _ in batch], phones)
+        self.assertEqual(batch[1][1], "Alta demanda: Downtown")
+        self.assertIs(batch[0][1], batch[2][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
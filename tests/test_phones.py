@@ -0,0 +1,175 @@
+"""Test suite for phone normalization and sender lookup."""
+
+import unittest
+
+from sqlalchemy import create_engine, event, insert, update
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from whatsapp_ride_service.auth import UserManager
+from whatsapp_ride_service.models import Base, Driver, User
+from whatsapp_ride_service.phones import (
+    Identity,
+    PhoneDirectory,
+    is_valid_phone,
+    normalize_phone,
+)
+
+
+class TestNormalization(unittest.TestCase):
+    """Test cases for canonical E.164 numbers."""
+
+    def test_formats_meet_in_e164(self):
+        for raw in ("whatsapp:+1 (650) 253-0000", "+1-650-253-0000", "+16502530000"):
+            self.assertEqual(normalize_phone(raw), "+16502530000")
+        self.assertIsNone(normalize_phone("not-a-number"))
+        self.assertIsNone(normalize_phone(""))
+        self.assertTrue(is_valid_phone("whatsapp:+16502530000"))
+        self.assertFalse(is_valid_phone("+1234567890"))
+
+    def test_users_are_stored_and_found_canonically(self):
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            manager = UserManager(session)
+            user = manager.create_user(
+                "Rider", "r@example.com", "+1 650-253-0000", "TestPass123!"
+            )
+            self.assertEqual(user.phone_number, "+16502530000")
+            self.assertEqual(
+                manager.authenticate_user("+1 (650) 253-0000", "TestPass123!"), user
+            )
+
+
+class TestPhoneDirectory(unittest.TestCase):
+    """Test cases for resolving senders from memory."""
+
+    def setUp(self):
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(
+                insert(User.__table__).values(
+                    id=1,
+                    name="Rider",
+                    email="r@example.com",
+                    phone_number="+16502530000",
+                    password_hash="x",
+                )
+            )
+            connection.execute(
+                insert(Driver.__table__).values(
+                    id=7, name="Both", phone_number="+16502530000"
+                )
+            )
+        self.Session = sessionmaker(bind=engine)
+        self.now = [0.0]
+        self.directory = PhoneDirectory(
+            self.Session, ttl_seconds=300, miss_ttl_seconds=30, clock=self.clock
+        )
+        self.directory.connect()
+        self.addCleanup(self.directory.disconnect)
+        self.queries = []
+        event.listen(engine, "before_cursor_execute", self.count_query)
+
+    def clock(self):
+        return self.now[0]
+
+    def count_query(self, conn, cursor, statement, *args):
+        if "phone_number" in statement and statement.lstrip().startswith("SELECT"):
+            self.queries.append(statement)
+
+    def test_users_and_drivers_are_merged(self):
+        identity = self.directory.resolve("whatsapp:+16502530000")
+        self.assertEqual(identity, Identity(1, 7))
+        self.assertEqual(identity.role, "both")
+        self.assertEqual(self.directory.resolve("+1 650 253 0000"), identity)
+        self.assertEqual(len(self.queries), 1)
+
+    def test_unknown_numbers_are_cached_briefly(self):
+        self.assertEqual(self.directory.resolve("+16502530000").driver_id, 7)
+        self.assertIsNone(self.directory.resolve("+16502530001"))
+        self.assertIsNone(self.directory.resolve("+16502530001"))
+        self.assertIsNone(self.directory.resolve("garbage"))
+        self.assertEqual(len(self.queries), 2)
+
+        with self.Session() as session:
+            session.add(Driver(name="Later", phone_number="+16502530001"))
+            session.commit()
+        self.assertEqual(self.directory.resolve("+16502530001").role, "driver")
+
+    def test_entries_expire(self):
+        self.directory.resolve("+16502530000")
+        self.directory.resolve("+16502530009")
+        with self.Session.begin() as session:
+            # Core writes, like another process's, are not followed
+            session.execute(update(Driver).values(phone_number="+16502530009"))
+
+        self.now[0] = 31
+        self.assertEqual(self.directory.resolve("+16502530009"), Identity(None, 7))
+        self.assertEqual(self.directory.resolve("+16502530000"), Identity(1, 7))
+        self.now[0] = 301
+        self.assertEqual(self.directory.resolve("+16502530000"), Identity(1, None))
+
+    def test_least_recently_used_numbers_are_dropped(self):
+        self.directory.max_entries = 2
+        for phone in ("+16502530000", "+16502530001", "+16502530000", "+16502530002"):
+            self.directory.resolve(phone)
+        self.queries.clear()
+        self.directory.resolve("+16502530000")
+        self.directory.resolve("+16502530001")
+        self.assertEqual(len(self.queries), 1)
+
+    def test_lookup_finds_drivers_without_a_user_row(self):
+        with self.Session() as session:
+            session.add(Driver(name="Driver only", phone_number="+16502530005"))
+            session.commit()
+        identity = self.directory.resolve("whatsapp:+1 650-253-0005")
+        self.assertIsNone(identity.user_id)
+        self.assertEqual(identity.role, "driver")
+
+    def test_committed_changes_update_the_map(self):
+        self.assertEqual(self.directory.resolve("+16502530000"), Identity(1, 7))
+        self.assertIsNone(self.directory.resolve("+16502530002"))
+        session = self.Session()
+        driver = Driver(name="New", phone_number="+16502530002")
+        session.add(driver)
+        session.commit()
+        self.assertEqual(self.directory.resolve("+16502530002").role, "driver")
+
+        driver_id = driver.id
+        driver.phone_number = "+16502530003"
+        session.commit()
+        session.delete(session.get(User, 1))
+        session.commit()
+        session.add(Driver(name="Rolled back", phone_number="+16502530004"))
+        session.flush()
+        session.rollback()
+        session.close()
+
+        self.queries.clear()
+        self.assertEqual(self.directory.resolve("+16502530000"), Identity(None, 7))
+        self.assertEqual(self.queries, [])
+        self.assertIsNone(self.directory.resolve("+16502530002"))
+        self.assertEqual(
+            self.directory.resolve("+16502530003"), Identity(None, driver_id)
+        )
+        self.assertIsNone(self.directory.resolve("+16502530004"))
+
+    def test_only_its_own_sessions_are_followed(self):
+        self.directory.resolve("+16502530000")
+        other = sessionmaker(bind=self.Session.kw["bind"])
+        with other() as session:
+            session.delete(session.get(User, 1))
+            session.commit()
+        self.assertEqual(self.directory.resolve("+16502530000"), Identity(1, 7))
+
+        self.directory.disconnect()
+        with self.Session() as session:
+            session.delete(session.get(Driver, 7))
+            session.commit()
+        self.assertEqual(self.directory.resolve("+16502530000"), Identity(1, 7))
+
+
+if __name__ == "__main__":
+    unittest.main()
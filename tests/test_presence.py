@@ -0,0 +1,209 @@
+"""Test suite for driver presence tracking."""
+
+import os
+import tempfile
+import time
+import unittest
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from whatsapp_ride_service import signals
+from whatsapp_ride_service.models import Base, Driver
+from whatsapp_ride_service.presence import (
+    PresenceTracker,
+    SQLiteHeartbeats,
+    TimingWheel,
+)
+
+
+class FakeClock:
+    """Manually advanced time source."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTimingWheel(unittest.TestCase):
+    """Test cases for tick-based expiry."""
+
+    def test_keys_expire_within_a_tick_of_their_timeout(self):
+        wheel = TimingWheel(timeout_seconds=60, tick_seconds=5, now=1000)
+        wheel.touch("a", 1000)
+        wheel.touch("b", 1012)
+        self.assertEqual(wheel.advance(1059), [])
+        self.assertEqual(wheel.advance(1060), ["a"])
+        self.assertEqual(wheel.advance(1070), ["b"])
+        self.assertEqual(len(wheel), 0)
+
+    def test_touch_restarts_the_timeout(self):
+        wheel = TimingWheel(timeout_seconds=60, tick_seconds=5, now=1000)
+        wheel.touch("a", 1000)
+        wheel.touch("a", 1050)
+        self.assertEqual(wheel.advance(1100), [])
+        self.assertIn("a", wheel)
+        wheel.remove("a")
+        self.assertEqual(wheel.advance(1200), [])
+
+    def test_long_pause_expires_everything_due(self):
+        wheel = TimingWheel(timeout_seconds=60, tick_seconds=5, now=1000)
+        wheel.touch("a", 1000)
+        wheel.touch("b", 1030)
+        wheel.advance(1040)
+        wheel.touch("c", 1040)
+        self.assertEqual(sorted(wheel.advance(5000)), ["a", "b", "c"])
+
+
+class TestPresenceTracker(unittest.TestCase):
+    """Test cases for syncing presence to driver availability."""
+
+    def setUp(self):
+        engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        Base.metadata.create_all(engine)
+        drivers = [
+            {
+                "id": i,
+                "name": f"Driver {i}",
+                "phone_number": f"+1555000{i:04d}",
+                "is_available": i != 3,
+            }
+            for i in range(1, 5)
+        ]
+        with engine.begin() as connection:
+            connection.execute(insert(Driver.__table__), drivers)
+        self.Session = sessionmaker(bind=engine)
+        self.clock = FakeClock()
+        self.tracker = PresenceTracker(
+            self.Session,
+            timeout_seconds=60,
+            tick_seconds=5,
+            batch_size=2,
+            clock=self.clock,
+        )
+        self.changes = []
+        signals.driver_availability_changed.connect(self.on_change)
+        self.addCleanup(signals.driver_availability_changed.disconnect, self.on_change)
+
+    def on_change(self, driver_id, **kwargs):
+        self.changes.append((driver_id, kwargs["available"]))
+
+    def available(self):
+        session = self.Session()
+        try:
+            return set(session.scalars(select(Driver.id).filter_by(is_available=True)))
+        finally:
+            session.close()
+
+    def test_silent_drivers_are_marked_unavailable_in_bulk(self):
+        self.tracker.seed([1, 2, 3, 4])
+        self.clock.now += 30
+        self.tracker.heartbeat(2)
+        self.clock.now += 30
+        self.assertEqual(sorted(self.tracker.expire()), [1, 3, 4])
+        self.assertFalse(self.tracker.online(1))
+        self.assertTrue(self.tracker.online(2))
+
+        # Driver 3 was on a ride already, so it is neither updated nor signalled
+        self.assertEqual(self.tracker.flush(), (2, 0))
+        self.assertEqual(self.available(), {2})
+        self.assertEqual(sorted(self.changes), [(1, False), (4, False)])
+        self.assertEqual(self.tracker.flush(), (0, 0))
+
+    def test_heartbeat_brings_a_driver_back(self):
+        self.tracker.seed([1])
+        self.clock.now += 60
+        self.tracker.expire()
+        self.tracker.flush()
+
+        self.tracker.heartbeat(1)
+        self.assertEqual(self.tracker.flush(), (0, 1))
+        self.assertEqual(self.available(), {1, 2, 4})
+        self.assertEqual(self.changes, [(1, False), (1, True)])
+
+    def test_heartbeat_before_the_flush_cancels_the_expiry(self):
+        self.tracker.seed([1])
+        self.clock.now += 60
+        self.tracker.expire()
+        self.tracker.heartbeat(1)
+        self.assertEqual(self.tracker.flush(), (0, 0))
+        self.assertEqual(self.changes, [])
+
+    def test_background_thread_survives_a_failed_flush(self):
+        calls = []
+
+        def flaky_session():
+            calls.append(None)
+            if len(calls) == 1:
+                raise RuntimeError("database unavailable")
+            return self.Session()
+
+        tracker = PresenceTracker(
+            flaky_session, timeout_seconds=0.01, tick_seconds=0.01, flush_seconds=0
+        )
+        tracker.seed([1])
+        with self.assertLogs("whatsapp_ride_service.presence") as logs:
+            tracker.run_in_background()
+            deadline = time.monotonic() + 5
+            # Wait for the signal; the test database is one shared connection
+            while not self.changes and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(self.changes, [(1, False)])
+        self.assertEqual(self.available(), {2, 4})
+        self.assertIn("database unavailable", logs.output[0])
+
+
+class TestSharedHeartbeats(TestPresenceTracker):
+    """Test cases for workers sharing heartbeats through SQLite."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "presence.db")
+        self.tracker, self.other_worker = (
+            PresenceTracker(
+                self.Session,
+                timeout_seconds=60,
+                tick_seconds=5,
+                clock=self.clock,
+                heartbeats=SQLiteHeartbeats(path, clock=self.clock),
+            )
+            for _ in range(2)
+        )
+
+    def test_drivers_heard_by_another_worker_stay_available(self):
+        self.tracker.seed([1])
+        self.clock.now += 30
+        self.other_worker.heartbeat(1)
+        self.clock.now += 30
+        self.assertEqual(self.tracker.expire(), [1])
+        self.assertEqual(self.tracker.flush(), (0, 0))
+        self.assertTrue(self.tracker.online(1))
+
+        self.clock.now += 60
+        self.tracker.expire()
+        self.assertEqual(self.tracker.flush(), (1, 0))
+        self.assertEqual(self.available(), {2, 4})
+
+    def test_any_worker_brings_a_driver_back(self):
+        self.tracker.seed([1])
+        self.clock.now += 60
+        self.tracker.expire()
+        self.assertEqual(self.tracker.flush(), (1, 0))
+
+        self.other_worker.heartbeat(1)
+        self.assertEqual(self.other_worker.flush(), (0, 1))
+        self.assertEqual(self.available(), {1, 2, 4})
+        self.assertEqual(self.changes, [(1, False), (1, True)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""Test suite for fare quoting."""
+
+import unittest
+
+from whatsapp_ride_service.pricing import FareQuoteService, parse_route
+
+AIRPORT = (40.6413, -73.7781)
+MIDTOWN = (40.7549, -73.9840)
+
+
+class TestFareQuoteService(unittest.TestCase):
+    """Test cases for the quote cache."""
+
+    def setUp(self):
+        self.now = 0.0
+        self.quotes = FareQuoteService(
+            base_fare=5.0,
+            rate_per_km=1.5,
+            max_entries=2,
+            ttl_seconds=60,
+            clock=lambda: self.now,
+        )
+
+    def test_quotes_within_a_cell_share_the_cache(self):
+        first = self.quotes.quote(AIRPORT, MIDTOWN)
+        nearby = self.quotes.quote((40.6414, -73.7782), (40.7548, -73.9841))
+        self.assertEqual(first, nearby)
+        self.assertEqual((self.quotes.hits, self.quotes.misses), (1, 1))
+        self.assertAlmostEqual(first.fare, 5.0 + first.distance_km * 1.5, places=2)
+        self.assertGreater(first.distance_km, 20)
+
+    def test_entries_expire(self):
+        self.quotes.quote(AIRPORT, MIDTOWN)
+        self.now = 61
+        self.quotes.quote(AIRPORT, MIDTOWN)
+        self.assertEqual(self.quotes.misses, 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.quotes.quote(AIRPORT, MIDTOWN)
+        self.quotes.quote(MIDTOWN, AIRPORT)
+        self.quotes.quote(AIRPORT, MIDTOWN)
+        self.quotes.quote((40.0, -74.0), MIDTOWN)
+        self.quotes.quote(AIRPORT, MIDTOWN)
+        self.assertEqual(self.quotes.misses, 3)
+        self.quotes.quote(MIDTOWN, AIRPORT)
+        self.assertEqual(self.quotes.misses, 4)
+
+    def test_precomputed_routes_never_expire(self):
+        self.assertEqual(self.quotes.precompute([(AIRPORT, MIDTOWN)]), 1)
+        self.now = 10_000
+        self.quotes.quote(AIRPORT, MIDTOWN)
+        self.assertEqual(self.quotes.misses, 0)
+
+    def test_surge_applies_to_pickup_cell(self):
+        base = self.quotes.quote(AIRPORT, MIDTOWN)
+        self.quotes.set_surge_multiplier(base.pickup_cell, 1.5)
+        surged = self.quotes.quote(AIRPORT, MIDTOWN)
+        self.assertEqual(surged.surge_multiplier, 1.5)
+        self.assertAlmostEqual(surged.fare, base.fare * 1.5, places=1)
+        self.assertEqual(self.quotes.quote(MIDTOWN, AIRPORT).surge_multiplier, 1.0)
+
+
+class TestParseRoute(unittest.TestCase):
+    """Test cases for WhatsApp route parsing."""
+
+    def test_valid_route(self):
+        self.assertEqual(
+            parse_route("Quote 40.1, -74.2 to 40.3,-74.4"),
+            ((40.1, -74.2), (40.3, -74.4)),
+        )
+
+    def test_invalid_routes(self):
+        self.assertIsNone(parse_route("ride somewhere"))
+        self.assertIsNone(parse_route("ride 40.1 to 40.3,-74.4"))
+        self.assertIsNone(parse_route("ride abc,def to 40.3,-74.4"))
+
+
+if __name__ == "__main__":
+    unittest.main()
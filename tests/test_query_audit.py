@@ -0,0 +1,37 @@
+"""Test suite for the hot query plan audit."""
+
+import unittest
+
+from whatsapp_ride_service.models import Ride
+from whatsapp_ride_service.query_audit import audit, in_memory_engine, seed
+
+
+class TestQueryAudit(unittest.TestCase):
+    """Test cases for EXPLAIN QUERY PLAN checks."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = in_memory_engine()
+        seed(cls.engine, users=200, drivers=50, rides=2000)
+
+    def test_hot_queries_use_indexes(self):
+        plans, findings = audit(self.engine)
+        self.assertEqual(findings, [])
+        for name in ("get_user_ride_history", "update_ride_status", "resolve_phone"):
+            self.assertIn(name, plans)
+        self.assertTrue(all(statements for statements in plans.values()))
+
+    def test_full_scans_are_reported(self):
+        _, findings = audit(
+            self.engine,
+            {
+                "unindexed": lambda ops: ops.session.query(Ride)
+                .filter(Ride.completed_at.isnot(None))
+                .all()
+            },
+        )
+        self.assertEqual([f.detail for f in findings], ["SCAN rides"])
+
+
+if __name__ == "__main__":
+    unittest.main()
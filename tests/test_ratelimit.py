@@ -0,0 +1,119 @@
+"""Test suite for webhook rate limiting."""
+
+import os
+import tempfile
+import unittest
+
+from whatsapp_ride_service.ratelimit import (
+    SQLiteTokenBucketLimiter,
+    TokenBucketLimiter,
+    WebhookThrottle,
+)
+
+
+class FakeClock:
+    """Manually advanced time source."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucketLimiter(unittest.TestCase):
+    """Test cases for in-memory buckets."""
+
+    def test_burst_then_steady_rate(self):
+        clock = FakeClock()
+        limiter = TokenBucketLimiter(rate_per_minute=60, burst=3, clock=clock)
+        self.assertEqual([limiter.allow("a") for _ in range(4)], [True] * 3 + [False])
+        self.assertTrue(limiter.allow("b"))
+
+        clock.now += 1
+        self.assertTrue(limiter.allow("a"))
+        self.assertFalse(limiter.allow("a"))
+
+        clock.now += 60
+        self.assertEqual(sum(limiter.allow("a") for _ in range(5)), 3)
+
+    def test_buckets_are_bounded(self):
+        clock = FakeClock()
+        limiter = TokenBucketLimiter(
+            rate_per_minute=1, burst=1, max_keys=2, clock=clock
+        )
+        limiter.allow("a")
+        limiter.allow("b")
+        limiter.allow("a")
+        limiter.allow("c")
+        self.assertEqual(len(limiter), 2)
+        self.assertFalse(limiter.allow("a"))
+        # "b" was least recently used, so it starts over with a full bucket
+        self.assertTrue(limiter.allow("b"))
+
+
+class TestSQLiteTokenBucketLimiter(unittest.TestCase):
+    """Test cases for buckets shared through a SQLite file."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "buckets.db")
+        self.clock = FakeClock()
+
+    def limiter(self, **kwargs):
+        return SQLiteTokenBucketLimiter(
+            self.path, rate_per_minute=60, burst=2, clock=self.clock, **kwargs
+        )
+
+    def test_workers_share_buckets(self):
+        first, second = self.limiter(), self.limiter()
+        self.assertTrue(first.allow("+15550000001"))
+        self.assertTrue(second.allow("+15550000001"))
+        self.assertFalse(first.allow("+15550000001"))
+
+        self.clock.now += 1
+        self.assertTrue(second.allow("+15550000001"))
+        self.assertFalse(first.allow("+15550000001"))
+
+    def test_refilled_buckets_are_pruned(self):
+        limiter = self.limiter(prune_every=2)
+        limiter.allow("a")
+        self.clock.now += 10
+        limiter.allow("b")
+        rows = limiter._connection().execute("SELECT key FROM buckets").fetchall()
+        self.assertEqual(rows, [("b",)])
+
+
+class TestWebhookThrottle(unittest.TestCase):
+    """Test cases for combining sender and IP limits."""
+
+    def test_either_limit_throttles(self):
+        clock = FakeClock()
+        throttle = WebhookThrottle(
+            TokenBucketLimiter(rate_per_minute=1, burst=1, clock=clock),
+            TokenBucketLimiter(rate_per_minute=1, burst=2, clock=clock),
+        )
+        self.assertTrue(throttle.allow("whatsapp:+15550000001", "10.0.0.1"))
+        self.assertFalse(throttle.allow("whatsapp:+15550000001", "10.0.0.1"))
+        self.assertTrue(throttle.allow("whatsapp:+15550000002", "10.0.0.1"))
+        self.assertFalse(throttle.allow("whatsapp:+15550000003", "10.0.0.1"))
+        self.assertTrue(throttle.allow("whatsapp:+15550000004", "10.0.0.2"))
+        self.assertEqual(throttle.throttled, 2)
+
+    def test_throttled_senders_leave_the_ip_budget_alone(self):
+        clock = FakeClock()
+        throttle = WebhookThrottle(
+            TokenBucketLimiter(rate_per_minute=1, burst=1, clock=clock),
+            TokenBucketLimiter(rate_per_minute=1, burst=2, clock=clock),
+        )
+        flooder = "whatsapp:+15550000001"
+        self.assertEqual(
+            [throttle.allow(flooder, "10.0.0.1") for _ in range(5)],
+            [True] + [False] * 4,
+        )
+        self.assertTrue(throttle.allow("whatsapp:+15550000002", "10.0.0.1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+"""Test suite for read-replica routing."""
+
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from whatsapp_ride_service.database_ops import DatabaseOps
+from whatsapp_ride_service.models import Base, Ride, User
+from whatsapp_ride_service.replica import ReplicaRouter, stale_reads
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestReplicaRouting(unittest.TestCase):
+    """Test cases for routing reads between primary and replica files."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.primary = create_engine(
+            f"sqlite:///{os.path.join(self.directory.name, 'primary.db')}"
+        )
+        self.replica = create_engine(
+            f"sqlite:///{os.path.join(self.directory.name, 'replica.db')}"
+        )
+        # The replica starts as a copy of the primary with one ride each
+        for engine, pickup in ((self.primary, 1.0), (self.replica, 2.0)):
+            Base.metadata.create_all(engine)
+            with Session(engine) as session:
+                session.add(
+                    User(
+                        id=1,
+                        name="Rider",
+                        email="r@example.com",
+                        phone_number="+15550000001",
+                        password_hash="x",
+                    )
+                )
+                session.add(self.ride(pickup))
+                session.commit()
+
+        self.clock = FakeClock()
+        self.lag = 0.0
+        self.router = ReplicaRouter(
+            self.primary,
+            self.replica,
+            max_lag_seconds=5,
+            lag_check_seconds=0,
+            lag_probe=lambda: self.lag,
+            clock=self.clock,
+        )
+        self.session = self.router.sessionmaker()()
+        self.db_ops = DatabaseOps(self.session)
+
+    def tearDown(self):
+        self.session.close()
+        self.primary.dispose()
+        self.replica.dispose()
+        self.directory.cleanup()
+
+    @staticmethod
+    def ride(pickup):
+        return Ride(
+            user_id=1,
+            pickup_latitude=pickup,
+            pickup_longitude=0.0,
+            dropoff_latitude=0.0,
+            dropoff_longitude=0.0,
+        )
+
+    def pickups(self):
+        return [ride.pickup_latitude for ride in self.db_ops.get_user_rides(1)]
+
+    def test_stale_reads_use_a_fresh_replica(self):
+        self.assertEqual(self.pickups(), [2.0])
+        self.assertEqual(self.db_ops.get_user_stats(1)["total_rides"], 1)
+        # Reads outside stale_reads stay on the primary
+        self.assertEqual(self.session.query(Ride).one().pickup_latitude, 1.0)
+
+    def test_lagging_or_unreachable_replica_falls_back_to_primary(self):
+        self.lag = 30.0
+        self.assertEqual(self.pickups(), [1.0])
+        self.lag = None
+        self.assertEqual(self.pickups(), [1.0])
+
+    def test_writers_read_their_writes_until_the_bound_passes(self):
+        self.session.add(self.ride(3.0))
+        self.session.commit()
+
+        self.assertEqual(self.pickups(), [3.0, 1.0])
+        self.assertEqual(self.db_ops.get_user_stats(2)["total_rides"], 0)
+
+        self.clock.now += 6
+        self.assertEqual(self.pickups(), [2.0])
+
+    def test_core_statements_count_as_writes(self):
+        # The cancellation is an UPDATE ... RETURNING, not a flushed object
+        self.assertEqual(self.db_ops.cancel_unclaimed_ride(1), 1)
+        self.assertEqual(self.pickups(), [1.0])
+
+    def test_pending_changes_keep_reads_on_primary(self):
+        self.session.add(self.ride(4.0))
+        with stale_reads(self.session, user_id=1):
+            pickups = sorted(r.pickup_latitude for r in self.session.query(Ride))
+        self.assertEqual(pickups, [1.0, 4.0])
+        self.session.rollback()
+
+        with Session(self.replica) as replica:
+            self.assertEqual(replica.query(Ride).count(), 1)
+
+    def test_unmeasurable_replica_is_not_used(self):
+        # SQLite has no replication lag to query
+        router = ReplicaRouter(self.primary, self.replica, lag_check_seconds=0)
+        self.assertIsNone(router.lag())
+        self.assertIs(router.read_bind(), self.primary)
+
+    def test_plain_sessions_are_unaffected(self):
+        with Session(self.primary) as session:
+            self.assertEqual(
+                [r.pickup_latitude for r in DatabaseOps(session).get_user_rides(1)],
+                [1.0],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
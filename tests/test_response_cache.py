@@ -0,0 +1,66 @@
+"""Test suite for the per-user response cache."""
+
+import unittest
+
+from whatsapp_ride_service.models import PaymentStatus
+from whatsapp_ride_service.response_cache import ResponseCache
+from whatsapp_ride_service.signals import payment_status_changed
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test cases for storing, expiring and invalidating bodies."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResponseCache(max_users=2, ttl_seconds=60, clock=self.clock)
+
+    def test_bodies_get_stable_etags_and_expire(self):
+        stored = self.cache.put(1, "rides", b'{"rides": []}', 0)
+        self.assertEqual(
+            self.cache.put(2, "rides", b'{"rides": []}', 0).etag, stored.etag
+        )
+        self.assertEqual(self.cache.get(1, "rides"), stored)
+        self.assertIsNone(self.cache.get(1, "payments"))
+
+        self.clock.now += 61
+        self.assertIsNone(self.cache.get(1, "rides"))
+
+    def test_signals_invalidate_only_that_user(self):
+        self.cache.connect()
+        self.cache.put(1, "rides", b"a", 0)
+        self.cache.put(2, "rides", b"b", 0)
+
+        payment_status_changed.send(1, status=PaymentStatus.COMPLETED)
+
+        self.assertIsNone(self.cache.get(1, "rides"))
+        self.assertIsNotNone(self.cache.get(2, "rides"))
+
+    def test_responses_built_across_an_invalidation_are_not_cached(self):
+        generation = self.cache.generation(1)
+        self.cache.invalidate(1)
+        self.cache.put(1, "profile", b"stale", generation)
+        self.assertIsNone(self.cache.get(1, "profile"))
+
+        self.cache.put(1, "profile", b"fresh", self.cache.generation(1))
+        self.assertEqual(self.cache.get(1, "profile").body, b"fresh")
+
+    def test_least_recently_used_user_is_evicted(self):
+        for user_id in (1, 2):
+            self.cache.put(user_id, "profile", b"x", 0)
+        self.cache.get(1, "profile")
+        self.cache.put(3, "profile", b"x", 0)
+
+        self.assertIsNone(self.cache.get(2, "profile"))
+        self.assertIsNotNone(self.cache.get(1, "profile"))
+
+
+if __name__ == "__main__":
+    unittest.main()
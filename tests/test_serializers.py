@@ -0,0 +1,118 @@
+"""Test suite for the compiled row serializers."""
+
+import json
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from whatsapp_ride_service import serializers
+from whatsapp_ride_service.archive import Archiver
+from whatsapp_ride_service.database_ops import DatabaseOps
+from whatsapp_ride_service.models import (
+    Base,
+    Payment,
+    PaymentStatus,
+    Ride,
+    RideStatus,
+    User,
+)
+from whatsapp_ride_service.serializers import PAYMENT, RIDE, USER, Serializer
+
+
+class TestSerializers(unittest.TestCase):
+    """Test cases for serializing Core rows and encoding them."""
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://", poolclass=StaticPool)
+        Base.metadata.create_all(self.engine)
+        self.session = Session(self.engine)
+        self.session.add(
+            User(
+                id=1,
+                name="Rider",
+                email="r@example.com",
+                phone_number="+15550000001",
+                password_hash="x",
+            )
+        )
+        for ride_id, created in ((1, datetime(2020, 1, 1)), (2, datetime(2024, 5, 2))):
+            self.session.add(
+                Ride(
+                    id=ride_id,
+                    user_id=1,
+                    pickup_latitude=40.7,
+                    pickup_longitude=-74.0,
+                    dropoff_latitude=40.8,
+                    dropoff_longitude=-73.9,
+                    status=RideStatus.COMPLETED,
+                    created_at=created,
+                    completed_at=created,
+                )
+            )
+            self.session.add(
+                Payment(
+                    user_id=1,
+                    ride_id=ride_id,
+                    amount=12.5,
+                    status=PaymentStatus.COMPLETED,
+                    created_at=created,
+                )
+            )
+        self.session.commit()
+        self.db_ops = DatabaseOps(self.session)
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_rows_match_the_hand_built_dicts(self):
+        Archiver(self.engine, clock=lambda: datetime(2021, 1, 1)).archive(90)
+
+        rows = RIDE.many(self.db_ops.get_user_ride_rows(1))
+        expected = [
+            {
+                "id": ride.id,
+                "pickup_latitude": ride.pickup_latitude,
+                "pickup_longitude": ride.pickup_longitude,
+                "dropoff_latitude": ride.dropoff_latitude,
+                "dropoff_longitude": ride.dropoff_longitude,
+                "status": ride.status,
+                "driver_id": ride.driver_id,
+                "created_at": str(ride.created_at),
+            }
+            for ride in self.db_ops.get_user_rides(1)
+        ]
+        self.assertEqual([row["id"] for row in rows], [2, 1])
+        self.assertEqual(rows, expected)
+
+        payments = PAYMENT.many(self.db_ops.get_user_payment_rows(1))
+        self.assertEqual(payments[1]["created_at"], "2020-01-01 00:00:00")
+
+    def test_objects_and_tuples(self):
+        user = self.session.get(User, 1)
+        self.assertEqual(
+            USER.from_object(user),
+            {
+                "id": 1,
+                "name": "Rider",
+                "email": "r@example.com",
+                "phone_number": "+15550000001",
+            },
+        )
+        pair = Serializer(["a", "b"], {"b": str})
+        self.assertEqual(pair((1, 2)), {"a": 1, "b": "2"})
+
+    def test_encoders_agree(self):
+        payload = {"rides": RIDE.many(self.db_ops.get_user_ride_rows(1))}
+        encoded = serializers.dumps(payload)
+        with mock.patch.object(serializers, "orjson", None):
+            fallback = serializers.dumps(payload)
+        self.assertEqual(json.loads(encoded), json.loads(fallback))
+        self.assertEqual(json.loads(fallback)["rides"][0]["status"], "completed")
+
+
+if __name__ == "__main__":
+    unittest.main()
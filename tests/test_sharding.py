@@ -0,0 +1,194 @@
+"""Test suite for region-sharded dispatch."""
+
+import socket
+import threading
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from whatsapp_ride_service.models import Base, Driver
+from whatsapp_ride_service.sharding import (
+    DispatchShard,
+    RegionPartitioner,
+    ShardRouter,
+    parse_addresses,
+    serve,
+)
+
+AUTHKEY = b"test-dispatch-shard-key"
+
+
+def free_address():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()
+
+
+class TestRegionPartitioner(unittest.TestCase):
+    """Test cases for region ownership."""
+
+    def test_assignment_is_stable(self):
+        partitioner = RegionPartitioner(shard_count=4, region_size_deg=0.2)
+        shard = partitioner.shard_for(40.71, -74.00)
+        self.assertEqual(shard, partitioner.shard_for(40.79, -73.81))
+        self.assertIn(shard, range(4))
+
+    def test_search_radius_can_span_regions(self):
+        partitioner = RegionPartitioner(shard_count=64, region_size_deg=0.2)
+        self.assertEqual(len(partitioner.shards_within(40.70, -74.10, 1)), 1)
+        self.assertGreater(len(partitioner.shards_within(40.80, -74.00, 10)), 1)
+
+
+class TestDispatchShard(unittest.TestCase):
+    """Test cases for in-memory matching."""
+
+    def test_match_update_and_remove(self):
+        shard = DispatchShard()
+        shard.update_driver(1, "+1", 40.7130, -74.0060)
+        shard.update_driver(2, "+2", 40.7300, -74.0060)
+        shard.update_driver(3, "+3", 34.0522, -118.2437)
+
+        matches = shard.match(40.7128, -74.0060, limit=5, radius_km=10)
+        self.assertEqual([c.driver_id for c in matches], [1, 2])
+
+        shard.update_driver(1, "+1", 34.0522, -118.2437)
+        shard.remove_driver(2)
+        self.assertEqual(shard.match(40.7128, -74.0060, limit=5, radius_km=10), [])
+        self.assertEqual(shard.handle(("count",)), 2)
+
+
+class TestShardRouter(unittest.TestCase):
+    """Test cases for routing over shard sockets."""
+
+    def setUp(self):
+        self.addresses = [free_address(), free_address()]
+        self.threads = []
+        for address in self.addresses:
+            self.start_shard(address)
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        self.Session = sessionmaker(bind=engine)
+        self.router = ShardRouter(
+            self.addresses,
+            AUTHKEY,
+            region_size_deg=0.2,
+            session_factory=self.Session,
+        )
+
+    def start_shard(self, address):
+        ready = threading.Event()
+        thread = threading.Thread(
+            target=serve, args=(address, AUTHKEY), kwargs={"ready": ready}
+        )
+        thread.start()
+        ready.wait(5)
+        self.threads.append(thread)
+
+    def tearDown(self):
+        self.router.stop_all()
+        for thread in self.threads:
+            thread.join(5)
+
+    def test_drivers_live_on_the_owning_shard(self):
+        self.router.update_driver(1, "+1", 40.7130, -74.0060)
+        owner = self.router.partitioner.shard_for(40.7130, -74.0060)
+        self.assertEqual(self.router.request(owner, ("count",)), 1)
+        self.assertEqual(self.router.request(1 - owner, ("count",)), 0)
+
+        matches = self.router.match(40.7128, -74.0060)
+        self.assertEqual([c.driver_id for c in matches], [1])
+
+    def test_moving_and_unavailable_drivers(self):
+        self.router.update_driver(1, "+1", 40.7130, -74.0060)
+        self.router.update_driver(1, "+1", 34.0522, -118.2437)
+        self.assertEqual(self.router.match(40.7128, -74.0060), [])
+        self.assertEqual(len(self.router.match(34.0522, -118.2437)), 1)
+
+        self.router.update_driver(1, "+1", 34.0522, -118.2437, available=False)
+        self.assertEqual(self.router.match(34.0522, -118.2437), [])
+
+    def test_errors_are_raised_in_the_caller(self):
+        with self.assertRaises(ValueError):
+            self.router.request(0, ("bogus",))
+
+    def test_reconnects_after_a_shard_restart(self):
+        self.assertEqual(self.router.request(0, ("count",)), 0)
+        self.router.request(0, ("stop",))
+        self.threads.pop(0).join(5)
+        # The old connection now hits EOF; the new shard must be dialled
+        self.router.addresses[0] = free_address()
+        self.start_shard(self.router.addresses[0])
+        self.assertEqual(self.router.request(0, ("count",)), 0)
+
+    def test_drivers_available_again_rejoin_their_shard(self):
+        session = self.Session()
+        session.add(
+            Driver(
+                id=1,
+                name="Driver",
+                phone_number="+1",
+                current_latitude=40.7130,
+                current_longitude=-74.0060,
+                is_available=True,
+            )
+        )
+        session.commit()
+        session.close()
+
+        self.router.on_driver_availability(1, available=True)
+        matches = self.router.match(40.7128, -74.0060)
+        self.assertEqual([c.driver_id for c in matches], [1])
+        self.router.on_driver_availability(1, available=False)
+        self.assertEqual(self.router.match(40.7128, -74.0060), [])
+
+    def test_shard_outages_do_not_fail_the_sender(self):
+        owner = self.router.partitioner.shard_for(40.7130, -74.0060)
+        self.router.request(owner, ("stop",))
+        self.threads.pop(owner).join(5)
+        self.router.addresses[owner] = free_address()
+        driver = Driver(
+            id=1,
+            phone_number="+1",
+            current_latitude=40.7130,
+            current_longitude=-74.0060,
+            is_available=True,
+        )
+        self.router.request(1 - owner, ("update", 1, "+1", 34.0522, -118.2437))
+
+        with self.assertLogs("whatsapp_ride_service.sharding") as logs:
+            self.router.on_driver_location(driver)
+            self.router.on_driver_availability(1, available=False)
+        self.assertEqual(len(logs.records), 2)
+        # The shard that was up still dropped the driver
+        self.assertEqual(self.router.request(1 - owner, ("count",)), 0)
+        self.start_shard(self.router.addresses[owner])
+
+    def test_drivers_listed_by_two_shards_are_matched_once(self):
+        for shard, latitude in ((0, 40.7130), (1, 40.7140)):
+            self.router.request(shard, ("update", 1, "+1", latitude, -74.0060))
+        self.router.partitioner.shards_within = lambda *args: [0, 1]
+        matches = self.router.match(40.7128, -74.0060)
+        self.assertEqual([c.driver_id for c in matches], [1])
+        self.assertAlmostEqual(matches[0].distance_km, 0.02, places=2)
+
+    def test_refuses_to_run_without_a_real_key(self):
+        with self.assertRaises(ValueError):
+            ShardRouter(self.addresses, b"dev")
+        with self.assertRaises(ValueError):
+            serve(free_address(), b"")
+
+
+class TestParseAddresses(unittest.TestCase):
+    """Test cases for the DISPATCH_SHARDS setting."""
+
+    def test_parse(self):
+        self.assertEqual(
+            parse_addresses("10.0.0.1:7101, :7102"),
+            [("10.0.0.1", 7101), ("127.0.0.1", 7102)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+"""Test suite for Twilio webhook signature checks."""
+
+import unittest
+
+from twilio.request_validator import RequestValidator
+from werkzeug.datastructures import MultiDict
+
+from whatsapp_ride_service.config import Config, TestingConfig
+from whatsapp_ride_service.signatures import TwilioSignatureValidator
+
+URL = "https://rides.example.com/webhook"
+FORM = MultiDict({"From": "whatsapp:+15550000001", "Body": "ride"})
+
+
+def sign(url, params, token=TestingConfig.TWILIO_AUTH_TOKEN):
+    return RequestValidator(token).compute_signature(url, params)
+
+
+class TestTwilioSignatureValidator(unittest.TestCase):
+    """Test cases for accepting only requests Twilio signed."""
+
+    def test_signed_requests_pass_and_forgeries_fail(self):
+        validator = TwilioSignatureValidator.from_config(TestingConfig)
+        self.assertTrue(validator.valid(URL, FORM, sign(URL, FORM)))
+
+        tampered = MultiDict({**FORM, "Body": "ride 1,1 to 2,2"})
+        self.assertFalse(validator.valid(URL, tampered, sign(URL, FORM)))
+        self.assertFalse(validator.valid(URL, FORM, sign(URL, FORM, "other")))
+        self.assertFalse(validator.valid(URL, FORM, None))
+
+    def test_configured_url_wins_over_the_proxied_one(self):
+        validator = TwilioSignatureValidator("test-auth-token", webhook_url=URL)
+        proxied = "http://10.0.0.5:8000/webhook"
+        self.assertTrue(validator.valid(proxied, FORM, sign(URL, FORM)))
+        self.assertTrue(
+            validator.valid(
+                proxied, FORM, sign("https://rides.example.com:443/webhook", FORM)
+            )
+        )
+        self.assertFalse(validator.valid(proxied, FORM, sign(proxied, FORM)))
+
+    def test_configuration(self):
+        class Disabled(Config):
+            TWILIO_VALIDATE_SIGNATURES = False
+
+        self.assertIsNone(TwilioSignatureValidator.from_config(Disabled))
+        unconfigured = TwilioSignatureValidator(None)
+        self.assertFalse(unconfigured.valid(URL, FORM, sign(URL, FORM)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+"""Test suite tracking application start-up cost."""
+
+import unittest
+
+from benchmarks.startup import (
+    LEGACY_FILES,
+    LEGACY_STARTUP,
+    parse_importtime,
+    run_startup,
+)
+
+# SDKs that must only load once a request actually needs them
+DEFERRED = ("stripe", "twilio", "phonenumbers", "geopy")
+# Generous for a cold interpreter on a slow machine; loading a road graph
+# or an SDK client at import blows through it
+STARTUP_BUDGET_SECONDS = 3.0
+# Would fail start-up if the road graph were loaded eagerly
+LAZY_GRAPH = {"ROAD_GRAPH_PATH": "missing-road-graph.bin"}
+
+
+class TestStartup(unittest.TestCase):
+    """Test cases for what a cold start imports."""
+
+    def test_parse_importtime(self):
+        imports = parse_importtime(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   jwt.utils\n"
+            "import time:       300 |        420 | jwt\n"
+        )
+        self.assertEqual([i.module for i in imports], ["jwt.utils", "jwt"])
+        self.assertEqual([i.depth for i in imports], [1, 0])
+        self.assertEqual(imports[1].cumulative_us, 420)
+
+    def test_create_app_defers_sdk_imports(self):
+        _, imports = run_startup()
+        modules = {i.module.split(".")[0] for i in imports}
+        self.assertIn("whatsapp_ride_service", modules)
+        self.assertEqual(modules.intersection(DEFERRED), set())
+
+    def test_create_app_starts_within_budget(self):
+        elapsed, _ = run_startup(env=LAZY_GRAPH)
+        self.assertLess(elapsed, STARTUP_BUDGET_SECONDS)
+
+    def test_legacy_app_defers_setup(self):
+        elapsed, imports = run_startup(LEGACY_STARTUP, LAZY_GRAPH, LEGACY_FILES)
+        self.assertLess(elapsed, STARTUP_BUDGET_SECONDS)
+        modules = {i.module for i in imports}
+        self.assertIn("whatsapp_ride_service.app", modules)
+        # TwiML replies are plain XML; only the REST client is heavy
+        deferred = {m.split(".")[0] for m in modules} - {"twilio"}
+        self.assertEqual(deferred.intersection(DEFERRED), set())
+        self.assertNotIn("twilio.rest", modules)
+
+    def test_billing_defers_stripe(self):
+        _, imports = run_startup("import whatsapp_ride_service.billing")
+        self.assertNotIn("stripe", {i.module.split(".")[0] for i in imports})
+
+
+if __name__ == "__main__":
+    unittest.main()
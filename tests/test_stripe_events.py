@@ -0,0 +1,213 @@
+"""Test suite for the Stripe webhook event pipeline."""
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from whatsapp_ride_service.models import (
+    Base,
+    Driver,
+    Payment,
+    PaymentStatus,
+    Ride,
+    StripeEvent,
+    User,
+)
+from whatsapp_ride_service.notifications import NotificationQueue
+from whatsapp_ride_service.stripe_events import StripeEventConsumer, record_event
+
+NOW = datetime(2024, 1, 1, 12, 0)
+
+
+def stripe_payload(event_id, event_type, intent_id):
+    return json.dumps(
+        {"id": event_id, "type": event_type, "data": {"object": {"id": intent_id}}}
+    )
+
+
+class TestStripeEvents(unittest.TestCase):
+    """Test cases for recording and consuming webhook events."""
+
+    def setUp(self):
+        engine = self.create_engine()
+        Base.metadata.create_all(engine)
+        self.Session = sessionmaker(bind=engine)
+        self.sent = []
+        self.consumer = StripeEventConsumer(
+            self.Session,
+            notify=lambda phone, body: self.sent.append(phone),
+            batch_size=2,
+            clock=lambda: NOW,
+        )
+
+        session = self.Session()
+        user = User(
+            name="Rider", email="r@example.com", phone_number="+1", password_hash="x"
+        )
+        driver = Driver(name="Driver", phone_number="+2")
+        session.add_all([user, driver])
+        session.flush()
+        for index in range(3):
+            ride = Ride(
+                user_id=user.id,
+                driver_id=driver.id if index else None,
+                pickup_latitude=0,
+                pickup_longitude=0,
+                dropoff_latitude=0,
+                dropoff_longitude=0,
+            )
+            session.add(ride)
+            session.flush()
+            session.add(
+                Payment(
+                    user_id=user.id,
+                    ride_id=ride.id,
+                    amount=10.0,
+                    stripe_payment_intent_id=f"pi_{index}",
+                )
+            )
+        session.commit()
+        session.close()
+
+    def create_engine(self):
+        return create_engine("sqlite://", poolclass=StaticPool)
+
+    def record(self, event_id, event_type, intent_id):
+        session = self.Session()
+        payload = stripe_payload(event_id, event_type, intent_id)
+        recorded = record_event(session, event_id, event_type, payload.encode())
+        session.close()
+        return recorded
+
+    def statuses(self):
+        session = self.Session()
+        payments = session.query(Payment).order_by(Payment.id).all()
+        session.close()
+        return [(p.status, p.completed_at) for p in payments]
+
+    def test_duplicate_events_are_stored_once(self):
+        self.assertTrue(self.record("evt_1", "payment_intent.succeeded", "pi_0"))
+        self.assertFalse(self.record("evt_1", "payment_intent.succeeded", "pi_0"))
+        session = self.Session()
+        self.assertEqual(session.query(StripeEvent).count(), 1)
+        session.close()
+
+    def test_batches_update_payments_and_notify(self):
+        self.record("evt_1", "payment_intent.succeeded", "pi_0")
+        self.record("evt_2", "payment_intent.succeeded", "pi_1")
+        self.record("evt_3", "payment_intent.payment_failed", "pi_2")
+        self.record("evt_4", "charge.refunded", "ch_1")
+
+        self.assertEqual(self.consumer.drain(), 4)
+        self.assertEqual(
+            self.statuses(),
+            [
+                (PaymentStatus.COMPLETED, NOW),
+                (PaymentStatus.COMPLETED, NOW),
+                (PaymentStatus.FAILED, None),
+            ],
+        )
+        # The first ride has no driver, so only its passenger is told
+        self.assertEqual(self.sent, ["+1", "+1", "+2"])
+        self.assertEqual(self.consumer.process_batch(), 0)
+
+    def test_redelivered_success_does_not_notify_twice(self):
+        self.record("evt_1", "payment_intent.succeeded", "pi_1")
+        self.consumer.drain()
+        self.record("evt_2", "payment_intent.succeeded", "pi_1")
+        self.consumer.drain()
+        self.assertEqual(self.sent, ["+1", "+2"])
+
+    def test_failure_never_overrides_success(self):
+        self.record("evt_1", "payment_intent.succeeded", "pi_1")
+        self.record("evt_2", "payment_intent.payment_failed", "pi_1")
+        self.consumer.drain()
+        self.assertEqual(self.statuses()[1], (PaymentStatus.COMPLETED, NOW))
+
+    def test_malformed_events_do_not_block_later_ones(self):
+        session = self.Session()
+        record_event(session, "evt_1", "payment_intent.succeeded", b"{not json")
+        session.close()
+        self.record("evt_2", "payment_intent.succeeded", "pi_1")
+
+        self.assertEqual(self.consumer.drain(), 2)
+        self.assertEqual(self.statuses()[1], (PaymentStatus.COMPLETED, NOW))
+        session = self.Session()
+        errors = [e.error for e in session.query(StripeEvent).order_by(StripeEvent.id)]
+        session.close()
+        self.assertTrue(errors[0].startswith("Malformed payload"))
+        self.assertIsNone(errors[1])
+
+
+class TestConcurrentConsumers(TestStripeEvents):
+    """Test cases for consumers polling the same database at once."""
+
+    def create_engine(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        engine = create_engine(f"sqlite:///{os.path.join(directory.name, 'db')}")
+        self.addCleanup(engine.dispose)
+        return engine
+
+    def test_each_event_is_applied_once(self):
+        self.record("evt_1", "payment_intent.succeeded", "pi_1")
+        self.record("evt_2", "payment_intent.succeeded", "pi_2")
+        # Both consumers have read the same pending events before claiming
+        both_selected = threading.Barrier(2)
+
+        def clock():
+            both_selected.wait(5)
+            return NOW
+
+        consumers = [
+            StripeEventConsumer(
+                self.Session,
+                notify=lambda phone, body: self.sent.append(phone),
+                clock=clock,
+            )
+            for _ in range(2)
+        ]
+        claimed = []
+        threads = [
+            threading.Thread(target=lambda c=c: claimed.append(c.process_batch()))
+            for c in consumers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        self.assertEqual(sorted(claimed), [0, 2])
+        self.assertEqual(sorted(self.sent), ["+1", "+1", "+2", "+2"])
+
+
+class TestNotificationQueue(unittest.TestCase):
+    """Test cases for background message delivery."""
+
+    def test_messages_are_sent_and_failures_counted(self):
+        delivered = []
+
+        def send(phone_number, body):
+            if phone_number == "bad":
+                raise RuntimeError("Twilio is down")
+            delivered.append((phone_number, body))
+
+        notifications = NotificationQueue(send, workers=2)
+        for phone_number in ("+1", "bad", "+2"):
+            notifications.enqueue(phone_number, "hello")
+        self.assertTrue(notifications.join(5))
+        notifications.stop()
+
+        self.assertEqual(sorted(delivered), [("+1", "hello"), ("+2", "hello")])
+        self.assertEqual((notifications.sent, notifications.failed), (2, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""Test suite for surge pricing."""
+
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from whatsapp_ride_service import signals
+from whatsapp_ride_service.database_ops import DatabaseOps
+from whatsapp_ride_service.models import Base, Driver
+from whatsapp_ride_service.surge import RingCounter, SurgeEngine
+
+PICKUP = (40.7128, -74.0060)
+
+
+class TestRingCounter(unittest.TestCase):
+    """Test cases for the sliding-window counter."""
+
+    def test_events_leave_the_window(self):
+        counter = RingCounter(window_seconds=60, bucket_seconds=10)
+        counter.add(0)
+        counter.add(25, amount=2)
+        self.assertEqual(counter.value(55), 3)
+        self.assertEqual(counter.value(60), 2)
+        self.assertEqual(counter.value(90), 0)
+
+    def test_long_gap_clears_everything(self):
+        counter = RingCounter(window_seconds=60, bucket_seconds=10)
+        for t in range(0, 60, 5):
+            counter.add(t)
+        counter.add(10_000)
+        self.assertEqual(counter.value(10_000), 1)
+
+
+class TestSurgeEngine(unittest.TestCase):
+    """Test cases for multiplier computation."""
+
+    def setUp(self):
+        self.now = 0.0
+        self.engine = SurgeEngine(
+            cell_size_deg=0.02,
+            window_seconds=600,
+            bucket_seconds=30,
+            recompute_seconds=15,
+            sensitivity=0.5,
+            max_multiplier=2.0,
+            clock=lambda: self.now,
+        )
+
+    def test_demand_above_supply_raises_multiplier(self):
+        self.engine.update_driver(1, *PICKUP)
+        for _ in range(3):
+            self.engine.record_request(*PICKUP)
+        self.assertEqual(self.engine.multiplier(*PICKUP), 2.0)
+        self.assertEqual(self.engine.multiplier(0.0, 0.0), 1.0)
+
+    def test_multiplier_is_capped_and_recomputed_on_a_timer(self):
+        self.engine.record_request(*PICKUP)
+        self.assertEqual(self.engine.multiplier(*PICKUP), 1.5)
+        for _ in range(10):
+            self.engine.record_request(*PICKUP)
+        self.now = 5
+        self.assertEqual(self.engine.multiplier(*PICKUP), 1.5)
+        self.now = 15
+        self.assertEqual(self.engine.multiplier(*PICKUP), 2.0)
+        self.now = 1000
+        self.assertEqual(self.engine.multiplier(*PICKUP), 1.0)
+
+    def test_drivers_moving_and_going_offline_change_supply(self):
+        self.engine.record_request(*PICKUP)
+        self.engine.update_driver(1, 41.0, -75.0)
+        self.assertEqual(self.engine.multiplier(*PICKUP), 1.5)
+
+        self.engine.update_driver(1, *PICKUP)
+        self.assertEqual(self.engine.recompute(), {})
+
+        self.engine.set_driver_available(1, False)
+        self.assertEqual(len(self.engine.recompute()), 1)
+
+    def test_signals_feed_the_engine(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        driver = Driver(name="D", phone_number="+2", is_available=True)
+        session.add(driver)
+        session.commit()
+
+        self.engine.connect()
+        signals.ride_requested.send(1, latitude=PICKUP[0], longitude=PICKUP[1])
+        self.assertEqual(len(self.engine.recompute()), 1)
+
+        DatabaseOps(session).update_driver_location(driver.id, *PICKUP)
+        self.assertEqual(self.engine.recompute(), {})
+        session.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
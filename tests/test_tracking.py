@@ -0,0 +1,136 @@
+"""Test suite for live driver tracking."""
+
+import threading
+import unittest
+from types import SimpleNamespace
+
+from whatsapp_ride_service import signals
+from whatsapp_ride_service.models import RideStatus
+from whatsapp_ride_service.tracking import LocationHub, ProgressNotifier
+
+
+class TestLocationHub(unittest.TestCase):
+    """Test cases for location fan-out."""
+
+    def setUp(self):
+        self.hub = LocationHub(buffer_size=3, clock=lambda: 1000.0)
+        self.hub.bind_ride(ride_id=7, driver_id=1, user_id=42)
+
+    def test_updates_reach_ride_and_driver_subscribers(self):
+        by_ride = self.hub.subscribe(ride_id=7)
+        by_driver = self.hub.subscribe(driver_id=1)
+        other = self.hub.subscribe(driver_id=2)
+
+        self.hub.publish(1, 40.71, -74.00)
+
+        self.assertEqual([e.latitude for e in by_ride.get(0)], [40.71])
+        self.assertEqual([e.latitude for e in by_driver.get(0)], [40.71])
+        self.assertEqual(other.get(0), [])
+
+    def test_buffers_are_bounded(self):
+        subscription = self.hub.subscribe(ride_id=7)
+        for i in range(5):
+            self.hub.publish(1, 40.0 + i, -74.0)
+        events = subscription.get(0)
+        self.assertEqual([e.latitude for e in events], [42.0, 43.0, 44.0])
+        self.assertEqual(subscription.dropped, 2)
+
+    def test_new_subscribers_get_the_latest_position(self):
+        self.hub.publish(1, 40.71, -74.00)
+        self.assertEqual(len(self.hub.subscribe(ride_id=7).get(0)), 1)
+        self.assertEqual(self.hub.latest(1).longitude, -74.00)
+
+    def test_waiting_reader_is_woken(self):
+        subscription = self.hub.subscribe(ride_id=7)
+        timer = threading.Timer(0.05, self.hub.publish, args=(1, 40.71, -74.00))
+        timer.start()
+        self.assertEqual(len(subscription.get(5)), 1)
+        timer.join()
+
+    def test_unbind_closes_subscriptions(self):
+        subscription = self.hub.subscribe(ride_id=7)
+        self.hub.unbind_ride(7)
+        self.assertTrue(subscription.closed)
+        self.assertIsNone(self.hub.ride_binding(7))
+        self.hub.publish(1, 40.71, -74.00)
+        self.assertEqual(subscription.get(0), [])
+
+    def test_listeners_and_signal(self):
+        received = []
+        self.hub.add_listener(7, received.append)
+        self.hub.connect()
+        driver = SimpleNamespace(
+            id=1,
+            phone_number="+1",
+            current_latitude=40.71,
+            current_longitude=-74.0,
+            is_available=True,
+        )
+        signals.driver_location_updated.send(driver, latitude=40.71, longitude=-74.0)
+        self.assertEqual(len(received), 1)
+
+    def test_rides_follow_their_status(self):
+        signals.ride_status_changed.connect(self.hub.on_ride_status)
+        self.addCleanup(signals.ride_status_changed.disconnect, self.hub.on_ride_status)
+        signals.ride_status_changed.send(
+            43, ride_id=8, status=RideStatus.ACCEPTED, driver_id=2
+        )
+        self.assertEqual(self.hub.ride_binding(8), (2, 43))
+
+        received = []
+        self.hub.add_listener(8, received.append)
+        signals.ride_status_changed.send(43, ride_id=8, status=RideStatus.COMPLETED)
+        self.hub.publish(2, 40.71, -74.00)
+        self.assertIsNone(self.hub.ride_binding(8))
+        self.assertEqual(received, [])
+
+    def test_listeners_stop_at_pickup(self):
+        received = []
+        self.hub.add_listener(7, received.append)
+        subscription = self.hub.subscribe(ride_id=7)
+        self.hub.on_ride_status(42, ride_id=7, status=RideStatus.IN_PROGRESS)
+        self.hub.publish(1, 40.71, -74.00)
+        self.assertEqual(received, [])
+        self.assertEqual(len(subscription.get(0)), 1)
+
+    def test_failing_listeners_do_not_fail_the_update(self):
+        def broken(event):
+            raise RuntimeError("Twilio is down")
+
+        received = []
+        self.hub.add_listener(7, broken)
+        self.hub.add_listener(7, received.append)
+        with self.assertLogs("whatsapp_ride_service.tracking"):
+            self.hub.publish(1, 40.71, -74.00)
+        self.assertEqual(len(received), 1)
+
+
+class TestProgressNotifier(unittest.TestCase):
+    """Test cases for throttled passenger updates."""
+
+    def test_messages_are_throttled(self):
+        now = [0.0]
+        sent = []
+        notifier = ProgressNotifier(
+            send=sent.append,
+            pickup=(40.7128, -74.0060),
+            min_interval=60,
+            speed_kmh=30,
+            clock=lambda: now[0],
+        )
+        hub = LocationHub()
+        hub.bind_ride(7, 1, 42)
+        hub.add_listener(7, notifier)
+
+        hub.publish(1, 40.7578, -74.0060)
+        now[0] = 30
+        hub.publish(1, 40.7400, -74.0060)
+        now[0] = 61
+        hub.publish(1, 40.7200, -74.0060)
+
+        self.assertEqual(len(sent), 2)
+        self.assertIn("5.0 km away, about 10 min", sent[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,7 +4,14 @@ from flask import Flask
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, scoped_session
 
-from .models import Base
+from .db_migrate import ensure_schema
+from .eta import EtaEstimator
+from .phones import PhoneDirectory
+from .pricing import FareQuoteService
+from .replica import ReplicaRouter
+from .response_cache import ResponseCache
+from .surge import SurgeEngine
+from .tracking import LocationHub
 
 
 def create_app(config_name="development"):
@@ -26,22 +33,86 @@ def create_app(config_name="development"):
 
     # Initialize database
     engine = create_engine(app.config["SQLALCHEMY_DATABASE_URI"])
-    Base.metadata.create_all(engine)
+    ensure_schema(engine, auto_migrate=app.config["SCHEMA_AUTO_MIGRATE"])
     Session = sessionmaker(bind=engine)
+    if app.config["REPLICA_DATABASE_URL"]:
+        # History and stats reads may be served by the replica
+        router = ReplicaRouter(
+            engine,
+            create_engine(app.config["REPLICA_DATABASE_URL"]),
+            max_lag_seconds=app.config["REPLICA_MAX_LAG_SECONDS"],
+            lag_check_seconds=app.config["REPLICA_LAG_CHECK_SECONDS"],
+        )
+        Session = router.sessionmaker()
     app.db_session = scoped_session(Session)
 
+    # Archived rides live in the main database unless configured elsewhere
+    app.archive_session = None
+    if app.config["ARCHIVE_DATABASE_URL"]:
+        archive_engine = create_engine(app.config["ARCHIVE_DATABASE_URL"])
+        app.archive_session = scoped_session(sessionmaker(bind=archive_engine))
+
+    # Initialize ETA estimation, surge pricing and fare quoting
+    app.eta = EtaEstimator.from_file(
+        app.config["ROAD_GRAPH_PATH"],
+        fallback_speed_kmh=app.config["ETA_FALLBACK_SPEED_KMH"],
+        detour_factor=app.config["ETA_DETOUR_FACTOR"],
+    )
+    app.surge = SurgeEngine(
+        cell_size_deg=app.config["SURGE_CELL_SIZE_DEG"],
+        window_seconds=app.config["SURGE_WINDOW_SECONDS"],
+        bucket_seconds=app.config["SURGE_BUCKET_SECONDS"],
+        recompute_seconds=app.config["SURGE_RECOMPUTE_SECONDS"],
+        sensitivity=app.config["SURGE_SENSITIVITY"],
+        max_multiplier=app.config["SURGE_MAX_MULTIPLIER"],
+    )
+    app.surge.connect()
+    app.fare_quotes = FareQuoteService(
+        base_fare=app.config["BASE_FARE"],
+        rate_per_km=app.config["RATE_PER_KM"],
+        cell_size_deg=app.config["FARE_QUOTE_CELL_SIZE_DEG"],
+        max_entries=app.config["FARE_QUOTE_CACHE_SIZE"],
+        ttl_seconds=app.config["FARE_QUOTE_TTL_SECONDS"],
+        surge=app.surge,
+        eta=app.eta,
+    )
+
+    # Initialize live tracking
+    app.location_hub = LocationHub(buffer_size=app.config["TRACKING_BUFFER_SIZE"])
+    app.location_hub.connect()
+
+    # Initialize per-user caching of read-only responses
+    app.response_cache = ResponseCache(
+        max_users=app.config["RESPONSE_CACHE_USERS"],
+        ttl_seconds=app.config["RESPONSE_CACHE_TTL_SECONDS"],
+    )
+    app.response_cache.connect()
+
+    # Resolve phone numbers to users and drivers without a query per lookup
+    app.phone_directory = PhoneDirectory(
+        Session,
+        ttl_seconds=app.config["PHONE_DIRECTORY_TTL_SECONDS"],
+        miss_ttl_seconds=app.config["PHONE_DIRECTORY_MISS_TTL_SECONDS"],
+        max_entries=app.config["PHONE_DIRECTORY_SIZE"],
+    )
+    app.phone_directory.connect()
+
     # Register blueprints
     from .routes.auth_routes import auth_bp
     from .routes.user_routes import user_bp
     from .routes.ride_routes import ride_bp
+    from .routes.admin_routes import admin_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(user_bp)
     app.register_blueprint(ride_bp)
+    app.register_blueprint(admin_bp)
 
     @app.teardown_appcontext
     def cleanup(resp_or_exc):
         """Clean up database session."""
         app.db_session.close()
+        if app.archive_session is not None:
+            app.archive_session.close()
 
     return app
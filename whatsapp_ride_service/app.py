@@ -1,28 +1,120 @@
 from flask import Flask, request, jsonify
-from twilio.rest import Client
 from twilio.twiml.messaging_response import MessagingResponse
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, select
 from sqlalchemy.orm import sessionmaker
-from .models import Base, Driver, Ride, User, Payment
+from .models import Driver, Ride, User, Payment
+from .billing import CustomerDirectory, create_stripe_customer
+from .conversations import BookingFlow, confirmation_prompt
+from .database_ops import DatabaseOps
+from .db_migrate import ensure_schema
+from .dispatch import Dispatcher, rank_drivers
+from .eta import EtaEstimator
+from .notifications import NotificationQueue
+from .messages import CATALOG, TEMPLATES
+from .phones import PhoneDirectory, is_valid_phone, normalize_phone
+from .presence import PresenceTracker
+from .pricing import FareQuoteService, parse_route
+from .ratelimit import WebhookThrottle
+from .sharding import ShardRouter
+from .signals import ride_requested
+from .signatures import SIGNATURE_HEADER, TwilioSignatureValidator
+from .stripe_events import StripeEventConsumer, record_event
+from .surge import SurgeEngine
+from .tracking import LocationHub, ProgressNotifier
 from datetime import datetime
 import config
-from geopy.distance import geodesic
 import json
-import stripe
 import jwt
-from functools import wraps
-import phonenumbers
+from functools import lru_cache, wraps
 
 app = Flask(__name__)
-stripe.api_key = config.STRIPE_SECRET_KEY
 
-# Initialize Twilio client
-client = Client(config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN)
 
-# Initialize database
-engine = create_engine(config.DATABASE_URL)
-Base.metadata.create_all(engine)
-Session = sessionmaker(bind=engine)
+# Clients and the database are set up on first use rather than at import,
+# so workers boot without paying for the Twilio/Stripe SDKs or a DB round trip
+@lru_cache(maxsize=None)
+def twilio_client():
+    from twilio.rest import Client
+
+    return Client(config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN)
+
+
+@lru_cache(maxsize=None)
+def stripe_api():
+    import stripe
+
+    stripe.api_key = config.STRIPE_SECRET_KEY
+    return stripe
+
+
+@lru_cache(maxsize=None)
+def session_factory():
+    engine = create_engine(config.DATABASE_URL)
+    ensure_schema(engine)
+    factory = sessionmaker(bind=engine)
+    phone_directory.connect(factory)
+    return factory
+
+
+def new_session():
+    return session_factory()()
+
+
+# Likewise the road graph, surge, tracking and the shard connections
+@lru_cache(maxsize=None)
+def eta_estimator():
+    return EtaEstimator.from_file(config.ROAD_GRAPH_PATH)
+
+
+@lru_cache(maxsize=None)
+def surge_engine():
+    surge = SurgeEngine()
+    surge.connect()
+    return surge
+
+
+@lru_cache(maxsize=None)
+def location_hub():
+    hub = LocationHub()
+    hub.connect()
+    return hub
+
+
+@lru_cache(maxsize=None)
+def shard_router():
+    router = ShardRouter.from_config(config, new_session)
+    if router:
+        router.connect()
+    return router
+
+
+@lru_cache(maxsize=None)
+def fare_quotes():
+    return FareQuoteService(
+        base_fare=config.BASE_FARE,
+        rate_per_km=config.RATE_PER_KM,
+        surge=surge_engine(),
+        eta=eta_estimator(),
+    )
+
+
+@app.before_request
+def connect_receivers():
+    # Signals sent while handling a request must find their receivers
+    surge_engine()
+    location_hub()
+    shard_router()
+
+
+# Customers are created through stripe_api() so the API key is always set
+customers = CustomerDirectory(
+    new_session, create_customer=lambda user: create_stripe_customer(user, stripe_api())
+)
+phone_directory = PhoneDirectory.from_config(config, new_session)
+presence = PresenceTracker.from_config(config, new_session)
+presence.connect()
+signature_validator = TwilioSignatureValidator.from_config(config)
+webhook_throttle = WebhookThrottle.from_config(config)
 
 
 def token_required(f):
@@ -35,7 +127,7 @@ def token_required(f):
         try:
             token = token.split()[1]  # Remove 'Bearer ' prefix
             data = jwt.decode(token, config.JWT_SECRET_KEY, algorithms=["HS256"])
-            session = Session()
+            session = new_session()
             current_user = session.query(User).get(data["user_id"])
             session.close()
             if not current_user:
@@ -49,8 +141,7 @@ def token_required(f):
 
 
 def calculate_fare(pickup_coords, dest_coords):
-    distance = geodesic(pickup_coords, dest_coords).kilometers
-    return config.BASE_FARE + (distance * config.RATE_PER_KM)
+    return fare_quotes().quote(pickup_coords, dest_coords).fare
 
 
 @app.route("/api/register", methods=["POST"])
@@ -61,31 +152,25 @@ def register():
         return jsonify({"message": "Missing required fields"}), 400
 
     try:
-        # Validate phone number
-        phone_number = phonenumbers.parse(data["phone_number"], None)
-        if not phonenumbers.is_valid_number(phone_number):
+        # Validate phone number and store it in canonical E.164 form
+        if not is_valid_phone(data["phone_number"]):
             return jsonify({"message": "Invalid phone number"}), 400
+        phone_number = normalize_phone(data["phone_number"])
 
-        session = Session()
+        session = new_session()
 
         # Check if user already exists
-        if session.query(User).filter_by(phone_number=data["phone_number"]).first():
+        if session.query(User).filter_by(phone_number=phone_number).first():
             return jsonify({"message": "Phone number already registered"}), 400
 
         if session.query(User).filter_by(email=data["email"]).first():
             return jsonify({"message": "Email already registered"}), 400
 
-        # Create Stripe customer
-        stripe_customer = stripe.Customer.create(
-            phone=data["phone_number"], email=data["email"], name=data["name"]
-        )
-
-        # Create user
+        # Create user; the Stripe customer is created on first payment
         user = User(
-            phone_number=data["phone_number"],
+            phone_number=phone_number,
             name=data["name"],
             email=data["email"],
-            stripe_customer_id=stripe_customer.id,
         )
         user.set_password(data["password"])
 
@@ -108,8 +193,9 @@ def login():
     if not data or not data.get("phone_number") or not data.get("password"):
         return jsonify({"message": "Missing credentials"}), 400
 
-    session = Session()
-    user = session.query(User).filter_by(phone_number=data["phone_number"]).first()
+    session = new_session()
+    phone_number = normalize_phone(data["phone_number"]) or data["phone_number"]
+    user = session.query(User).filter_by(phone_number=phone_number).first()
 
     if not user or not user.check_password(data["password"]):
         return jsonify({"message": "Invalid credentials"}), 401
@@ -120,107 +206,278 @@ def login():
     return jsonify({"token": token})
 
 
+def find_candidate_drivers(latitude, longitude):
+    candidates = match_drivers(latitude, longitude)
+    if presence.running:
+        # Drivers silent since the last availability flush are skipped too
+        candidates = [c for c in candidates if presence.online(c.driver_id)]
+    return candidates
+
+
+def match_drivers(latitude, longitude):
+    router = shard_router()
+    if router:
+        # Matching runs in the shard owning the pickup region, without the DB
+        return router.match(latitude, longitude, radius_km=config.MAX_SEARCH_RADIUS_KM)
+
+    session = new_session()
+    nearby_drivers = DatabaseOps(session).get_available_drivers(
+        latitude, longitude, radius_km=config.MAX_SEARCH_RADIUS_KM
+    )
+    candidates = rank_drivers(
+        latitude,
+        longitude,
+        nearby_drivers,
+        max_radius_km=config.MAX_SEARCH_RADIUS_KM,
+        eta=eta_estimator(),
+    )
+    session.close()
+    return candidates
+
+
 def find_nearest_driver(latitude, longitude):
-    session = Session()
-    nearest_driver = None
-    min_distance = float("inf")
+    candidates = find_candidate_drivers(latitude, longitude)
+    return candidates[0] if candidates else None
+
+
+def offer_ride_to_driver(ride_id, candidate, offer):
+    # Offers are stored so the accept may reach any worker; this also stops
+    # later waves once another worker's accept has claimed the ride
+    session = new_session()
+    try:
+        if not DatabaseOps(session).record_offer(ride_id, candidate.driver_id):
+            return
+    finally:
+        session.close()
+    twilio_client().messages.create(
+        from_=f"whatsapp:{config.TWILIO_WHATSAPP_NUMBER}",
+        to=f"whatsapp:{candidate.phone_number}",
+        body=TEMPLATES.render("ride_offer", candidate.phone_number, **offer),
+    )
+
+
+def notify_no_driver_accepted(ride_id):
+    # Cancelling first means a late accept can no longer claim the ride
+    session = new_session()
+    if DatabaseOps(session).cancel_unclaimed_ride(ride_id) is not None:
+        ride = session.get(Ride, ride_id)
+        twilio_client().messages.create(
+            from_=f"whatsapp:{config.TWILIO_WHATSAPP_NUMBER}",
+            to=f"whatsapp:{ride.user.phone_number}",
+            body=TEMPLATES.render("no_driver_accepted", ride.user.phone_number),
+        )
+    session.close()
+
 
-    available_drivers = session.query(Driver).filter_by(is_available=True).all()
-    for driver in available_drivers:
-        distance = geodesic(
-            (latitude, longitude), (driver.current_latitude, driver.current_longitude)
-        ).km
+def send_whatsapp(phone_number, body):
+    twilio_client().messages.create(
+        from_=f"whatsapp:{config.TWILIO_WHATSAPP_NUMBER}",
+        to=f"whatsapp:{phone_number}",
+        body=body,
+    )
 
-        if distance < config.MAX_SEARCH_RADIUS_KM and distance < min_distance:
-            min_distance = distance
-            nearest_driver = driver
 
+notifications = NotificationQueue(send=send_whatsapp)
+stripe_events = StripeEventConsumer(new_session, notify=notifications.enqueue)
+dispatcher = Dispatcher(
+    notify=offer_ride_to_driver, on_exhausted=notify_no_driver_accepted
+)
+
+
+def start_surge_engine():
+    # Seed supply from the driver table once, then keep it current from signals
+    surge = surge_engine()
+    if surge.running:
+        return
+    session = new_session()
+    surge.seed_drivers(session.query(Driver).filter_by(is_available=True))
+    session.close()
+    surge.run_in_background()
+
+
+def start_presence():
+    # Available drivers get one timeout to check in before going offline
+    if presence.running:
+        return
+    session = new_session()
+    presence.seed(session.scalars(select(Driver.id).filter_by(is_available=True)))
     session.close()
-    return nearest_driver
+    presence.run_in_background()
+
 
+def process_ride_request(phone, user_id, message_body):
+    # Expected format: "ride pickup_lat,pickup_long to dest_lat,dest_long"
+    route = parse_route(message_body)
+    if not route:
+        return TEMPLATES.render("ride_format", phone)
+    return book_ride(phone, user_id, *route)
 
-def process_ride_request(user_id, message_body):
+
+def book_ride(phone, user_id, pickup_coords, dest_coords, quote=None):
+    session = None
+    unsaved_intent_id = None
     try:
-        # Expected format: "ride pickup_lat,pickup_long to dest_lat,dest_long"
-        parts = message_body.lower().split("to")
-        if len(parts) != 2:
-            return "Please use the format: ride pickup_lat,pickup_long to dest_lat,dest_long"
+        start_surge_engine()
+        ride_requested.send(
+            user_id, latitude=pickup_coords[0], longitude=pickup_coords[1]
+        )
 
-        pickup_coords = [
-            float(x.strip()) for x in parts[0].replace("ride", "").strip().split(",")
-        ]
-        dest_coords = [float(x.strip()) for x in parts[1].strip().split(",")]
+        candidates = find_candidate_drivers(pickup_coords[0], pickup_coords[1])
 
-        nearest_driver = find_nearest_driver(pickup_coords[0], pickup_coords[1])
+        if not candidates:
+            return TEMPLATES.render("no_drivers", phone)
 
-        if not nearest_driver:
-            return "Sorry, no drivers are currently available in your area."
+        session = new_session()
 
-        session = Session()
+        # A rider who confirmed a quote pays the fare they were shown
+        if quote is not None:
+            fare = quote.fare
+        else:
+            fare = calculate_fare(
+                (pickup_coords[0], pickup_coords[1]), (dest_coords[0], dest_coords[1])
+            )
 
-        # Calculate fare
-        fare = calculate_fare(
-            (pickup_coords[0], pickup_coords[1]), (dest_coords[0], dest_coords[1])
-        )
+        # The customer is stored in its own transaction, so it must be resolved
+        # before this session starts writing (SQLite allows a single writer)
+        customer_id = customers.customer_id_for(session.get(User, user_id))
 
-        # Create ride record
+        # Create ride record; the driver is assigned by the first accept
         ride = Ride(
-            passenger_id=user_id,
-            driver_id=nearest_driver.id,
+            user_id=user_id,
             pickup_latitude=pickup_coords[0],
             pickup_longitude=pickup_coords[1],
-            destination_latitude=dest_coords[0],
-            destination_longitude=dest_coords[1],
+            dropoff_latitude=dest_coords[0],
+            dropoff_longitude=dest_coords[1],
         )
+        payment = Payment(user_id=user_id, amount=fare)
+        ride.payment = payment
         session.add(ride)
         session.flush()
 
-        # Create payment record
-        user = session.query(User).get(user_id)
-        payment_intent = stripe.PaymentIntent.create(
+        # Stripe is only asked for an intent once both rows are known to insert
+        payment_intent = stripe_api().PaymentIntent.create(
             amount=int(fare * 100),  # Convert to cents
             currency=config.CURRENCY,
-            customer=user.stripe_customer_id,
+            customer=customer_id,
             metadata={"ride_id": ride.id},
         )
+        unsaved_intent_id = payment_intent.id
+        payment.stripe_payment_intent_id = payment_intent.id
+        session.commit()
+        unsaved_intent_id = None
+        ride_id = ride.id
+
+    except Exception:
+        # The rider gets a generic reply; the details are for the logs
+        app.logger.exception("Could not book a ride for user %s", user_id)
+        if session is not None:
+            session.rollback()
+        if unsaved_intent_id is not None:
+            cancel_payment_intent(unsaved_intent_id)
+        return TEMPLATES.render("request_failed", phone)
+    finally:
+        if session is not None:
+            session.close()
 
-        payment = Payment(
-            ride_id=ride.id, amount=fare, stripe_payment_intent_id=payment_intent.id
-        )
-        session.add(payment)
+    # Offer the ride to the nearest drivers, one wave at a time, each in the
+    # language of their own number. The ride is booked by now, so a failure
+    # here is logged rather than reported to the rider as a failed request.
+    offer = {
+        "ride_id": ride_id,
+        "pickup_latitude": pickup_coords[0],
+        "pickup_longitude": pickup_coords[1],
+        "dropoff_latitude": dest_coords[0],
+        "dropoff_longitude": dest_coords[1],
+        "fare": fare,
+    }
+    try:
+        dispatcher.start(ride_id, candidates, offer)
+        dispatcher.run_in_background()
+    except Exception:
+        app.logger.exception("Could not dispatch ride %s", ride_id)
 
-        nearest_driver.is_available = False
-        session.commit()
+    return TEMPLATES.render("looking_for_driver", phone, fare=fare)
 
-        # Notify driver
-        driver_message = (
-            f"New ride request!\n"
-            f"Pickup: {pickup_coords[0]}, {pickup_coords[1]}\n"
-            f"Destination: {dest_coords[0]}, {dest_coords[1]}\n"
-            f"Fare: ${fare:.2f}\n"
-            f"Reply 'accept {ride.id}' to accept this ride"
-        )
 
-        client.messages.create(
-            from_=f"whatsapp:{config.TWILIO_WHATSAPP_NUMBER}",
-            to=f"whatsapp:{nearest_driver.phone_number}",
-            body=driver_message,
-        )
+def cancel_payment_intent(payment_intent_id):
+    # The ride was never stored, so nothing would ever charge this intent
+    try:
+        stripe_api().PaymentIntent.cancel(payment_intent_id)
+    except Exception:
+        app.logger.exception("Could not cancel PaymentIntent %s", payment_intent_id)
 
-        session.close()
-        return (
-            f"Looking for a driver... We'll notify you when one accepts your ride!\n"
-            f"Estimated fare: ${fare:.2f}"
-        )
 
-    except Exception as e:
-        return f"Error processing your request: {str(e)}"
+def process_quote_request(phone, message_body):
+    # Expected format: "quote pickup_lat,pickup_long to dest_lat,dest_long"
+    route = parse_route(message_body)
+    if not route:
+        return TEMPLATES.render("quote_format", phone)
+
+    quote = fare_quotes().quote(*route)
+    booking.remember_quote(phone, *route, quote)
+    return confirmation_prompt(quote, phone)
+
+
+booking = BookingFlow(
+    quote=lambda pickup, dropoff: fare_quotes().quote(pickup, dropoff),
+    book=book_ride,
+)
+
+
+def accept_ride(session, phone, driver_id, message_body):
+    # Expected format: "accept ride_id"
+    try:
+        ride_id = int(message_body.split()[1])
+    except (IndexError, ValueError):
+        return TEMPLATES.render("accept_format", phone)
+
+    try:
+        # Only drivers offered an open ride may claim it; ids are guessable
+        db_ops = DatabaseOps(session)
+        offered = db_ops.was_offered(ride_id, driver_id)
+        if offered and db_ops.claim_ride(ride_id, driver_id):
+            dispatcher.settle(ride_id)
+            ride = session.get(Ride, ride_id)
+
+            # Stream the driver's position to the passenger until the
+            # ride ends; the claim has bound the ride in the hub
+            passenger_phone = ride.user.phone_number
+            location_hub().add_listener(
+                ride.id,
+                ProgressNotifier(
+                    # Queued: the driver's location update must not wait on
+                    # or fail with Twilio
+                    send=lambda body: notifications.enqueue(passenger_phone, body),
+                    pickup=(ride.pickup_latitude, ride.pickup_longitude),
+                    phone=passenger_phone,
+                ),
+            )
+
+            # Send payment link to passenger
+            payment = ride.payment
+            payment_link = stripe_api().PaymentLink.create(
+                payment_intent=payment.stripe_payment_intent_id
+            )
+
+            twilio_client().messages.create(
+                from_=f"whatsapp:{config.TWILIO_WHATSAPP_NUMBER}",
+                to=f"whatsapp:{passenger_phone}",
+                body=TEMPLATES.render(
+                    "ride_accepted", passenger_phone, payment_url=payment_link.url
+                ),
+            )
+            return TEMPLATES.render("driver_accepted", phone)
+        return TEMPLATES.render("ride_unavailable", phone)
+    except Exception:
+        app.logger.exception("Driver %s could not accept ride %s", driver_id, ride_id)
+        return TEMPLATES.render("accept_failed", phone)
 
 
 @app.route("/webhook/stripe", methods=["POST"])
 def stripe_webhook():
     payload = request.get_data()
     sig_header = request.headers.get("Stripe-Signature")
+    stripe = stripe_api()
 
     try:
         event = stripe.Webhook.construct_event(
@@ -231,98 +488,98 @@ def stripe_webhook():
     except stripe.error.SignatureVerificationError as e:
         return jsonify({"error": "Invalid signature"}), 400
 
-    if event.type == "payment_intent.succeeded":
-        payment_intent = event.data.object
-        session = Session()
-        payment = (
-            session.query(Payment)
-            .filter_by(stripe_payment_intent_id=payment_intent.id)
-            .first()
-        )
+    # Persist and ack; the consumer applies events in batches off-request
+    session = new_session()
+    record_event(session, event.id, event.type, payload)
+    session.close()
+    stripe_events.run_in_background()
+    stripe_events.wake()
 
-        if payment:
-            payment.status = "completed"
-            session.commit()
+    return jsonify({"status": "success"}), 200
 
-            # Notify both parties
-            ride = payment.ride
-            messages = [
-                (
-                    ride.passenger.phone_number,
-                    "Your payment has been processed successfully!",
-                ),
-                (
-                    ride.driver.phone_number,
-                    f"Payment of ${payment.amount:.2f} has been received for the ride.",
-                ),
-            ]
 
-            for phone_number, message in messages:
-                client.messages.create(
-                    from_=f"whatsapp:{config.TWILIO_WHATSAPP_NUMBER}",
-                    to=f"whatsapp:{phone_number}",
-                    body=message,
-                )
+def twiml_reply(body):
+    resp = MessagingResponse()
+    resp.message(body)
+    return str(resp)
 
-        session.close()
 
-    return jsonify({"status": "success"}), 200
+# Rendered once per language, so throttled senders are answered without any
+# other work
+THROTTLED_REPLIES = {
+    language: twiml_reply(TEMPLATES.render("throttled", language=language))
+    for language in CATALOG
+}
+
+
+def sender_language():
+    # Twilio sends "whatsapp:+<E.164>"; the calling code is all that matters
+    return TEMPLATES.language_for(request.values.get("From", "").split(":")[-1])
 
 
 @app.route("/webhook", methods=["POST"])
 def webhook():
-    incoming_msg = request.values.get("Body", "").lower()
-    sender = request.values.get("From", "").replace("whatsapp:", "")
+    # Forged requests are refused before they cost a rate-limit token or a query
+    if signature_validator and not signature_validator.valid(
+        request.url, request.form, request.headers.get(SIGNATURE_HEADER)
+    ):
+        return "", 403
 
-    session = Session()
-    user = session.query(User).filter_by(phone_number=sender).first()
+    if not webhook_throttle.allow(request.values.get("From"), request.remote_addr):
+        return THROTTLED_REPLIES[sender_language()]
 
-    if not user:
-        session.close()
-        return str(
-            MessagingResponse().message(
-                "Please register first through our app to use this service."
-            )
+    incoming_msg = request.values.get("Body", "").lower()
+    # Riders and drivers are told apart by one lookup on the E.164 number
+    sender = phone_directory.resolve(request.values.get("From"))
+    if sender is None:
+        return twiml_reply(
+            TEMPLATES.render("register_first", language=sender_language())
         )
+    user_id, driver_id = sender
+    phone = normalize_phone(request.values.get("From"))
+    start_presence()
+    if driver_id is not None:
+        # Any message from a driver shows their phone is still reachable
+        presence.heartbeat(driver_id)
+
+    session = new_session()
+
+    # Drivers share live location pins; they feed tracking, not a reply,
+    # unless the driver is booking a ride of their own
+    location = None
+    latitude = request.values.get("Latitude")
+    longitude = request.values.get("Longitude")
+    if latitude and longitude:
+        location = (float(latitude), float(longitude))
+        if driver_id is not None and not (
+            user_id is not None and booking.active(phone)
+        ):
+            DatabaseOps(session).update_driver_location(driver_id, *location)
+            session.close()
+            return str(MessagingResponse())
 
-    resp = MessagingResponse()
+    # Riders part-way through a booking answer its prompts
+    booking_reply = None
+    if user_id is not None and not incoming_msg.startswith("accept"):
+        booking_reply = booking.handle(phone, user_id, incoming_msg, location)
 
-    if incoming_msg.startswith("ride"):
-        response_message = process_ride_request(user.id, incoming_msg)
+    if incoming_msg.startswith("accept") and driver_id is None:
+        response_message = TEMPLATES.render("drivers_only", phone)
     elif incoming_msg.startswith("accept"):
-        # Handle driver accepting ride
-        try:
-            ride_id = int(incoming_msg.split()[1])
-            ride = session.query(Ride).get(ride_id)
-            if ride and ride.status == "requested":
-                ride.status = "accepted"
-                session.commit()
-
-                # Send payment link to passenger
-                payment = ride.payment
-                payment_link = stripe.PaymentLink.create(
-                    payment_intent=payment.stripe_payment_intent_id
-                )
-
-                client.messages.create(
-                    from_=f"whatsapp:{config.TWILIO_WHATSAPP_NUMBER}",
-                    to=f"whatsapp:{ride.passenger.phone_number}",
-                    body=f"Your ride has been accepted! Please complete the payment: {payment_link.url}",
-                )
-                response_message = "You've accepted the ride. Please proceed to pickup location once payment is confirmed."
-            else:
-                response_message = "This ride is no longer available."
-        except Exception as e:
-            response_message = f"Error accepting ride: {str(e)}"
+        response_message = accept_ride(session, phone, driver_id, incoming_msg)
+    elif user_id is None:
+        response_message = TEMPLATES.render("driver_help", phone)
+    elif booking_reply is not None:
+        response_message = booking_reply
+    elif incoming_msg.startswith("ride"):
+        response_message = process_ride_request(phone, user_id, incoming_msg)
+    elif incoming_msg.startswith("quote"):
+        response_message = process_quote_request(phone, incoming_msg)
     else:
-        response_message = (
-            "Welcome to WhatsApp Ride Service!\n"
-            "To request a ride, send: ride pickup_lat,pickup_long to dest_lat,dest_long"
-        )
+        response_message = TEMPLATES.render("welcome", phone)
 
     session.close()
-    resp.message(response_message)
-    return str(resp)
+    return twiml_reply(response_message)
 
 
 if __name__ == "__main__":
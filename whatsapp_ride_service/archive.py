@@ -0,0 +1,254 @@
+"""Move old terminal rides and their payments to archive tables.
+
+Completed and cancelled rides older than a cutoff are copied to
+``archived_rides``/``archived_payments`` and deleted from the hot tables in
+batches, so the tables every request touches stay small. Rides whose
+payment is still pending are left alone until Stripe settles them.
+A row already archived under the same id is not copied again if it is
+the same row, left behind by an interrupted run. A different row under
+that id means the id was reused: SQLite tables created before ids were
+made AUTOINCREMENT hand out the ids of deleted rows again. Such rides stay
+in the hot tables with their payments, and are logged and reported in
+``ArchiveResult.skipped`` for an operator to resolve.
+
+The archive tables live in the main database unless
+``ARCHIVE_DATABASE_URL`` points elsewhere; ``DatabaseOps`` history reads
+cover both tiers either way. Run it from cron with::
+
+    python -m whatsapp_ride_service.archive --days 90
+"""
+
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, NamedTuple, Optional, Set
+
+from sqlalchemy import and_, delete, exists, func, insert, select
+from sqlalchemy.engine import Connection, Engine
+
+from .config import Config
+from .models import (
+    ArchivedPayment,
+    ArchivedRide,
+    Payment,
+    PaymentStatus,
+    Ride,
+    RideOffer,
+    RideStatus,
+)
+
+TERMINAL_STATUSES = (RideStatus.COMPLETED, RideStatus.CANCELLED)
+
+rides = Ride.__table__
+payments = Payment.__table__
+archived_rides = ArchivedRide.__table__
+archived_payments = ArchivedPayment.__table__
+ride_offers = RideOffer.__table__
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveResult(NamedTuple):
+    """Totals from one archive run."""
+
+    rides: int
+    payments: int
+    seconds: float
+    skipped: List[int]  # Rides left in place because their archive id is taken
+
+
+class Archiver:
+    """Copies terminal rides to the archive tier and removes them from hot."""
+
+    def __init__(
+        self,
+        engine: Engine,
+        archive_engine: Optional[Engine] = None,
+        batch_size: int = Config.ARCHIVE_BATCH_SIZE,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ):
+        """Create an archiver.
+
+        Args:
+            engine: Engine of the hot database.
+            archive_engine: Engine holding the archive tables; defaults to
+                ``engine``.
+            batch_size: Rides moved per transaction.
+            clock: Source of the cutoff and ``archived_at`` timestamps.
+        """
+        self.engine = engine
+        self.archive_engine = archive_engine or engine
+        self.batch_size = batch_size
+        self.clock = clock
+
+    def create_tables(self) -> None:
+        """Create the archive tables in the archive database if missing."""
+        archived_rides.create(self.archive_engine, checkfirst=True)
+        archived_payments.create(self.archive_engine, checkfirst=True)
+
+    def archive(
+        self, older_than_days: int = Config.ARCHIVE_AFTER_DAYS
+    ) -> ArchiveResult:
+        """Archive every eligible ride, one batch at a time.
+
+        Returns:
+            How many rides and payments were moved, and how long it took.
+        """
+        start = time.perf_counter()
+        cutoff = self.clock() - timedelta(days=older_than_days)
+        moved_rides = moved_payments = 0
+        skipped: List[int] = []
+        after_id = 0
+        while True:
+            batch_rides, batch_payments, batch_skipped, after_id = self.archive_batch(
+                cutoff, after_id
+            )
+            moved_rides += batch_rides
+            moved_payments += batch_payments
+            skipped.extend(batch_skipped)
+            if batch_rides + len(batch_skipped) < self.batch_size:
+                return ArchiveResult(
+                    moved_rides, moved_payments, time.perf_counter() - start, skipped
+                )
+
+    def archive_batch(self, cutoff: datetime, after_id: int = 0) -> tuple:
+        """Move one batch of rides that reached a terminal state before ``cutoff``.
+
+        Args:
+            cutoff: Rides that ended at or after this time stay hot.
+            after_id: Only rides with a higher id are considered, so rides
+                skipped by an earlier batch are not picked up again.
+
+        Returns:
+            The number of rides and payments moved, the ids of rides skipped
+            because their archive id is taken, and the highest ride id seen.
+        """
+        with self.engine.begin() as hot:
+            ride_rows = self._eligible_rides(hot, cutoff, after_id)
+            if not ride_rows:
+                return 0, 0, [], after_id
+            ride_ids = [row["id"] for row in ride_rows]
+            payment_rows = (
+                hot.execute(select(payments).where(payments.c.ride_id.in_(ride_ids)))
+                .mappings()
+                .all()
+            )
+
+            if self.archive_engine is self.engine:
+                skipped = self._copy(hot, ride_rows, payment_rows)
+            else:
+                # Copy first: a crash before the delete leaves rows in both
+                # tiers until the next run, which skips what is archived
+                with self.archive_engine.begin() as archive:
+                    skipped = self._copy(archive, ride_rows, payment_rows)
+
+            for ride_id in sorted(skipped):
+                logger.warning(
+                    "Ride %s not archived: its id already holds a different "
+                    "archived ride or payment",
+                    ride_id,
+                )
+            moved = [ride_id for ride_id in ride_ids if ride_id not in skipped]
+            moved_payments = sum(row["ride_id"] in moved for row in payment_rows)
+            if moved:
+                hot.execute(delete(payments).where(payments.c.ride_id.in_(moved)))
+                hot.execute(delete(ride_offers).where(ride_offers.c.ride_id.in_(moved)))
+                hot.execute(delete(rides).where(rides.c.id.in_(moved)))
+        return len(moved), moved_payments, sorted(skipped), ride_ids[-1]
+
+    def _eligible_rides(
+        self, connection: Connection, cutoff: datetime, after_id: int
+    ) -> List:
+        pending_payment = exists().where(
+            and_(
+                payments.c.ride_id == rides.c.id,
+                payments.c.status == PaymentStatus.PENDING,
+            )
+        )
+        return (
+            connection.execute(
+                select(rides)
+                .where(
+                    rides.c.id > after_id,
+                    rides.c.status.in_(TERMINAL_STATUSES),
+                    func.coalesce(rides.c.completed_at, rides.c.created_at) < cutoff,
+                    ~pending_payment,
+                )
+                .order_by(rides.c.id)
+                .limit(self.batch_size)
+            )
+            .mappings()
+            .all()
+        )
+
+    def _copy(self, connection: Connection, ride_rows, payment_rows) -> Set[int]:
+        tables = (
+            (archived_rides, ride_rows, "id"),
+            (archived_payments, payment_rows, "ride_id"),
+        )
+        already = {}
+        skipped = set()
+        for table, rows, ride_key in tables:
+            ids = [row["id"] for row in rows]
+            already[table] = {
+                row["id"]: row
+                for row in connection.execute(
+                    select(table).where(table.c.id.in_(ids))
+                ).mappings()
+            }
+            for row in rows:
+                archived = already[table].get(row["id"])
+                if archived is not None and any(
+                    archived[key] != value for key, value in row.items()
+                ):
+                    # A reused id, not a copy left by an interrupted run;
+                    # deleting the hot row now would lose it
+                    skipped.add(row[ride_key])
+
+        now = self.clock()
+        for table, rows, ride_key in tables:
+            values = [
+                {**row, "archived_at": now}
+                for row in rows
+                if row[ride_key] not in skipped and row["id"] not in already[table]
+            ]
+            if values:
+                connection.execute(insert(table), values)
+        return skipped
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point for archiving."""
+    from sqlalchemy import create_engine
+
+    from .config import DevelopmentConfig
+
+    parser = argparse.ArgumentParser(description="Archive terminal rides")
+    parser.add_argument("--days", type=int, default=Config.ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=Config.ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    config = DevelopmentConfig
+    engine = create_engine(config.SQLALCHEMY_DATABASE_URI)
+    archive_engine = (
+        create_engine(config.ARCHIVE_DATABASE_URL)
+        if config.ARCHIVE_DATABASE_URL
+        else None
+    )
+    archiver = Archiver(engine, archive_engine, batch_size=args.batch_size)
+    archiver.create_tables()
+    result = archiver.archive(older_than_days=args.days)
+    print(
+        f"Archived {result.rides} rides and {result.payments} payments "
+        f"in {result.seconds:.1f}s"
+    )
+    if result.skipped:
+        print(
+            f"Skipped {len(result.skipped)} rides whose ids are already taken "
+            f"in the archive: {', '.join(map(str, result.skipped))}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ from flask import request, jsonify, current_app
 import jwt
 from datetime import datetime, timedelta
 from .models import User
+from .phones import normalize_phone
 from sqlalchemy.orm import Session
 import re
 import bcrypt
@@ -102,7 +103,8 @@ class UserManager:
         if not is_valid:
             raise ValueError(msg)
 
-        # Validate phone number
+        # Validate phone number, stored in canonical E.164 form
+        phone_number = normalize_phone(phone_number) or phone_number
         is_valid, msg = validate_phone_number(phone_number)
         if not is_valid:
             raise ValueError(msg)
@@ -131,6 +133,7 @@ class UserManager:
         return user
 
     def authenticate_user(self, phone_number, password):
+        phone_number = normalize_phone(phone_number) or phone_number
         user = self.session.query(User).filter_by(phone_number=phone_number).first()
 
         if user and user.check_password(
@@ -153,6 +156,7 @@ class UserManager:
                 raise ValueError(msg)
             user.email = email
         if phone_number:
+            phone_number = normalize_phone(phone_number) or phone_number
             is_valid, msg = validate_phone_number(phone_number)
             if not is_valid:
                 raise ValueError(msg)
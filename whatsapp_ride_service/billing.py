@@ -0,0 +1,203 @@
+"""Lazy Stripe customer management.
+
+Signing up no longer talks to Stripe. A customer is created the first
+time a user pays (``CustomerDirectory.customer_id_for``) or by the bulk
+``backfill`` job, and the user-to-customer mapping is cached in process so
+repeat payments skip the database lookup as well.
+
+Backfill existing users with::
+
+    python -m whatsapp_ride_service.billing backfill --workers 8
+"""
+
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from .config import Config
+from .models import User
+from .replica import note_writes
+
+
+def create_stripe_customer(user, api=None) -> str:
+    """Create a Stripe customer for ``user`` and return its id.
+
+    The idempotency key makes concurrent or retried calls for the same user
+    return the same customer instead of creating duplicates.
+
+    Args:
+        user: A ``User`` row.
+        api: The ``stripe`` module with its API key set; by default it is
+            imported here and must have been configured by the caller.
+    """
+    if api is None:
+        # The Stripe SDK takes about half a second to import; load it on first use
+        import stripe as api
+
+    customer = api.Customer.create(
+        phone=user.phone_number,
+        email=user.email,
+        name=user.name,
+        metadata={"user_id": user.id},
+        idempotency_key=f"customer-user-{user.id}",
+    )
+    return customer.id
+
+
+class CustomerDirectory:
+    """Maps users to Stripe customers, creating them on first use."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        create_customer: Callable[[object], str] = create_stripe_customer,
+        max_entries: int = Config.STRIPE_CUSTOMER_CACHE_SIZE,
+    ):
+        """Create a directory.
+
+        Args:
+            session_factory: Returns a new database session.
+            create_customer: Creates a Stripe customer for a user row and
+                returns its id.
+            max_entries: Cached mappings kept before the oldest are dropped.
+        """
+        self.session_factory = session_factory
+        self.create_customer = create_customer
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[int, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached(self, user_id: int) -> Optional[str]:
+        """Return the cached customer id of a user, if any."""
+        with self._lock:
+            customer_id = self._cache.get(user_id)
+            if customer_id is not None:
+                self._cache.move_to_end(user_id)
+            return customer_id
+
+    def remember(self, user_id: int, customer_id: str) -> None:
+        """Cache a user's customer id."""
+        with self._lock:
+            self._cache[user_id] = customer_id
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def customer_id_for(self, user) -> str:
+        """Return the Stripe customer id of ``user``, creating it if needed.
+
+        A new customer is stored and committed in a session of its own, so
+        call this before the caller's session writes anything: the two
+        would otherwise be separate transactions, and on SQLite the second
+        writer fails with "database is locked".
+
+        Args:
+            user: A ``User`` row.
+
+        Returns:
+            The Stripe customer id.
+        """
+        customer_id = self.cached(user.id) or user.stripe_customer_id
+        if customer_id is None:
+            customer_id = self._create_and_store(user)
+        self.remember(user.id, customer_id)
+        return customer_id
+
+    def backfill(
+        self,
+        batch_size: int = Config.STRIPE_BACKFILL_BATCH_SIZE,
+        max_workers: int = Config.STRIPE_BACKFILL_WORKERS,
+    ) -> int:
+        """Create customers for every user that does not have one yet.
+
+        Users are read in id order one batch at a time; each batch's Stripe
+        calls run on at most ``max_workers`` threads and the results are
+        written back with one statement per user in a single commit.
+
+        Returns:
+            The number of customers created.
+        """
+        created = 0
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while True:
+                session = self.session_factory()
+                try:
+                    users = (
+                        session.execute(
+                            select(User)
+                            .where(User.stripe_customer_id.is_(None), User.id > last_id)
+                            .order_by(User.id)
+                            .limit(batch_size)
+                        )
+                        .scalars()
+                        .all()
+                    )
+                    if not users:
+                        return created
+                    last_id = users[-1].id
+                    customer_ids = list(pool.map(self.create_customer, users))
+                    for user, customer_id in zip(users, customer_ids):
+                        created += self._store(session, user.id, customer_id)
+                    session.commit()
+                finally:
+                    session.close()
+
+    def _create_and_store(self, user) -> str:
+        customer_id = self.create_customer(user)
+        session = self.session_factory()
+        try:
+            if not self._store(session, user.id, customer_id):
+                # Someone else stored a customer first; keep theirs
+                customer_id = session.scalar(
+                    select(User.stripe_customer_id).where(User.id == user.id)
+                )
+            session.commit()
+        finally:
+            session.close()
+        return customer_id
+
+    def _store(self, session: Session, user_id: int, customer_id: str) -> bool:
+        result = session.execute(
+            update(User)
+            .where(User.id == user_id, User.stripe_customer_id.is_(None))
+            .values(stripe_customer_id=customer_id)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            note_writes(session, user_ids=[user_id])
+            self.remember(user_id, customer_id)
+        return bool(result.rowcount)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point for the customer backfill."""
+    import stripe
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from .config import DevelopmentConfig
+
+    parser = argparse.ArgumentParser(description="Manage Stripe customers")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--workers", type=int, default=Config.STRIPE_BACKFILL_WORKERS)
+    parser.add_argument(
+        "--batch-size", type=int, default=Config.STRIPE_BACKFILL_BATCH_SIZE
+    )
+    args = parser.parse_args(argv)
+
+    config = DevelopmentConfig
+    stripe.api_key = config.STRIPE_SECRET_KEY
+    engine = create_engine(config.SQLALCHEMY_DATABASE_URI)
+    directory = CustomerDirectory(sessionmaker(bind=engine))
+    created = directory.backfill(batch_size=args.batch_size, max_workers=args.workers)
+    print(f"Created {created} Stripe customers")
+
+
+if __name__ == "__main__":
+    main()
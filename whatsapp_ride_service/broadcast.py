@@ -0,0 +1,402 @@
+"""Broadcast a WhatsApp message to every driver in an area.
+
+Drivers within a radius of a point are read in id-ordered chunks and each
+chunk is handed to a ``NotificationQueue``, whose worker threads send
+concurrently while a token bucket keeps the overall rate within the
+sender's Twilio limit. After every chunk the last driver id reached and
+the drivers whose send failed are written to a checkpoint file. Running
+the broadcast again resumes after the last finished chunk, first retrying
+the failed drivers, and so does rerunning a finished broadcast that had
+failures.
+
+Delivery is at least once per chunk: a run interrupted part-way through a
+chunk sends that whole chunk again when resumed, so drivers already
+messaged from it get the message twice. ``--chunk-size`` bounds how many::
+
+    python -m whatsapp_ride_service.broadcast 40.6413 -73.7781 --radius-km 3 \\
+        --template high_demand --var "area=JFK Airport" --checkpoint jfk.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from .config import Config
+from .database_ops import DatabaseOps
+from .messages import TEMPLATES
+from .notifications import NotificationQueue
+from .ratelimit import TokenBucketLimiter
+
+# Renders the bodies for a chunk of recipients as (phone_number, body) pairs
+Render = Callable[[List[str]], List[Tuple[str, str]]]
+
+
+def text_message(body: str) -> Render:
+    """Send the same text to every recipient."""
+    return lambda phones: [(phone, body) for phone in phones]
+
+
+def template_message(key: str, **values) -> Render:
+    """Send a catalog template, each recipient in their own language."""
+    return lambda phones: TEMPLATES.render_batch(key, phones, **values)
+
+
+class BroadcastProgress(NamedTuple):
+    """How far a broadcast got, as stored in its checkpoint.
+
+    ``failed`` counts the drivers in ``failed_driver_ids``, whose latest
+    send failed and who are retried by the next run.
+    """
+
+    last_driver_id: int = 0
+    sent: int = 0
+    failed: int = 0
+    done: bool = False
+    failed_driver_ids: Tuple[int, ...] = ()
+
+
+class BroadcastReport(NamedTuple):
+    """Totals from one broadcast run."""
+
+    recipients: int
+    sent: int
+    failed: int
+    seconds: float
+
+    @property
+    def messages_per_second(self) -> float:
+        """Messages attempted per second."""
+        return self.recipients / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        """Return a one-line human readable summary."""
+        return (
+            f"{self.sent} sent, {self.failed} failed to {self.recipients} drivers "
+            f"in {self.seconds:.1f}s ({self.messages_per_second:,.1f} msg/s)"
+        )
+
+
+class Checkpoint:
+    """Broadcast progress kept in a JSON file.
+
+    A finished broadcast stays recorded, so running it again only retries
+    the drivers whose send failed.
+    """
+
+    def __init__(self, path: str, key: str):
+        """Create a checkpoint.
+
+        Args:
+            path: File the progress is written to.
+            key: Identifies the broadcast; progress saved under another key
+                (a different area or message) is ignored.
+        """
+        self.path = path
+        self.key = key
+
+    @staticmethod
+    def key_for(*parts) -> str:
+        """Derive a checkpoint key from whatever defines a broadcast."""
+        text = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+    def load(self) -> BroadcastProgress:
+        """Return the saved progress, or a fresh start."""
+        try:
+            with open(self.path) as source:
+                saved = json.load(source)
+        except FileNotFoundError:
+            return BroadcastProgress()
+        if saved.get("key") != self.key:
+            return BroadcastProgress()
+        progress = BroadcastProgress(
+            **{
+                field: saved.get(field, default)
+                for field, default in BroadcastProgress._field_defaults.items()
+            }
+        )
+        return progress._replace(failed_driver_ids=tuple(progress.failed_driver_ids))
+
+    def save(self, progress: BroadcastProgress) -> None:
+        """Write progress atomically, so a crash never leaves half a file."""
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as target:
+            json.dump({"key": self.key, **progress._asdict()}, target)
+        os.replace(temporary, self.path)
+
+
+class Broadcaster:
+    """Sends one message to the drivers of an area, chunk by chunk."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        send: Callable[[str, str], None],
+        workers: int = Config.BROADCAST_WORKERS,
+        messages_per_second: float = Config.BROADCAST_MESSAGES_PER_SECOND,
+        chunk_size: int = Config.BROADCAST_CHUNK_SIZE,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """Create a broadcaster.
+
+        Args:
+            session_factory: Returns a new database session.
+            send: Delivers one message, called as ``send(phone_number, body)``.
+            workers: Concurrent sends.
+            messages_per_second: Sustained send rate across all workers.
+            chunk_size: Drivers read, sent and checkpointed at a time.
+            clock: Monotonic time source for pacing and the report.
+            sleep: Waits while the rate limit is exhausted.
+        """
+        self.session_factory = session_factory
+        self.send = send
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.clock = clock
+        self.sleep = sleep
+        self._interval = 1.0 / messages_per_second
+        self._limiter = TokenBucketLimiter(
+            rate_per_minute=messages_per_second * 60,
+            burst=max(1.0, messages_per_second),
+            max_keys=1,
+            clock=clock,
+        )
+        # Phone numbers whose send failed in the chunk being sent
+        self._failures: Set[str] = set()
+        self._failures_lock = threading.Lock()
+
+    def broadcast(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        render: Render,
+        checkpoint: Optional[Checkpoint] = None,
+        available_only: bool = False,
+        on_progress: Optional[Callable[[BroadcastProgress], None]] = None,
+    ) -> BroadcastReport:
+        """Message every driver within ``radius_km`` of a point.
+
+        Args:
+            latitude: Latitude of the area's center.
+            longitude: Longitude of the area's center.
+            radius_km: Radius of the area.
+            render: Builds the bodies of a chunk, see ``text_message`` and
+                ``template_message``.
+            checkpoint: Where progress is saved and resumed from.
+            available_only: Skip drivers who are offline or on a ride.
+            on_progress: Called with the cumulative progress after each
+                chunk.
+
+        Returns:
+            Totals for the drivers messaged by this run.
+        """
+        resumed = checkpoint.load() if checkpoint else BroadcastProgress()
+        if resumed.done and not resumed.failed_driver_ids:
+            return BroadcastReport(0, 0, 0, 0.0)
+        progress = resumed
+        start = self.clock()
+        recipients = 0
+        # Failed drivers not retried yet, and those that failed in this run
+        unretried = set(resumed.failed_driver_ids)
+        failing: Set[int] = set()
+
+        outbox = NotificationQueue(
+            send=self._paced_send, workers=self.workers, max_size=self.chunk_size
+        )
+        session = self.session_factory()
+        try:
+            drivers = DatabaseOps(session)
+            retries = (
+                drivers.iter_drivers_in_area(
+                    latitude,
+                    longitude,
+                    radius_km,
+                    chunk_size=self.chunk_size,
+                    available_only=available_only,
+                    driver_ids=sorted(unretried),
+                )
+                if unretried
+                else []
+            )
+            remaining = drivers.iter_drivers_in_area(
+                latitude,
+                longitude,
+                radius_km,
+                after_id=progress.last_driver_id,
+                chunk_size=self.chunk_size,
+                available_only=available_only,
+            )
+            for retry, chunks in ((True, retries), (False, remaining)):
+                if not retry and resumed.done:
+                    break
+                for chunk in chunks:
+                    failing |= self._send_chunk(outbox, render, chunk)
+                    recipients += len(chunk)
+                    last_driver_id = progress.last_driver_id
+                    if retry:
+                        # Drivers skipped here have left the area or gone offline
+                        unretried = {i for i in unretried if i > chunk[-1][0]}
+                    else:
+                        last_driver_id = chunk[-1][0]
+                    progress = self._progress(
+                        last_driver_id,
+                        resumed.sent + outbox.sent,
+                        resumed.done,
+                        unretried | failing,
+                    )
+                    if checkpoint:
+                        checkpoint.save(progress)
+                    if on_progress:
+                        on_progress(progress)
+                unretried = set()
+        finally:
+            session.close()
+            outbox.stop()
+
+        progress = self._progress(
+            progress.last_driver_id, resumed.sent + outbox.sent, True, failing
+        )
+        if checkpoint:
+            checkpoint.save(progress)
+        return BroadcastReport(
+            recipients, outbox.sent, outbox.failed, self.clock() - start
+        )
+
+    def _send_chunk(
+        self, outbox: NotificationQueue, render: Render, chunk: List[Tuple[int, str]]
+    ) -> Set[int]:
+        with self._failures_lock:
+            self._failures.clear()
+        for phone_number, body in render([phone for _, phone in chunk]):
+            outbox.enqueue(phone_number, body)
+        # Checkpoint only once every send of the chunk was attempted
+        outbox.join()
+        with self._failures_lock:
+            return {driver_id for driver_id, phone in chunk if phone in self._failures}
+
+    @staticmethod
+    def _progress(
+        last_driver_id: int, sent: int, done: bool, failed_driver_ids: Set[int]
+    ) -> BroadcastProgress:
+        return BroadcastProgress(
+            last_driver_id,
+            sent,
+            len(failed_driver_ids),
+            done,
+            tuple(sorted(failed_driver_ids)),
+        )
+
+    def _paced_send(self, phone_number: str, body: str) -> None:
+        while not self._limiter.allow("twilio"):
+            self.sleep(self._interval)
+        try:
+            self.send(phone_number, body)
+        except Exception:
+            with self._failures_lock:
+                self._failures.add(phone_number)
+            raise
+
+
+def _parse_vars(pairs: List[str]) -> Dict[str, str]:
+    values = {}
+    for pair in pairs:
+        name, separator, value = pair.partition("=")
+        if not separator:
+            raise ValueError(f"Expected name=value, got {pair!r}")
+        values[name] = value
+    return values
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point for area broadcasts."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from twilio.rest import Client
+
+    from .config import DevelopmentConfig
+
+    parser = argparse.ArgumentParser(description="Message every driver in an area")
+    parser.add_argument("latitude", type=float)
+    parser.add_argument("longitude", type=float)
+    parser.add_argument("--radius-km", type=float, default=Config.MAX_SEARCH_RADIUS_KM)
+    message = parser.add_mutually_exclusive_group(required=True)
+    message.add_argument("--message", help="Text sent to every driver as is")
+    message.add_argument("--template", help="Message key, sent in each language")
+    parser.add_argument(
+        "--var", action="append", default=[], help="Template field as name=value"
+    )
+    parser.add_argument("--available-only", action="store_true")
+    parser.add_argument("--checkpoint", help="Progress file used to resume")
+    parser.add_argument("--workers", type=int, default=Config.BROADCAST_WORKERS)
+    parser.add_argument(
+        "--rate", type=float, default=Config.BROADCAST_MESSAGES_PER_SECOND
+    )
+    parser.add_argument("--chunk-size", type=int, default=Config.BROADCAST_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.message:
+        render = text_message(args.message)
+    else:
+        try:
+            TEMPLATES.template(args.template, TEMPLATES.default_language)
+            render = template_message(args.template, **_parse_vars(args.var))
+        except KeyError:
+            parser.error(f"Unknown message template: {args.template}")
+        except ValueError as e:
+            parser.error(str(e))
+    checkpoint = None
+    if args.checkpoint:
+        key = Checkpoint.key_for(
+            args.latitude,
+            args.longitude,
+            args.radius_km,
+            args.message,
+            args.template,
+            args.var,
+            args.available_only,
+        )
+        checkpoint = Checkpoint(args.checkpoint, key)
+
+    config = DevelopmentConfig
+    client = Client(config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN)
+
+    def send(phone_number, body):
+        client.messages.create(
+            from_=f"whatsapp:{config.TWILIO_WHATSAPP_NUMBER}",
+            to=f"whatsapp:{phone_number}",
+            body=body,
+        )
+
+    engine = create_engine(config.SQLALCHEMY_DATABASE_URI)
+    broadcaster = Broadcaster(
+        sessionmaker(bind=engine),
+        send,
+        workers=args.workers,
+        messages_per_second=args.rate,
+        chunk_size=args.chunk_size,
+    )
+    report = broadcaster.broadcast(
+        args.latitude,
+        args.longitude,
+        args.radius_km,
+        render,
+        checkpoint=checkpoint,
+        available_only=args.available_only,
+        on_progress=lambda progress: print(
+            f"up to driver {progress.last_driver_id}: "
+            f"{progress.sent} sent, {progress.failed} failed"
+        ),
+    )
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -16,26 +16,115 @@ class Config:
     TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
     TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
     TWILIO_WHATSAPP_NUMBER = os.getenv("TWILIO_WHATSAPP_NUMBER")
+    # Reject /webhook requests not signed by Twilio; "false" only for local use
+    TWILIO_VALIDATE_SIGNATURES = os.getenv("TWILIO_VALIDATE_SIGNATURES") != "false"
+    TWILIO_WEBHOOK_URL = os.getenv("TWILIO_WEBHOOK_URL")  # Public URL Twilio signs
+
+    # Messaging Configuration
+    NOTIFICATION_WORKERS = 4  # Threads sending queued WhatsApp messages
+    NOTIFICATION_QUEUE_SIZE = 10000  # Queued messages before senders block
+    BROADCAST_CHUNK_SIZE = 500  # Drivers read and sent per broadcast checkpoint
+    BROADCAST_WORKERS = 8  # Concurrent Twilio calls during a broadcast
+    BROADCAST_MESSAGES_PER_SECOND = 20  # Stay within the sender's Twilio limit
+    MESSAGE_DEFAULT_LANGUAGE = "en"  # For countries without translated messages
+
+    # Phone Number Configuration
+    PHONE_DEFAULT_REGION = os.getenv("PHONE_DEFAULT_REGION")  # Used without +code
+    PHONE_CACHE_SIZE = 100000  # Memoized phone number parses
+    PHONE_DIRECTORY_SIZE = 100000  # Senders kept resolved in memory
+    PHONE_DIRECTORY_TTL_SECONDS = 300  # Bounds staleness of changes made elsewhere
+    PHONE_DIRECTORY_MISS_TTL_SECONDS = 30  # Unknown senders skip the DB this long
+
+    # Webhook Rate Limit Configuration
+    WEBHOOK_SENDER_RATE_PER_MINUTE = 20  # Sustained messages per phone number
+    WEBHOOK_SENDER_BURST = 10  # Messages a number may send back to back
+    WEBHOOK_IP_RATE_PER_MINUTE = 6000  # Twilio relays every sender, so keep high
+    WEBHOOK_IP_BURST = 600
+    RATE_LIMIT_MAX_KEYS = 100000  # In-memory buckets kept per limiter
+    RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH")  # Shared SQLite file
 
     # Database Configuration
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "sqlite:///rides.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SCHEMA_AUTO_MIGRATE = True  # Apply pending migrations at startup
+    MIGRATION_BATCH_SIZE = 5000  # Rows updated per backfill transaction
+    REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")  # Unset: no replica
+    REPLICA_MAX_LAG_SECONDS = 5  # Staleness bound for history and stats reads
+    REPLICA_LAG_CHECK_SECONDS = 1  # Minimum interval between lag measurements
+    ARCHIVE_DATABASE_URL = os.getenv("ARCHIVE_DATABASE_URL")  # Unset: same DB
+    ARCHIVE_AFTER_DAYS = 90  # Terminal rides older than this leave hot tables
+    ARCHIVE_BATCH_SIZE = 1000  # Rides moved per archive transaction
+    EXPORT_BATCH_SIZE = 1000  # Rows fetched per round trip during exports
+    IMPORT_BATCH_SIZE = 1000  # Records per INSERT during bulk imports
 
     # Ride Configuration
     MAX_SEARCH_RADIUS_KM = 10  # Maximum radius to search for drivers
     RIDE_REQUEST_TIMEOUT_MINUTES = 5  # Time before a ride request expires
+    CONVERSATION_TTL_SECONDS = 900  # Idle time before a partial booking is dropped
+    CONVERSATION_MAX_SESSIONS = 100000  # Partial bookings kept in memory
+
+    # Dispatch Configuration
+    DISPATCH_MAX_CANDIDATES = 9  # Drivers ranked per ride request
+    DISPATCH_WAVE_SIZE = 3  # Drivers offered the ride at once
+    DISPATCH_WAVE_TIMEOUT_SECONDS = 30  # Wait before offering the next wave
+    DISPATCH_SHARDS = os.getenv("DISPATCH_SHARDS")  # "host:port,..." or unset
+    DISPATCH_SHARD_AUTHKEY = os.getenv("DISPATCH_SHARD_AUTHKEY")  # Required, 16+ bytes
+    DISPATCH_REGION_SIZE_DEG = 0.2  # Regions of ~20km are owned by one shard
+
+    # Driver Presence Configuration
+    PRESENCE_TIMEOUT_SECONDS = 300  # Silence before a driver is taken offline
+    PRESENCE_TICK_SECONDS = 5  # Resolution of the presence timeout
+    PRESENCE_FLUSH_SECONDS = 30  # Interval between bulk availability updates
+    PRESENCE_BATCH_SIZE = 500  # Driver ids per availability UPDATE
+    PRESENCE_DB_PATH = os.getenv("PRESENCE_DB_PATH")  # Shared SQLite file
+
+    # ETA Configuration
+    ROAD_GRAPH_PATH = os.getenv("ROAD_GRAPH_PATH")  # Built with `eta build`
+    ETA_CACHE_SIZE = 20000  # Memoized point-to-point routes
+    ETA_FALLBACK_SPEED_KMH = 30  # Average speed when no road graph is loaded
+    ETA_DETOUR_FACTOR = 1.3  # Road vs great-circle distance without a graph
+
+    # Live Tracking Configuration
+    TRACKING_BUFFER_SIZE = 32  # Location updates buffered per subscriber
+    TRACKING_POLL_TIMEOUT_SECONDS = 25  # Long-poll wait before answering 204
+    TRACKING_KEEPALIVE_SECONDS = 15  # SSE comment interval on idle streams
+    TRACKING_PROGRESS_INTERVAL_SECONDS = 120  # Min gap between passenger updates
 
     # Authentication Configuration
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-here")
     JWT_EXPIRATION_HOURS = 24
+    ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")  # Unset disables /admin routes
+
+    # Response Cache Configuration
+    RESPONSE_CACHE_USERS = 50000  # Users whose GET responses are cached
+    RESPONSE_CACHE_TTL_SECONDS = 60  # Bounds staleness from unsignalled writes
 
     # Stripe Configuration
     STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
     STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
+    STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+    STRIPE_CUSTOMER_CACHE_SIZE = 100000  # Cached user to customer id mappings
+    STRIPE_BACKFILL_BATCH_SIZE = 200  # Users read per backfill batch
+    STRIPE_BACKFILL_WORKERS = 8  # Concurrent Stripe calls during backfill
+    STRIPE_EVENT_BATCH_SIZE = 500  # Webhook events applied per transaction
+    STRIPE_EVENT_POLL_SECONDS = 5  # Consumer pass interval when not woken
     CURRENCY = "usd"
     BASE_FARE = 5.00  # Base fare in USD
     RATE_PER_KM = 1.50  # Rate per kilometer in USD
 
+    # Fare Quote Configuration
+    FARE_QUOTE_CELL_SIZE_DEG = 0.005  # Quotes are shared within ~500m cells
+    FARE_QUOTE_CACHE_SIZE = 10000  # Maximum cached pickup/dropoff cell pairs
+    FARE_QUOTE_TTL_SECONDS = 900  # Cached quotes expire after 15 minutes
+
+    # Surge Pricing Configuration
+    SURGE_CELL_SIZE_DEG = 0.02  # Supply and demand are counted per ~2km cell
+    SURGE_WINDOW_SECONDS = 600  # Ride requests counted over the last 10 minutes
+    SURGE_BUCKET_SECONDS = 30  # Resolution of the demand window
+    SURGE_RECOMPUTE_SECONDS = 15  # Minimum interval between recomputations
+    SURGE_SENSITIVITY = 0.1  # Multiplier increase per unmet request
+    SURGE_MAX_MULTIPLIER = 3.0
+
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -51,6 +140,7 @@ class TestingConfig(Config):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
     JWT_SECRET_KEY = "test-secret-key"
+    TWILIO_AUTH_TOKEN = "test-auth-token"  # Signatures are computed locally
 
 
 class ProductionConfig(Config):
@@ -0,0 +1,213 @@
+"""Multi-step ride booking over WhatsApp.
+
+Besides the one-line ``ride lat,lon to lat,lon`` command, riders can book
+step by step: send ``ride``, share the pickup as a location pin (or type
+``lat,lon``), share the destination, then confirm the quoted fare with
+``yes``. A pin sent out of the blue starts a booking from that pickup.
+
+The partial booking of each phone number is a small record in a
+``ConversationStore``, kept in process memory and dropped after
+``CONVERSATION_TTL_SECONDS`` without a message, so no step needs a query
+to find out where the rider is in the flow.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Callable, NamedTuple, Optional
+
+from .config import Config
+from .messages import TEMPLATES
+from .pricing import FareQuote, Point, parse_point, parse_route
+
+START_WORDS = frozenset({"ride", "book"})
+CONFIRM_WORDS = frozenset({"yes", "y", "confirm", "ok"})
+CANCEL_WORDS = frozenset({"cancel", "stop", "no"})
+
+
+class Stage(str, Enum):
+    """What a booking conversation is waiting for."""
+
+    PICKUP = "pickup"
+    DROPOFF = "dropoff"
+    CONFIRMATION = "confirmation"
+
+
+class Conversation(NamedTuple):
+    """The partial booking of one phone number."""
+
+    stage: Stage
+    pickup: Optional[Point] = None
+    dropoff: Optional[Point] = None
+    quote: Optional[FareQuote] = None
+    expires_at: float = 0.0
+
+
+class ConversationStore:
+    """Per-phone conversations, expiring after a period of inactivity."""
+
+    def __init__(
+        self,
+        ttl_seconds: float = Config.CONVERSATION_TTL_SECONDS,
+        max_conversations: int = Config.CONVERSATION_MAX_SESSIONS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Create an empty store.
+
+        Args:
+            ttl_seconds: Inactivity after which a conversation is dropped.
+            max_conversations: Conversations kept before dropping the one
+                idle the longest.
+            clock: Monotonic time source.
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_conversations = max_conversations
+        self.clock = clock
+        # Ordered by last update, so expired entries are always at the front
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, phone: str) -> Optional[Conversation]:
+        """Return a phone's live conversation, if any."""
+        with self._lock:
+            self._expire(self.clock())
+            return self._conversations.get(phone)
+
+    def put(self, phone: str, conversation: Conversation) -> Conversation:
+        """Store a phone's conversation, restarting its inactivity timer."""
+        now = self.clock()
+        conversation = conversation._replace(expires_at=now + self.ttl_seconds)
+        with self._lock:
+            self._conversations[phone] = conversation
+            self._conversations.move_to_end(phone)
+            self._expire(now)
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+        return conversation
+
+    def clear(self, phone: str) -> None:
+        """Forget a phone's conversation."""
+        with self._lock:
+            self._conversations.pop(phone, None)
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def _expire(self, now):
+        while self._conversations:
+            phone, conversation = next(iter(self._conversations.items()))
+            if conversation.expires_at > now:
+                break
+            del self._conversations[phone]
+
+
+class BookingFlow:
+    """Moves riders through pickup, destination and confirmation."""
+
+    def __init__(
+        self,
+        quote: Callable[[Point, Point], FareQuote],
+        book: Callable[[str, int, Point, Point, FareQuote], str],
+        store: Optional[ConversationStore] = None,
+    ):
+        """Create a flow.
+
+        Args:
+            quote: Returns the fare quote for a pickup and dropoff.
+            book: Books a confirmed ride as ``book(phone, user_id, pickup,
+                dropoff, quote)`` at the quoted fare and returns the reply.
+            store: Where conversations are kept; a default store if omitted.
+        """
+        self.quote = quote
+        self.book = book
+        self.store = store or ConversationStore()
+
+    def active(self, phone: str) -> bool:
+        """Return whether a phone is in the middle of a booking."""
+        return self.store.get(phone) is not None
+
+    def remember_quote(
+        self, phone: str, pickup: Point, dropoff: Point, quote: FareQuote
+    ) -> None:
+        """Let a rider book a fare they were just quoted by replying ``yes``."""
+        self.store.put(phone, Conversation(Stage.CONFIRMATION, pickup, dropoff, quote))
+
+    def handle(
+        self,
+        phone: str,
+        user_id: int,
+        text: str,
+        location: Optional[Point] = None,
+    ) -> Optional[str]:
+        """Advance a rider's booking with one incoming message.
+
+        Args:
+            phone: The rider's E.164 phone number.
+            user_id: The rider's user id, used when the ride is booked.
+            text: The message body.
+            location: The shared location pin, if the message is one.
+
+        Returns:
+            The reply, or None if the message is not part of a booking and
+            should be handled as a command.
+        """
+        text = text.strip().lower()
+        if parse_route(text):
+            # One-line commands carry the whole route and replace any booking
+            self.store.clear(phone)
+            return None
+
+        conversation = self.store.get(phone)
+        if conversation is None:
+            if text in START_WORDS:
+                self.store.put(phone, Conversation(Stage.PICKUP))
+                return TEMPLATES.render("pickup_prompt", phone)
+            if location:
+                self.store.put(phone, Conversation(Stage.DROPOFF, pickup=location))
+                return TEMPLATES.render("dropoff_prompt", phone)
+            return None
+
+        if text in CANCEL_WORDS:
+            self.store.clear(phone)
+            return TEMPLATES.render("booking_cancelled", phone)
+
+        point = location or parse_point(text)
+        if conversation.stage == Stage.PICKUP:
+            if point is None:
+                return TEMPLATES.render("pickup_prompt", phone)
+            self.store.put(phone, Conversation(Stage.DROPOFF, pickup=point))
+            return TEMPLATES.render("dropoff_prompt", phone)
+
+        if conversation.stage == Stage.DROPOFF:
+            if point is None:
+                return TEMPLATES.render("dropoff_prompt", phone)
+            quote = self.quote(conversation.pickup, point)
+            self.remember_quote(phone, conversation.pickup, point, quote)
+            return confirmation_prompt(quote, phone)
+
+        if text in CONFIRM_WORDS:
+            self.store.clear(phone)
+            # The rider agreed to this fare, so it is booked rather than re-quoted
+            return self.book(
+                phone,
+                user_id,
+                conversation.pickup,
+                conversation.dropoff,
+                conversation.quote,
+            )
+        # Keep the conversation alive while the rider decides
+        self.store.put(phone, conversation)
+        return confirmation_prompt(conversation.quote, phone)
+
+
+def confirmation_prompt(quote: FareQuote, phone: str) -> str:
+    """Return the message asking a rider to confirm a quoted fare."""
+    if quote.surge_multiplier != 1.0:
+        return TEMPLATES.render(
+            "confirm_surge_fare",
+            phone,
+            fare=quote.fare,
+            surge_multiplier=quote.surge_multiplier,
+        )
+    return TEMPLATES.render("confirm_fare", phone, fare=quote.fare)
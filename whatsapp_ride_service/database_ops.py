@@ -1,68 +1,202 @@
 """Database operations for common queries"""
-from sqlalchemy import and_, or_, desc, func
+from sqlalchemy import and_, or_, desc, func, insert, literal, select, update
 from datetime import datetime, timedelta
-from .models import User, Driver, Ride, Payment
-from typing import List, Optional, Tuple
+from .config import Config
+from .models import (
+    ArchivedPayment,
+    ArchivedRide,
+    Driver,
+    Payment,
+    Ride,
+    RideOffer,
+    RideStatus,
+    User,
+)
+from .replica import note_writes, stale_reads
+from .serializers import PAYMENT, RIDE
+from .signals import (
+    driver_availability_changed,
+    driver_location_updated,
+    ride_status_changed,
+)
+from typing import Iterator, List, Optional, Tuple
 
 
 class DatabaseOps:
-    def __init__(self, session):
+    def __init__(self, session, archive_session=None):
+        # History and stats reads go to the replica when session routes reads
         self.session = session
+        # Archived rides and payments; the main database unless configured
+        self.archive_session = archive_session or session
 
     def get_available_drivers(
         self, latitude: float, longitude: float, radius_km: float = 5
     ) -> List[Driver]:
         """Get available drivers within radius_km of the given coordinates"""
-        # Note: This is a simplified version. In production, you'd want to use
-        # proper geographic distance calculations (e.g., PostGIS)
         drivers = (
             self.session.query(Driver)
             .filter(
                 and_(
                     Driver.is_available == True,
-                    Driver.current_latitude.between(
-                        latitude - (radius_km / 111), latitude + (radius_km / 111)
-                    ),
-                    Driver.current_longitude.between(
-                        longitude - (radius_km / 111), longitude + (radius_km / 111)
-                    ),
+                    self._in_area(latitude, longitude, radius_km),
                 )
             )
             .all()
         )
         return drivers
 
+    def iter_drivers_in_area(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        after_id: int = 0,
+        chunk_size: int = Config.BROADCAST_CHUNK_SIZE,
+        available_only: bool = False,
+        driver_ids: Optional[List[int]] = None,
+    ) -> Iterator[List[Tuple[int, str]]]:
+        """Stream ``(driver_id, phone_number)`` of drivers in an area in id order.
+
+        Each chunk is a separate keyset query, so no cursor stays open while
+        the caller works through a chunk, and a run can resume after the
+        last id it finished. ``driver_ids`` limits the stream to those
+        drivers, e.g. to retry them.
+        """
+        conditions = [self._in_area(latitude, longitude, radius_km)]
+        if available_only:
+            conditions.append(Driver.is_available == True)
+        if driver_ids is not None:
+            conditions.append(Driver.id.in_(driver_ids))
+        while True:
+            chunk = self.session.execute(
+                select(Driver.id, Driver.phone_number)
+                .where(Driver.id > after_id, *conditions)
+                .order_by(Driver.id)
+                .limit(chunk_size)
+            ).all()
+            if not chunk:
+                return
+            yield [tuple(row) for row in chunk]
+            after_id = chunk[-1].id
+
+    @staticmethod
+    def _in_area(latitude: float, longitude: float, radius_km: float):
+        # Note: This is a simplified version. In production, you'd want to use
+        # proper geographic distance calculations (e.g., PostGIS)
+        return and_(
+            Driver.current_latitude.between(
+                latitude - (radius_km / 111), latitude + (radius_km / 111)
+            ),
+            Driver.current_longitude.between(
+                longitude - (radius_km / 111), longitude + (radius_km / 111)
+            ),
+        )
+
     def get_user_ride_history(
         self, user_id: int, limit: int = 10
     ) -> List[Tuple[Ride, Optional[Payment]]]:
-        """Get user's ride history with payment information"""
-        rides_with_payments = (
-            self.session.query(Ride, Payment)
-            .outerjoin(Payment)
-            .filter(Ride.user_id == user_id)
-            .order_by(desc(Ride.created_at))
-            .limit(limit)
-            .all()
-        )
-        return rides_with_payments
+        """Get user's ride history with payment information.
+
+        Archived rides are merged in as ``ArchivedRide``/``ArchivedPayment``
+        pairs, which expose the same attributes.
+        """
+        with stale_reads(self.session, user_id=user_id):
+            rides_with_payments = (
+                self.session.query(Ride, Payment)
+                .outerjoin(Payment)
+                .filter(Ride.user_id == user_id)
+                .order_by(desc(Ride.created_at))
+                .limit(limit)
+                .all()
+            )
+            archived = (
+                self.archive_session.query(ArchivedRide, ArchivedPayment)
+                .outerjoin(ArchivedPayment, ArchivedPayment.ride_id == ArchivedRide.id)
+                .filter(ArchivedRide.user_id == user_id)
+                .order_by(desc(ArchivedRide.created_at))
+                .limit(limit)
+                .all()
+            )
+            return self._newest_first(rides_with_payments + archived, limit)
+
+    def get_user_rides(self, user_id: int) -> List[Ride]:
+        """Get all of a user's rides across hot and archived storage"""
+        with stale_reads(self.session, user_id=user_id):
+            rides = self.session.query(Ride).filter(Ride.user_id == user_id).all()
+            archived = (
+                self.archive_session.query(ArchivedRide)
+                .filter(ArchivedRide.user_id == user_id)
+                .all()
+            )
+            return self._newest_first(rides + archived)
+
+    def get_user_ride_rows(self, user_id: int) -> list:
+        """Like get_user_rides, as Core rows for the RIDE serializer"""
+        with stale_reads(self.session, user_id=user_id):
+            rows = self.session.execute(
+                RIDE.select(Ride).where(Ride.user_id == user_id)
+            ).all()
+            archived = self.archive_session.execute(
+                RIDE.select(ArchivedRide).where(ArchivedRide.user_id == user_id)
+            ).all()
+            return self._newest_first(rows + archived)
+
+    def get_user_payments(self, user_id: int) -> List[Payment]:
+        """Get all of a user's payments across hot and archived storage"""
+        with stale_reads(self.session, user_id=user_id):
+            payments = (
+                self.session.query(Payment).filter(Payment.user_id == user_id).all()
+            )
+            archived = (
+                self.archive_session.query(ArchivedPayment)
+                .filter(ArchivedPayment.user_id == user_id)
+                .all()
+            )
+            return self._newest_first(payments + archived)
+
+    def get_user_payment_rows(self, user_id: int) -> list:
+        """Like get_user_payments, as Core rows for the PAYMENT serializer"""
+        with stale_reads(self.session, user_id=user_id):
+            rows = self.session.execute(
+                PAYMENT.select(Payment).where(Payment.user_id == user_id)
+            ).all()
+            archived = self.archive_session.execute(
+                PAYMENT.select(ArchivedPayment).where(
+                    ArchivedPayment.user_id == user_id
+                )
+            ).all()
+            return self._newest_first(rows + archived)
 
     def get_driver_earnings(self, driver_id: int, days: int = 30) -> float:
         """Calculate driver's earnings for the last n days"""
         start_date = datetime.utcnow() - timedelta(days=days)
-        earnings = (
-            self.session.query(Payment)
-            .join(Ride)
-            .filter(
-                and_(
-                    Ride.driver_id == driver_id,
-                    Payment.status == "completed",
-                    Payment.created_at >= start_date,
+        with stale_reads(self.session, driver_id=driver_id):
+            earnings = (
+                self.session.query(Payment)
+                .join(Ride)
+                .filter(
+                    and_(
+                        Ride.driver_id == driver_id,
+                        Payment.status == "completed",
+                        Payment.created_at >= start_date,
+                    )
                 )
+                .with_entities(func.sum(Payment.amount))
+                .scalar()
             )
-            .with_entities(func.sum(Payment.amount))
-            .scalar()
-        )
-        return earnings or 0.0
+            archived_earnings = (
+                self.archive_session.query(func.sum(ArchivedPayment.amount))
+                .join(ArchivedRide, ArchivedPayment.ride_id == ArchivedRide.id)
+                .filter(
+                    and_(
+                        ArchivedRide.driver_id == driver_id,
+                        ArchivedPayment.status == "completed",
+                        ArchivedPayment.created_at >= start_date,
+                    )
+                )
+                .scalar()
+            )
+            return (earnings or 0.0) + (archived_earnings or 0.0)
 
     def get_active_rides(self) -> List[Ride]:
         """Get all currently active rides"""
@@ -70,33 +204,37 @@ class DatabaseOps:
 
     def get_user_stats(self, user_id: int) -> dict:
         """Get user's ride statistics"""
-        total_rides = (
-            self.session.query(func.count(Ride.id))
-            .filter(Ride.user_id == user_id)
-            .scalar()
-            or 0
-        )
+        with stale_reads(self.session, user_id=user_id):
+            stats = {"total_rides": 0, "completed_rides": 0, "total_spent": 0.0}
+            for session, ride, payment in (
+                (self.session, Ride, Payment),
+                (self.archive_session, ArchivedRide, ArchivedPayment),
+            ):
+                stats["total_rides"] += (
+                    session.query(func.count(ride.id))
+                    .filter(ride.user_id == user_id)
+                    .scalar()
+                    or 0
+                )
 
-        completed_rides = (
-            self.session.query(func.count(Ride.id))
-            .filter(and_(Ride.user_id == user_id, Ride.status == "completed"))
-            .scalar()
-            or 0
-        )
+                stats["completed_rides"] += (
+                    session.query(func.count(ride.id))
+                    .filter(and_(ride.user_id == user_id, ride.status == "completed"))
+                    .scalar()
+                    or 0
+                )
 
-        total_spent = (
-            self.session.query(func.sum(Payment.amount))
-            .join(Ride)
-            .filter(and_(Ride.user_id == user_id, Payment.status == "completed"))
-            .scalar()
-            or 0.0
-        )
+                stats["total_spent"] += (
+                    session.query(func.sum(payment.amount))
+                    .join(ride, payment.ride_id == ride.id)
+                    .filter(
+                        and_(ride.user_id == user_id, payment.status == "completed")
+                    )
+                    .scalar()
+                    or 0.0
+                )
 
-        return {
-            "total_rides": total_rides,
-            "completed_rides": completed_rides,
-            "total_spent": total_spent,
-        }
+            return stats
 
     def update_driver_location(
         self, driver_id: int, latitude: float, longitude: float
@@ -108,6 +246,7 @@ class DatabaseOps:
             driver.current_longitude = longitude
             driver.last_updated = datetime.utcnow()
             self.session.commit()
+            driver_location_updated.send(driver, latitude=latitude, longitude=longitude)
         return driver
 
     def create_ride(
@@ -129,3 +268,135 @@ class DatabaseOps:
         self.session.add(ride)
         self.session.commit()
         return ride
+
+    def record_offer(self, ride_id: int, driver_id: int) -> bool:
+        """Record that a ride still waiting for a driver was offered to one.
+
+        Returns:
+            False, and nothing is recorded, if the ride was claimed or has
+            ended, so the offer should not be sent.
+        """
+        recorded = self.session.execute(
+            insert(RideOffer).from_select(
+                ["ride_id", "driver_id"],
+                select(Ride.id, literal(driver_id)).where(
+                    Ride.id == ride_id,
+                    Ride.status == RideStatus.REQUESTED,
+                    Ride.driver_id.is_(None),
+                ),
+            )
+        ).rowcount
+        self.session.commit()
+        return bool(recorded)
+
+    def was_offered(self, ride_id: int, driver_id: int) -> bool:
+        """Return True if the ride was offered to the driver."""
+        return self.session.get(RideOffer, (ride_id, driver_id)) is not None
+
+    def claim_ride(self, ride_id: int, driver_id: int) -> bool:
+        """Atomically assign a requested ride to a driver.
+
+        Both updates are conditional, so when a ride has been offered to
+        several drivers at once only the first accept wins, and a driver
+        holding parallel offers can only be bound to one of them.
+        """
+        driver_claimed = self.session.execute(
+            update(Driver)
+            .where(and_(Driver.id == driver_id, Driver.is_available == True))
+            .values(is_available=False)
+        ).rowcount
+        if not driver_claimed:
+            self.session.rollback()
+            return False
+
+        rider_id = self.session.execute(
+            update(Ride)
+            .where(
+                and_(
+                    Ride.id == ride_id,
+                    Ride.status == RideStatus.REQUESTED,
+                    Ride.driver_id.is_(None),
+                )
+            )
+            .values(driver_id=driver_id, status=RideStatus.ACCEPTED)
+            .returning(Ride.user_id)
+        ).scalar()
+        if rider_id is None:
+            self.session.rollback()
+            return False
+
+        note_writes(self.session, user_ids=[rider_id], driver_ids=[driver_id])
+        self.session.commit()
+        driver_availability_changed.send(driver_id, available=False)
+        ride_status_changed.send(
+            rider_id, ride_id=ride_id, status=RideStatus.ACCEPTED, driver_id=driver_id
+        )
+        return True
+
+    def cancel_unclaimed_ride(self, ride_id: int) -> Optional[int]:
+        """Cancel a ride that no driver has claimed, e.g. once dispatch gives up.
+
+        The update is conditional like ``claim_ride``, so an accept racing
+        with the cancellation either wins, or finds the ride gone.
+
+        Returns:
+            The rider's user id, or None if the ride was claimed or had
+            already ended.
+        """
+        rider_id = self.session.execute(
+            update(Ride)
+            .where(
+                and_(
+                    Ride.id == ride_id,
+                    Ride.status == RideStatus.REQUESTED,
+                    Ride.driver_id.is_(None),
+                )
+            )
+            .values(status=RideStatus.CANCELLED)
+            .returning(Ride.user_id)
+        ).scalar()
+        if rider_id is None:
+            self.session.rollback()
+            return None
+
+        note_writes(self.session, user_ids=[rider_id])
+        self.session.commit()
+        ride_status_changed.send(rider_id, ride_id=ride_id, status=RideStatus.CANCELLED)
+        return rider_id
+
+    def get_ride(self, ride_id: int) -> Optional[Ride]:
+        """Get a ride by id."""
+        return self.session.get(Ride, ride_id)
+
+    def update_ride_status(self, ride_id: int, status: RideStatus) -> Optional[Ride]:
+        """Move a ride to a new status, freeing its driver once it has ended."""
+        ride = self.session.get(Ride, ride_id)
+        if not ride:
+            return None
+        ride.status = status
+        if status == RideStatus.COMPLETED:
+            ride.completed_at = datetime.utcnow()
+        freed_driver_id = None
+        if status in (RideStatus.COMPLETED, RideStatus.CANCELLED) and ride.driver_id:
+            freed_driver_id = ride.driver_id
+            self.session.execute(
+                update(Driver)
+                .where(Driver.id == freed_driver_id)
+                .values(is_available=True)
+            )
+            note_writes(self.session, driver_ids=[freed_driver_id])
+        self.session.commit()
+        if freed_driver_id is not None:
+            driver_availability_changed.send(freed_driver_id, available=True)
+        ride_status_changed.send(ride.user_id, ride_id=ride_id, status=status)
+        return ride
+
+    @staticmethod
+    def _newest_first(rows: list, limit: Optional[int] = None) -> list:
+        """Sort hot and archived rows (or row tuples) by creation time."""
+
+        def created_at(row):
+            record = row if hasattr(row, "created_at") else row[0]
+            return record.created_at or datetime.min
+
+        return sorted(rows, key=created_at, reverse=True)[:limit]
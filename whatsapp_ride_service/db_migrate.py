@@ -1,22 +1,428 @@
-"""Database Migration Script"""
-import os
-from sqlalchemy import create_engine, MetaData
-from sqlalchemy.orm import sessionmaker
-from whatsapp_ride_service.models import Base
+"""Versioned, non-destructive schema migrations.
 
+Each ``Migration`` applies one incremental change and is recorded in the
+``schema_version`` table. Steps are written to be safe on a live database:
+columns are added without rewriting tables, indexes are built one at a
+time (``CONCURRENTLY`` on PostgreSQL) and data backfills run in small,
+separately committed batches so no lock is held for long.
 
-def migrate_database():
-    """Recreate database with new schema"""
-    # Remove existing database file
-    db_file = "whatsapp_ride.db"
-    if os.path.exists(db_file):
-        os.remove(db_file)
+``ensure_schema`` is what the application calls at startup: when the
+recorded version already matches ``LATEST_VERSION`` it costs one small
+query and nothing is reflected or created. Workers booting together
+serialize on ``migration_lock`` and re-read the version once they hold
+it, so each migration is applied by only one of them.
 
-    # Create new database with updated schema
-    engine = create_engine(f"sqlite:///{db_file}")
-    Base.metadata.create_all(engine)
+Run pending migrations with::
 
-    print("Database schema updated successfully!")
+    python -m whatsapp_ride_service.db_migrate
+    python -m whatsapp_ride_service.db_migrate --status
+"""
+
+import argparse
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    func,
+    inspect,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.schema import CreateIndex
+
+from .config import Config
+from .models import (
+    ArchivedPayment,
+    ArchivedRide,
+    Driver,
+    Payment,
+    Ride,
+    RideOffer,
+    StripeEvent,
+    User,
+)
+from .phones import normalize_phone
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_lock key shared by every process migrating the same database
+MIGRATION_LOCK_KEY = 0x5748415453415050
+
+schema_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    schema_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class Migration(NamedTuple):
+    """One incremental schema change."""
+
+    version: int
+    description: str
+    apply: Callable[[Engine], None]
+
+
+def add_column(engine: Engine, table: Table, name: str) -> None:
+    """Add a model column to an existing table if it is missing.
+
+    Only nullable columns without server defaults are added, which every
+    supported database does without rewriting the table.
+    """
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    if name in existing:
+        return
+    column = table.c[name]
+    column_type = column.type.compile(dialect=engine.dialect)
+    with engine.begin() as connection:
+        connection.execute(
+            text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+        )
+
+
+def create_indexes(engine: Engine, table: Table, names: Iterable[str]) -> None:
+    """Build model indexes one at a time, skipping those that exist.
+
+    On PostgreSQL indexes are built ``CONCURRENTLY`` so writes continue
+    while they are created; elsewhere each index gets its own short
+    transaction.
+    """
+    existing = {index["name"] for index in inspect(engine).get_indexes(table.name)}
+    indexes = {index.name: index for index in table.indexes}
+    for name in names:
+        if name in existing:
+            continue
+        ddl = str(CreateIndex(indexes[name]).compile(dialect=engine.dialect))
+        if engine.dialect.name == "postgresql":
+            ddl = ddl.replace("INDEX", "INDEX CONCURRENTLY", 1)
+            with engine.connect() as connection:
+                connection.execution_options(isolation_level="AUTOCOMMIT").execute(
+                    text(ddl)
+                )
+        else:
+            with engine.begin() as connection:
+                connection.execute(text(ddl))
+
+
+def backfill(
+    engine: Engine,
+    table: Table,
+    assignment: str,
+    condition: str,
+    batch_size: int = Config.MIGRATION_BATCH_SIZE,
+) -> int:
+    """Run ``UPDATE table SET assignment WHERE condition`` in id batches.
+
+    Each batch covers a contiguous primary key range and commits on its
+    own, so row locks are released between batches.
+
+    Returns:
+        The number of rows updated.
+    """
+    with engine.connect() as connection:
+        last_id = connection.execute(select(func.max(table.c.id))).scalar() or 0
+    updated = 0
+    for start in range(0, last_id, batch_size):
+        with engine.begin() as connection:
+            updated += connection.execute(
+                text(
+                    f"UPDATE {table.name} SET {assignment} "
+                    f"WHERE id > :start AND id <= :end AND {condition}"
+                ),
+                {"start": start, "end": start + batch_size},
+            ).rowcount
+    return updated
+
+
+def normalize_phone_numbers(
+    engine: Engine, table: Table, batch_size: int = Config.MIGRATION_BATCH_SIZE
+) -> List[Tuple[int, str, str]]:
+    """Rewrite ``table.phone_number`` in E.164 form, one id batch at a time.
+
+    Values that do not parse are left as they are. A value whose E.164
+    form is already stored on another row is left too, and returned so
+    the duplicate accounts can be merged by hand.
+
+    Returns:
+        ``(id, stored, normalized)`` for every row left unchanged because
+        of a collision.
+    """
+    collisions = []
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(table.c.id, table.c.phone_number)
+                .where(table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return collisions
+            last_id = rows[-1].id
+            changes = []
+            for row_id, stored in rows:
+                normalized = normalize_phone(stored)
+                if normalized and normalized != stored:
+                    changes.append((row_id, stored, normalized))
+            taken = set(
+                connection.execute(
+                    select(table.c.phone_number).where(
+                        table.c.phone_number.in_([change[2] for change in changes])
+                    )
+                ).scalars()
+            )
+            for row_id, stored, normalized in changes:
+                if normalized in taken:
+                    collisions.append((row_id, stored, normalized))
+                    continue
+                taken.add(normalized)
+                connection.execute(
+                    update(table)
+                    .where(table.c.id == row_id)
+                    .values(phone_number=normalized)
+                )
+
+
+def _create_tables(*tables: Table) -> Callable[[Engine], None]:
+    def apply(engine: Engine) -> None:
+        for table in tables:
+            table.create(engine, checkfirst=True)
+
+    return apply
+
+
+def _add_stripe_ids(engine: Engine) -> None:
+    add_column(engine, User.__table__, "stripe_customer_id")
+    add_column(engine, Payment.__table__, "stripe_payment_intent_id")
+    create_indexes(engine, User.__table__, ["ux_users_stripe_customer"])
+    create_indexes(engine, Payment.__table__, ["ux_payments_stripe_intent"])
+
+
+def _add_hot_query_indexes(engine: Engine) -> None:
+    create_indexes(engine, Driver.__table__, ["ix_drivers_available_location"])
+    create_indexes(
+        engine,
+        Ride.__table__,
+        [
+            "ix_rides_user_created",
+            "ix_rides_user_status",
+            "ix_rides_driver_status",
+            "ix_rides_status",
+        ],
+    )
+    create_indexes(
+        engine,
+        Payment.__table__,
+        ["ix_payments_ride", "ix_payments_user_created", "ix_payments_status_created"],
+    )
+
+
+def _backfill_payment_completed_at(engine: Engine) -> None:
+    # Payments completed by the old inline webhook never got completed_at
+    backfill(
+        engine,
+        Payment.__table__,
+        "completed_at = COALESCE((SELECT rides.completed_at FROM rides "
+        "WHERE rides.id = payments.ride_id), payments.created_at)",
+        "status = 'COMPLETED' AND completed_at IS NULL",
+    )
+
+
+def _add_export_indexes(engine: Engine) -> None:
+    create_indexes(engine, Ride.__table__, ["ix_rides_created"])
+    create_indexes(engine, ArchivedRide.__table__, ["ix_archived_rides_created"])
+
+
+def _add_stripe_event_error(engine: Engine) -> None:
+    add_column(engine, StripeEvent.__table__, "error")
+
+
+def _normalize_phone_numbers(engine: Engine) -> None:
+    # Lookups compare E.164 strings, so numbers stored as typed never match
+    for table in (User.__table__, Driver.__table__):
+        for row_id, stored, normalized in normalize_phone_numbers(engine, table):
+            logger.warning(
+                "Left %s.id=%s phone number %r as is: %s belongs to another row",
+                table.name,
+                row_id,
+                stored,
+                normalized,
+            )
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        1,
+        "Create users, drivers, rides and payments",
+        _create_tables(
+            User.__table__, Driver.__table__, Ride.__table__, Payment.__table__
+        ),
+    ),
+    Migration(2, "Add Stripe customer and payment intent ids", _add_stripe_ids),
+    Migration(3, "Create the Stripe event log", _create_tables(StripeEvent.__table__)),
+    Migration(4, "Index hot ride, payment and driver queries", _add_hot_query_indexes),
+    Migration(5, "Backfill payments.completed_at", _backfill_payment_completed_at),
+    Migration(
+        6,
+        "Create the ride and payment archive tables",
+        _create_tables(ArchivedRide.__table__, ArchivedPayment.__table__),
+    ),
+    Migration(7, "Index rides by creation time for exports", _add_export_indexes),
+    Migration(
+        8,
+        "Record why a Stripe event was not applied",
+        _add_stripe_event_error,
+    ),
+    Migration(
+        9,
+        "Record ride offers so any worker can check an accept",
+        _create_tables(RideOffer.__table__),
+    ),
+    Migration(
+        10, "Store user and driver phone numbers in E.164", _normalize_phone_numbers
+    ),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(engine: Engine) -> Optional[int]:
+    """Return the applied schema version, or None for an unversioned database."""
+    try:
+        with engine.connect() as connection:
+            return connection.execute(
+                select(func.max(schema_version.c.version))
+            ).scalar()
+    except DBAPIError:
+        # No schema_version table yet
+        return None
+
+
+@contextmanager
+def migration_lock(engine: Engine) -> Iterator[None]:
+    """Keep other processes from migrating the database at the same time.
+
+    PostgreSQL takes a session advisory lock. A file-backed SQLite
+    database is locked with ``flock`` on a ``.migrate.lock`` file next to
+    it, since a database lock would also block the migrations' own
+    connections. Other databases are not locked.
+    """
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as connection:
+            connection.execution_options(isolation_level="AUTOCOMMIT")
+            lock = {"key": MIGRATION_LOCK_KEY}
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), lock)
+            try:
+                yield
+            finally:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), lock)
+        return
+    database = engine.url.database if engine.dialect.name == "sqlite" else None
+    if fcntl is None or not database or database == ":memory:":
+        yield
+        return
+    with open(f"{database}.migrate.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def migrate(engine: Engine, target: Optional[int] = None) -> List[int]:
+    """Apply every pending migration up to ``target``.
+
+    Returns:
+        The versions applied, in order.
+    """
+    with migration_lock(engine):
+        schema_metadata.create_all(engine)
+        version = current_version(engine) or 0
+        applied = []
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                continue
+            if target is not None and migration.version > target:
+                break
+            migration.apply(engine)
+            try:
+                with engine.begin() as connection:
+                    connection.execute(
+                        schema_version.insert().values(
+                            version=migration.version,
+                            description=migration.description,
+                            applied_at=datetime.utcnow(),
+                        )
+                    )
+            except IntegrityError:
+                # Recorded by a process that could not be locked out; every
+                # step skips what already exists, so carry on from there
+                if (current_version(engine) or 0) < migration.version:
+                    raise
+                continue
+            applied.append(migration.version)
+        return applied
+
+
+def ensure_schema(engine: Engine, auto_migrate: bool = True) -> None:
+    """Bring the schema up to date, doing nothing when it already is.
+
+    Args:
+        engine: Database engine.
+        auto_migrate: Apply pending migrations; when False an outdated
+            schema raises instead.
+
+    Raises:
+        RuntimeError: If the schema is outdated and ``auto_migrate`` is off.
+    """
+    version = current_version(engine)
+    if version == LATEST_VERSION:
+        return
+    if not auto_migrate:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {LATEST_VERSION}; "
+            "run python -m whatsapp_ride_service.db_migrate"
+        )
+    migrate(engine)
+
+
+def migrate_database(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point for applying migrations."""
+    from .config import DevelopmentConfig
+
+    parser = argparse.ArgumentParser(description="Apply schema migrations")
+    parser.add_argument("--status", action="store_true", help="Only show versions")
+    parser.add_argument("--target", type=int, help="Stop after this version")
+    args = parser.parse_args(argv)
+
+    engine = create_engine(DevelopmentConfig.SQLALCHEMY_DATABASE_URI)
+    if args.status:
+        print(f"Schema version {current_version(engine)}, latest {LATEST_VERSION}")
+        return
+
+    for version in migrate(engine, target=args.target):
+        print(f"Applied {version}: {MIGRATIONS[version - 1].description}")
+    print(f"Schema is at version {current_version(engine)}")
 
 
 if __name__ == "__main__":
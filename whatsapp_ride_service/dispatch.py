@@ -0,0 +1,247 @@
+"""Cascading ride dispatch.
+
+Candidates are ranked once per request. The ride is then offered to them in
+waves: the first ``wave_size`` drivers get the offer straight away, and if
+nobody accepts within ``wave_timeout`` seconds the next wave goes out. The
+first accept is settled with a conditional update (see
+``DatabaseOps.claim_ride``), so parallel offers can never double-book.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from operator import itemgetter
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+)
+
+from .config import Config
+from .geo import haversine_km
+
+if TYPE_CHECKING:
+    from .eta import EtaEstimator
+
+logger = logging.getLogger(__name__)
+
+# How many straight-line candidates per slot are re-ranked by travel time
+ETA_SHORTLIST_FACTOR = 2
+
+
+class Candidate(NamedTuple):
+    """A driver that may be offered a ride."""
+
+    driver_id: int
+    phone_number: str
+    distance_km: float
+    eta_seconds: Optional[float] = None
+
+
+def rank_drivers(
+    latitude: float,
+    longitude: float,
+    drivers: Iterable,
+    limit: int = Config.DISPATCH_MAX_CANDIDATES,
+    max_radius_km: float = Config.MAX_SEARCH_RADIUS_KM,
+    eta: Optional["EtaEstimator"] = None,
+) -> List[Candidate]:
+    """Return up to ``limit`` drivers closest to a point, nearest first.
+
+    With an ``eta`` estimator, the straight-line shortlist is re-ranked by
+    travel time to the pickup using one batched many-to-one query.
+
+    Args:
+        latitude: Pickup latitude.
+        longitude: Pickup longitude.
+        drivers: Driver rows, usually pre-filtered by
+            ``DatabaseOps.get_available_drivers``.
+        limit: Maximum number of candidates to return.
+        max_radius_km: Drivers further away than this are dropped.
+        eta: Optional travel-time estimator.
+
+    Returns:
+        The ranked candidates.
+    """
+    nearby = []
+    for driver in drivers:
+        if driver.current_latitude is None or driver.current_longitude is None:
+            continue
+        distance = haversine_km(
+            latitude, longitude, driver.current_latitude, driver.current_longitude
+        )
+        if distance <= max_radius_km:
+            nearby.append((distance, driver))
+    if eta is None:
+        shortlist = heapq.nsmallest(limit, nearby, key=itemgetter(0))
+        return [Candidate(d.id, d.phone_number, km) for km, d in shortlist]
+
+    # Road detours reorder close drivers, so keep a wider shortlist to re-rank
+    shortlist = heapq.nsmallest(limit * ETA_SHORTLIST_FACTOR, nearby, key=itemgetter(0))
+    times = eta.travel_times_to(
+        (latitude, longitude),
+        [(d.current_latitude, d.current_longitude) for _, d in shortlist],
+    )
+    candidates = [
+        Candidate(d.id, d.phone_number, km, seconds)
+        for (km, d), seconds in zip(shortlist, times)
+    ]
+    candidates.sort(key=lambda c: c.eta_seconds)
+    return candidates[:limit]
+
+
+class _PendingRide:
+    """Dispatch progress for a single unassigned ride."""
+
+    __slots__ = (
+        "ride_id",
+        "candidates",
+        "context",
+        "next_index",
+        "deadline",
+        "offered",
+    )
+
+    def __init__(self, ride_id: int, candidates: List[Candidate], context: Any):
+        self.ride_id = ride_id
+        self.candidates = candidates
+        self.context = context
+        self.next_index = 0
+        self.deadline = 0.0
+        self.offered: Dict[int, Candidate] = {}
+
+
+class Dispatcher:
+    """Offer rides to ranked candidates in waves until one accepts."""
+
+    def __init__(
+        self,
+        notify: Callable[[int, Candidate, Any], None],
+        on_exhausted: Optional[Callable[[int], None]] = None,
+        wave_size: int = Config.DISPATCH_WAVE_SIZE,
+        wave_timeout: float = Config.DISPATCH_WAVE_TIMEOUT_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Create a dispatcher.
+
+        Args:
+            notify: Called as ``notify(ride_id, candidate, context)`` for
+                every offer, where ``context`` is whatever was passed to
+                ``start`` (e.g. the offer message).
+            on_exhausted: Called with the ride id when every candidate has
+                been offered the ride and the last wave timed out.
+            wave_size: Number of drivers offered the ride per wave.
+            wave_timeout: Seconds to wait for an accept before the next wave.
+            clock: Monotonic time source, injectable for simulations.
+        """
+        self.notify = notify
+        self.on_exhausted = on_exhausted
+        self.wave_size = max(1, wave_size)
+        self.wave_timeout = wave_timeout
+        self.clock = clock
+        self._pending: Dict[int, _PendingRide] = {}
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Thread] = None
+
+    def start(
+        self, ride_id: int, candidates: List[Candidate], context: Any = None
+    ) -> List[Candidate]:
+        """Begin dispatching a ride and send the first wave of offers."""
+        pending = _PendingRide(ride_id, list(candidates), context)
+        with self._lock:
+            self._pending[ride_id] = pending
+            wave = self._next_wave(pending, self.clock())
+        self._send(pending, wave)
+        return wave
+
+    def was_offered(self, ride_id: int, driver_id: int) -> bool:
+        """Return True if the ride is still open and was offered to the driver."""
+        with self._lock:
+            pending = self._pending.get(ride_id)
+            return pending is not None and driver_id in pending.offered
+
+    def settle(self, ride_id: int) -> None:
+        """Stop dispatching a ride, typically after a successful claim."""
+        with self._lock:
+            self._pending.pop(ride_id, None)
+
+    def next_deadline(self) -> Optional[float]:
+        """Return the earliest wave deadline across open rides."""
+        with self._lock:
+            if not self._pending:
+                return None
+            return min(p.deadline for p in self._pending.values())
+
+    def tick(self, now: Optional[float] = None) -> List[int]:
+        """Advance every ride whose current wave has timed out.
+
+        Returns:
+            Ids of rides that ran out of candidates on this tick.
+        """
+        now = self.clock() if now is None else now
+        waves = []
+        exhausted = []
+        with self._lock:
+            for pending in list(self._pending.values()):
+                if pending.deadline > now:
+                    continue
+                wave = self._next_wave(pending, now)
+                if wave:
+                    waves.append((pending, wave))
+                else:
+                    del self._pending[pending.ride_id]
+                    exhausted.append(pending.ride_id)
+
+        for pending, wave in waves:
+            self._send(pending, wave)
+        if self.on_exhausted:
+            for ride_id in exhausted:
+                try:
+                    self.on_exhausted(ride_id)
+                except Exception:
+                    logger.exception("Could not close out ride %s", ride_id)
+        return exhausted
+
+    def run_in_background(self, interval: float = 1.0) -> None:
+        """Start a daemon thread that calls ``tick`` every ``interval`` seconds."""
+        if self._timer is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.tick()
+                except Exception:
+                    # Open rides keep their deadlines, so the next tick retries
+                    logger.exception("Ride dispatch tick failed")
+
+        self._timer = threading.Thread(target=loop, name="dispatcher", daemon=True)
+        self._timer.start()
+
+    def _next_wave(self, pending: _PendingRide, now: float) -> List[Candidate]:
+        start = pending.next_index
+        wave = pending.candidates[start : start + self.wave_size]
+        pending.next_index = start + len(wave)
+        pending.deadline = now + self.wave_timeout
+        for candidate in wave:
+            pending.offered[candidate.driver_id] = candidate
+        return wave
+
+    def _send(self, pending: _PendingRide, wave: List[Candidate]) -> None:
+        # One failed offer must not keep the rest of the wave from going out
+        for candidate in wave:
+            try:
+                self.notify(pending.ride_id, candidate, pending.context)
+            except Exception:
+                logger.exception(
+                    "Could not offer ride %s to driver %s",
+                    pending.ride_id,
+                    candidate.driver_id,
+                )
@@ -0,0 +1,472 @@
+"""Road-distance and travel-time estimates from an offline road graph.
+
+The graph is built once from a local OpenStreetMap extract (no network
+access) and stored in compressed sparse row (CSR) form: for node ``n`` the
+outgoing edges are ``targets[offsets[n]:offsets[n + 1]]`` with matching
+``lengths`` (metres) and ``times`` (seconds). Arrays come from the stdlib
+``array`` module, so a city-sized graph stays compact and loads with a
+handful of ``fromfile`` calls.
+
+Point-to-point queries use A* with a straight-line heuristic and are
+memoized per node pair. Ranking drivers uses a single reverse Dijkstra
+from the pickup, which settles every candidate in one search instead of
+one query per driver. Without a graph, ``EtaEstimator`` falls back to the
+great-circle distance scaled by a detour factor.
+
+Build a graph file with::
+
+    python -m whatsapp_ride_service.eta build city.osm city.graph
+"""
+
+import bz2
+import gzip
+import heapq
+import struct
+import sys
+import threading
+import xml.etree.ElementTree as ElementTree
+from array import array
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .config import Config
+from .geo import haversine_km
+
+Point = Tuple[float, float]
+
+_MAGIC = b"RGRAPH1\0"
+_HEADER = struct.Struct("<8sII")
+_SNAP_CELL_DEG = 0.01
+
+# Default speeds in km/h for OSM highway types we route over
+HIGHWAY_SPEEDS_KMH = {
+    "motorway": 100,
+    "motorway_link": 60,
+    "trunk": 80,
+    "trunk_link": 50,
+    "primary": 60,
+    "primary_link": 40,
+    "secondary": 50,
+    "secondary_link": 40,
+    "tertiary": 40,
+    "tertiary_link": 30,
+    "unclassified": 30,
+    "residential": 30,
+    "living_street": 10,
+    "service": 15,
+}
+
+
+class Route(NamedTuple):
+    """Travel time and road distance of a route."""
+
+    seconds: float
+    meters: float
+
+
+def _open(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+
+def _parse_maxspeed(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    parts = value.split()
+    try:
+        speed = float(parts[0])
+    except ValueError:
+        return None
+    if len(parts) > 1 and parts[1] == "mph":
+        speed *= 1.609344
+    return speed
+
+
+class RoadGraph:
+    """A directed road graph in CSR form."""
+
+    def __init__(
+        self,
+        lats: array,
+        lons: array,
+        offsets: array,
+        targets: array,
+        lengths: array,
+        times: array,
+        cache_size: int = Config.ETA_CACHE_SIZE,
+    ):
+        """Wrap prebuilt CSR arrays; use ``build``/``from_osm``/``load`` instead."""
+        self.lats = lats
+        self.lons = lons
+        self.offsets = offsets
+        self.targets = targets
+        self.lengths = lengths
+        self.times = times
+        self._reverse: Optional[Tuple[array, array, array, array]] = None
+        self._max_speed = self._max_speed_mps()
+        self._grid = self._build_grid()
+        self.route_between = lru_cache(maxsize=cache_size)(self._astar)
+
+    @property
+    def node_count(self) -> int:
+        """Number of nodes in the graph."""
+        return len(self.lats)
+
+    @property
+    def edge_count(self) -> int:
+        """Number of directed edges in the graph."""
+        return len(self.targets)
+
+    @classmethod
+    def build(
+        cls,
+        coordinates: Sequence[Point],
+        edges: Iterable[Tuple[int, int, float]],
+        **kwargs,
+    ) -> "RoadGraph":
+        """Build a graph from node coordinates and ``(u, v, speed_kmh)`` edges.
+
+        Edge lengths are the great-circle distance between their endpoints.
+        Edges are directed; add both directions for two-way roads.
+        """
+        node_count = len(coordinates)
+        edge_list = sorted(edges)
+        offsets = array("I", [0] * (node_count + 1))
+        targets = array("I")
+        lengths = array("f")
+        times = array("f")
+        for u, v, speed_kmh in edge_list:
+            meters = 1000 * haversine_km(*coordinates[u], *coordinates[v])
+            offsets[u + 1] += 1
+            targets.append(v)
+            lengths.append(meters)
+            times.append(meters / (speed_kmh / 3.6))
+        for node in range(node_count):
+            offsets[node + 1] += offsets[node]
+        lats = array("d", (c[0] for c in coordinates))
+        lons = array("d", (c[1] for c in coordinates))
+        return cls(lats, lons, offsets, targets, lengths, times, **kwargs)
+
+    @classmethod
+    def from_osm(cls, path: str, **kwargs) -> "RoadGraph":
+        """Build a graph from an OSM XML extract (``.osm``, ``.gz`` or ``.bz2``).
+
+        Two streaming passes keep memory bounded: the first collects drivable
+        ways, the second only the coordinates of nodes those ways use.
+        """
+        ways = []
+        used = set()
+        with _open(path) as stream:
+            for _, element in ElementTree.iterparse(stream):
+                if element.tag == "way":
+                    tags = {t.get("k"): t.get("v") for t in element.iter("tag")}
+                    highway = tags.get("highway")
+                    if highway in HIGHWAY_SPEEDS_KMH:
+                        refs = [int(nd.get("ref")) for nd in element.iter("nd")]
+                        speed = _parse_maxspeed(tags.get("maxspeed"))
+                        oneway = tags.get("oneway") in ("yes", "true", "1")
+                        ways.append(
+                            (refs, speed or HIGHWAY_SPEEDS_KMH[highway], oneway)
+                        )
+                        used.update(refs)
+                if element.tag in ("node", "way", "relation"):
+                    element.clear()
+
+        index: Dict[int, int] = {}
+        coordinates: List[Point] = []
+        with _open(path) as stream:
+            for _, element in ElementTree.iterparse(stream):
+                if element.tag == "node":
+                    osm_id = int(element.get("id"))
+                    if osm_id in used:
+                        index[osm_id] = len(coordinates)
+                        coordinates.append(
+                            (float(element.get("lat")), float(element.get("lon")))
+                        )
+                    element.clear()
+
+        edges = []
+        for refs, speed, oneway in ways:
+            for a, b in zip(refs, refs[1:]):
+                if a in index and b in index:
+                    edges.append((index[a], index[b], speed))
+                    if not oneway:
+                        edges.append((index[b], index[a], speed))
+        return cls.build(coordinates, edges, **kwargs)
+
+    def save(self, path: str) -> None:
+        """Write the graph in the compact binary format read by ``load``."""
+        with open(path, "wb") as out:
+            out.write(_HEADER.pack(_MAGIC, self.node_count, self.edge_count))
+            for values in (
+                self.lats,
+                self.lons,
+                self.offsets,
+                self.targets,
+                self.lengths,
+                self.times,
+            ):
+                values.tofile(out)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "RoadGraph":
+        """Read a graph written by ``save``."""
+        with open(path, "rb") as stream:
+            magic, nodes, edges = _HEADER.unpack(stream.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f"{path} is not a road graph file")
+            arrays = []
+            for typecode, count in (
+                ("d", nodes),
+                ("d", nodes),
+                ("I", nodes + 1),
+                ("I", edges),
+                ("f", edges),
+                ("f", edges),
+            ):
+                values = array(typecode)
+                values.fromfile(stream, count)
+                arrays.append(values)
+        return cls(*arrays, **kwargs)
+
+    def nearest_node(self, latitude: float, longitude: float) -> Optional[int]:
+        """Return the graph node closest to a point, or None if none is near."""
+        row = int(latitude // _SNAP_CELL_DEG)
+        col = int(longitude // _SNAP_CELL_DEG)
+        best = None
+        best_distance = float("inf")
+        for ring in range(3):
+            for r in range(row - ring, row + ring + 1):
+                for c in range(col - ring, col + ring + 1):
+                    if max(abs(r - row), abs(c - col)) != ring:
+                        continue
+                    for node in self._grid.get((r, c), ()):
+                        distance = haversine_km(
+                            latitude, longitude, self.lats[node], self.lons[node]
+                        )
+                        if distance < best_distance:
+                            best, best_distance = node, distance
+            if best is not None:
+                return best
+        return None
+
+    def _astar(self, source: int, target: int) -> Optional[Route]:
+        if source == target:
+            return Route(0.0, 0.0)
+        lats, lons = self.lats, self.lons
+        target_lat, target_lon = lats[target], lons[target]
+        speed = self._max_speed
+
+        def heuristic(node):
+            meters = 1000 * haversine_km(lats[node], lons[node], target_lat, target_lon)
+            return meters / speed
+
+        best = {source: (0.0, 0.0)}
+        queue = [(heuristic(source), 0.0, source)]
+        while queue:
+            _, seconds, node = heapq.heappop(queue)
+            if node == target:
+                return Route(seconds, best[node][1])
+            if seconds > best[node][0]:
+                continue
+            meters = best[node][1]
+            for edge in range(self.offsets[node], self.offsets[node + 1]):
+                neighbour = self.targets[edge]
+                candidate = seconds + self.times[edge]
+                known = best.get(neighbour)
+                if known is None or candidate < known[0]:
+                    best[neighbour] = (candidate, meters + self.lengths[edge])
+                    heapq.heappush(
+                        queue, (candidate + heuristic(neighbour), candidate, neighbour)
+                    )
+        return None
+
+    def routes_to(self, target: int, sources: Iterable[int]) -> Dict[int, Route]:
+        """Return routes from many source nodes to one target node.
+
+        A single Dijkstra over the reversed graph stops as soon as every
+        source has been settled. Unreachable sources are left out.
+        """
+        offsets, targets, lengths, times = self._reversed()
+        remaining = set(sources)
+        found: Dict[int, Route] = {}
+        best = {target: 0.0}
+        queue = [(0.0, 0.0, target)]
+        while queue and remaining:
+            seconds, meters, node = heapq.heappop(queue)
+            if seconds > best[node]:
+                continue
+            if node in remaining:
+                remaining.discard(node)
+                found[node] = Route(seconds, meters)
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbour = targets[edge]
+                candidate = seconds + times[edge]
+                if candidate < best.get(neighbour, float("inf")):
+                    best[neighbour] = candidate
+                    heapq.heappush(
+                        queue, (candidate, meters + lengths[edge], neighbour)
+                    )
+        return found
+
+    def _reversed(self) -> Tuple[array, array, array, array]:
+        if self._reverse is None:
+            node_count = self.node_count
+            offsets = array("I", [0] * (node_count + 1))
+            for v in self.targets:
+                offsets[v + 1] += 1
+            for node in range(node_count):
+                offsets[node + 1] += offsets[node]
+            position = array("I", offsets)
+            targets = array("I", [0] * self.edge_count)
+            lengths = array("f", [0.0] * self.edge_count)
+            times = array("f", [0.0] * self.edge_count)
+            for u in range(node_count):
+                for edge in range(self.offsets[u], self.offsets[u + 1]):
+                    v = self.targets[edge]
+                    slot = position[v]
+                    position[v] += 1
+                    targets[slot] = u
+                    lengths[slot] = self.lengths[edge]
+                    times[slot] = self.times[edge]
+            self._reverse = (offsets, targets, lengths, times)
+        return self._reverse
+
+    def _max_speed_mps(self) -> float:
+        speed = max(HIGHWAY_SPEEDS_KMH.values()) / 3.6
+        for length, seconds in zip(self.lengths, self.times):
+            if seconds > 0:
+                speed = max(speed, length / seconds)
+        return speed
+
+    def _build_grid(self) -> Dict[Tuple[int, int], List[int]]:
+        grid: Dict[Tuple[int, int], List[int]] = {}
+        for node in range(self.node_count):
+            cell = (
+                int(self.lats[node] // _SNAP_CELL_DEG),
+                int(self.lons[node] // _SNAP_CELL_DEG),
+            )
+            grid.setdefault(cell, []).append(node)
+        return grid
+
+
+class EtaEstimator:
+    """Estimate travel time and road distance between points."""
+
+    def __init__(
+        self,
+        graph: Optional[RoadGraph] = None,
+        fallback_speed_kmh: float = Config.ETA_FALLBACK_SPEED_KMH,
+        detour_factor: float = Config.ETA_DETOUR_FACTOR,
+        graph_path: Optional[str] = None,
+    ):
+        """Create an estimator.
+
+        Args:
+            graph: Road graph to route over. Without one, estimates are the
+                great-circle distance times ``detour_factor``.
+            fallback_speed_kmh: Average speed for the straight-line fallback
+                and for the legs between a point and its nearest graph node.
+            detour_factor: Ratio of road to great-circle distance assumed by
+                the fallback.
+            graph_path: File to load the graph from on first use, when no
+                ``graph`` is given.
+        """
+        self._graph = graph
+        self.graph_path = graph_path
+        self.fallback_speed_kmh = fallback_speed_kmh
+        self.detour_factor = detour_factor
+        self._graph_lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: Optional[str], **kwargs) -> "EtaEstimator":
+        """Create an estimator that loads the graph at ``path`` on first use."""
+        return cls(graph_path=path, **kwargs)
+
+    @property
+    def graph(self) -> Optional[RoadGraph]:
+        """The road graph, or None to use the straight-line fallback."""
+        if self._graph is None and self.graph_path:
+            # Loading a city graph takes seconds, so workers pay for it on
+            # their first route rather than at start-up
+            with self._graph_lock:
+                if self._graph is None:
+                    self._graph = RoadGraph.load(self.graph_path)
+        return self._graph
+
+    def route(self, origin: Point, destination: Point) -> Route:
+        """Return the estimated route between two points."""
+        if self.graph is not None:
+            source = self.graph.nearest_node(*origin)
+            target = self.graph.nearest_node(*destination)
+            if source is not None and target is not None:
+                route = self.graph.route_between(source, target)
+                if route is not None:
+                    return self._with_access_legs(
+                        route, origin, source, destination, target
+                    )
+        return self._straight_line(origin, destination)
+
+    def distance_km(self, origin: Point, destination: Point) -> float:
+        """Return the estimated road distance in kilometres."""
+        return self.route(origin, destination).meters / 1000
+
+    def travel_times_to(
+        self, destination: Point, origins: Sequence[Point]
+    ) -> List[float]:
+        """Return travel times in seconds from each origin to one destination.
+
+        This is the batched mode used to rank drivers against a pickup.
+        """
+        if self.graph is None:
+            return [self._straight_line(o, destination).seconds for o in origins]
+        target = self.graph.nearest_node(*destination)
+        sources = [self.graph.nearest_node(*o) for o in origins]
+        found = {}
+        if target is not None:
+            found = self.graph.routes_to(target, (s for s in sources if s is not None))
+        times = []
+        for origin, source in zip(origins, sources):
+            route = found.get(source)
+            if route is None:
+                times.append(self._straight_line(origin, destination).seconds)
+            else:
+                times.append(
+                    self._with_access_legs(
+                        route, origin, source, destination, target
+                    ).seconds
+                )
+        return times
+
+    def _with_access_legs(
+        self, route: Route, origin: Point, source: int, destination: Point, target: int
+    ) -> Route:
+        graph = self.graph
+        access_km = haversine_km(*origin, graph.lats[source], graph.lons[source])
+        access_km += haversine_km(*destination, graph.lats[target], graph.lons[target])
+        return Route(
+            route.seconds + access_km / self.fallback_speed_kmh * 3600,
+            route.meters + access_km * 1000,
+        )
+
+    def _straight_line(self, origin: Point, destination: Point) -> Route:
+        km = haversine_km(*origin, *destination) * self.detour_factor
+        return Route(km / self.fallback_speed_kmh * 3600, km * 1000)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point for building graph files."""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 3 or argv[0] != "build":
+        print("usage: python -m whatsapp_ride_service.eta build EXTRACT.osm OUTPUT")
+        sys.exit(2)
+    graph = RoadGraph.from_osm(argv[1])
+    graph.save(argv[2])
+    print(f"Wrote {graph.node_count} nodes and {graph.edge_count} edges to {argv[2]}")
+
+
+if __name__ == "__main__":
+    main()
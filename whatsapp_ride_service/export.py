@@ -0,0 +1,243 @@
+"""Streaming ride and payment exports for finance reconciliation.
+
+Rows come from a Core ``SELECT`` over rides outer-joined to payments,
+executed with ``yield_per`` so the driver streams them in fixed-size
+chunks; archived rides follow the hot ones. The writers turn the row
+stream into CSV text or gzipped JSON Lines chunks, so memory stays
+constant however large the range is. Run a monthly export with::
+
+    python -m whatsapp_ride_service.export --start 2024-05-01 --end 2024-06-01 \\
+        --format jsonl --output rides-2024-05.jsonl.gz
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+import zlib
+from datetime import datetime
+from enum import Enum
+from typing import Iterable, Iterator, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .config import Config
+from .models import (
+    ArchivedPayment,
+    ArchivedRide,
+    Payment,
+    PaymentStatus,
+    Ride,
+    RideStatus,
+)
+
+COLUMNS = [
+    "ride_id",
+    "user_id",
+    "driver_id",
+    "ride_status",
+    "pickup_latitude",
+    "pickup_longitude",
+    "dropoff_latitude",
+    "dropoff_longitude",
+    "ride_created_at",
+    "ride_completed_at",
+    "payment_id",
+    "amount",
+    "payment_status",
+    "stripe_payment_intent_id",
+    "payment_created_at",
+    "payment_completed_at",
+    "archived",
+]
+
+FORMATS = ("csv", "jsonl")
+
+
+def _select(
+    ride,
+    payment,
+    start: datetime,
+    end: datetime,
+    ride_status: Optional[RideStatus],
+    payment_status: Optional[PaymentStatus],
+):
+    statement = (
+        select(
+            ride.id.label("ride_id"),
+            ride.user_id,
+            ride.driver_id,
+            ride.status.label("ride_status"),
+            ride.pickup_latitude,
+            ride.pickup_longitude,
+            ride.dropoff_latitude,
+            ride.dropoff_longitude,
+            ride.created_at.label("ride_created_at"),
+            ride.completed_at.label("ride_completed_at"),
+            payment.id.label("payment_id"),
+            payment.amount,
+            payment.status.label("payment_status"),
+            payment.stripe_payment_intent_id,
+            payment.created_at.label("payment_created_at"),
+            payment.completed_at.label("payment_completed_at"),
+        )
+        .outerjoin(payment, payment.ride_id == ride.id)
+        .where(ride.created_at >= start, ride.created_at < end)
+        .order_by(ride.created_at, ride.id)
+    )
+    if ride_status is not None:
+        statement = statement.where(ride.status == ride_status)
+    if payment_status is not None:
+        statement = statement.where(payment.status == payment_status)
+    return statement
+
+
+def iter_rows(
+    session: Session,
+    start: datetime,
+    end: datetime,
+    ride_status: Optional[RideStatus] = None,
+    payment_status: Optional[PaymentStatus] = None,
+    archive_session: Optional[Session] = None,
+    batch_size: int = Config.EXPORT_BATCH_SIZE,
+) -> Iterator[dict]:
+    """Stream rides created in ``[start, end)`` with their payments.
+
+    Args:
+        session: Session on the hot database.
+        start: First ride creation time included.
+        end: First ride creation time excluded.
+        ride_status: Only export rides in this status.
+        payment_status: Only export rides whose payment is in this status.
+        archive_session: Session holding the archive tables; defaults to
+            ``session``.
+        batch_size: Rows fetched from the database at a time.
+
+    Yields:
+        One dict per ride, keyed by ``COLUMNS``.
+    """
+    tiers = [
+        (session, Ride, Payment, False),
+        (archive_session or session, ArchivedRide, ArchivedPayment, True),
+    ]
+    for tier_session, ride, payment, archived in tiers:
+        statement = _select(ride, payment, start, end, ride_status, payment_status)
+        result = tier_session.execute(statement.execution_options(yield_per=batch_size))
+        for row in result.mappings():
+            record = {column: _plain(value) for column, value in row.items()}
+            record["archived"] = archived
+            yield record
+
+
+def _plain(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(rows: Iterable[dict], chunk_rows: int = 500) -> Iterator[str]:
+    """Encode rows as CSV, yielding text every ``chunk_rows`` rows."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+    writer.writeheader()
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_jsonl_gz(rows: Iterable[dict]) -> Iterator[bytes]:
+    """Encode rows as gzipped JSON Lines, yielding compressed chunks."""
+    # wbits=31 selects the gzip container
+    compressor = zlib.compressobj(wbits=31)
+    for row in rows:
+        chunk = compressor.compress(json.dumps(row).encode("utf-8") + b"\n")
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+def encode(rows: Iterable[dict], fmt: str) -> Iterator:
+    """Encode rows in one of ``FORMATS``."""
+    if fmt == "csv":
+        return iter_csv(rows)
+    if fmt == "jsonl":
+        return iter_jsonl_gz(rows)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+class Counter:
+    """Counts rows flowing through an iterator and times the stream."""
+
+    def __init__(self, rows: Iterable[dict]):
+        """Wrap a row iterator."""
+        self.rows = rows
+        self.count = 0
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def __iter__(self) -> Iterator[dict]:
+        for row in self.rows:
+            self.count += 1
+            yield row
+        self.finished = time.perf_counter()
+
+    @property
+    def rows_per_second(self) -> float:
+        """Export throughput, measured up to now or to the last row."""
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point for exports."""
+    from sqlalchemy import create_engine
+
+    from .config import DevelopmentConfig
+
+    parser = argparse.ArgumentParser(description="Export rides and payments")
+    parser.add_argument("--start", type=datetime.fromisoformat, required=True)
+    parser.add_argument("--end", type=datetime.fromisoformat, required=True)
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--status", type=RideStatus, help="Ride status")
+    parser.add_argument("--payment-status", type=PaymentStatus)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args(argv)
+
+    config = DevelopmentConfig
+    session = Session(create_engine(config.SQLALCHEMY_DATABASE_URI))
+    archive_session = (
+        Session(create_engine(config.ARCHIVE_DATABASE_URL))
+        if config.ARCHIVE_DATABASE_URL
+        else None
+    )
+    counter = Counter(
+        iter_rows(
+            session,
+            args.start,
+            args.end,
+            ride_status=args.status,
+            payment_status=args.payment_status,
+            archive_session=archive_session,
+        )
+    )
+    mode = "w" if args.format == "csv" else "wb"
+    with open(args.output, mode, newline="" if mode == "w" else None) as output:
+        for chunk in encode(counter, args.format):
+            output.write(chunk)
+    print(
+        f"Exported {counter.count} rides at {counter.rows_per_second:,.0f} rows/s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+"""Localized WhatsApp message templates.
+
+Outbound texts are ``str.format``-style templates kept per language in
+``CATALOG``. ``TemplateRegistry`` compiles every template into a plain
+function when it is built, so sending a message does no parsing, only
+string concatenation::
+
+    TEMPLATES.render("ride_unavailable", "+5215550000001")
+    TEMPLATES.render_batch("ride_offer", driver_phones, ride_id=42, ...)
+
+The language of a recipient is inferred from the country calling code of
+their E.164 number; countries without a translation get
+``MESSAGE_DEFAULT_LANGUAGE``. Commands riders and drivers reply with
+(``accept``, ``yes``) stay in English in every language, since that is
+what the webhook parses.
+"""
+
+from string import Formatter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .config import Config
+
+# Calling codes of countries with a translation; calling codes are
+# prefix-free, so the first of the 1-3 leading digits found is the one
+COUNTRY_LANGUAGES = {
+    "34": "es",
+    "51": "es",
+    "52": "es",
+    "53": "es",
+    "54": "es",
+    "56": "es",
+    "57": "es",
+    "58": "es",
+    "502": "es",
+    "503": "es",
+    "504": "es",
+    "505": "es",
+    "506": "es",
+    "507": "es",
+    "591": "es",
+    "593": "es",
+    "595": "es",
+    "598": "es",
+    "55": "pt",
+    "244": "pt",
+    "258": "pt",
+    "351": "pt",
+}
+
+CATALOG = {
+    "en": {
+        "ride_offer": (
+            "New ride request!\n"
+            "Pickup: {pickup_latitude}, {pickup_longitude}\n"
+            "Destination: {dropoff_latitude}, {dropoff_longitude}\n"
+            "Fare: ${fare:.2f}\n"
+            "Reply 'accept {ride_id}' to accept this ride"
+        ),
+        "looking_for_driver": (
+            "Looking for a driver... We'll notify you when one accepts your ride!\n"
+            "Estimated fare: ${fare:.2f}"
+        ),
+        "no_drivers": "Sorry, no drivers are currently available in your area.",
+        "no_driver_accepted": (
+            "Sorry, no driver accepted your ride. Please try again shortly."
+        ),
+        "ride_accepted": (
+            "Your ride has been accepted! Please complete the payment: {payment_url}"
+        ),
+        "driver_accepted": (
+            "You've accepted the ride. "
+            "Please proceed to pickup location once payment is confirmed."
+        ),
+        "ride_unavailable": "This ride is no longer available.",
+        "payment_succeeded": "Your payment has been processed successfully!",
+        "payment_received": "Payment of ${amount:.2f} has been received for the ride.",
+        "high_demand": "High demand near {area}! Go online now to pick up riders.",
+        "welcome": (
+            "Welcome to WhatsApp Ride Service!\n"
+            "To request a ride, send: ride (or share your location)\n"
+            "To book in one message: "
+            "ride pickup_lat,pickup_long to dest_lat,dest_long\n"
+            "To check a fare first, send: "
+            "quote pickup_lat,pickup_long to dest_lat,dest_long"
+        ),
+        "driver_help": (
+            "You'll receive ride offers here while you're available.\n"
+            "To take one, reply: accept <ride id>"
+        ),
+        "register_first": (
+            "Please register first through our app to use this service."
+        ),
+        "throttled": "You're sending messages too quickly. Please wait a minute.",
+        "ride_format": (
+            "Please use the format: ride pickup_lat,pickup_long to dest_lat,dest_long"
+        ),
+        "quote_format": (
+            "Please use the format: quote pickup_lat,pickup_long to dest_lat,dest_long"
+        ),
+        "accept_format": "To accept a ride, reply: accept <ride id>",
+        "drivers_only": "Only registered drivers can accept rides.",
+        "request_failed": (
+            "Sorry, something went wrong with your request. Please try again."
+        ),
+        "accept_failed": (
+            "Sorry, something went wrong accepting the ride. Please try again."
+        ),
+        "pickup_prompt": (
+            "Where should we pick you up? Share your location, or send: lat,long\n"
+            "Send 'cancel' to stop."
+        ),
+        "dropoff_prompt": (
+            "Where are you going? Share the destination, or send: lat,long"
+        ),
+        "booking_cancelled": "Booking cancelled.",
+        "confirm_fare": (
+            "Estimated fare: ${fare:.2f}\n"
+            "Reply 'yes' to book this ride or 'cancel' to stop."
+        ),
+        "confirm_surge_fare": (
+            "Estimated fare: ${fare:.2f} "
+            "(includes {surge_multiplier:.1f}x high-demand pricing)\n"
+            "Reply 'yes' to book this ride or 'cancel' to stop."
+        ),
+        "driver_progress": (
+            "Your driver is {km:.1f} km away, about {minutes} min from pickup."
+        ),
+    },
+    "es": {
+        "ride_offer": (
+            "¡Nueva solicitud de viaje!\n"
+            "Recogida: {pickup_latitude}, {pickup_longitude}\n"
+            "Destino: {dropoff_latitude}, {dropoff_longitude}\n"
+            "Tarifa: ${fare:.2f}\n"
+            "Responde 'accept {ride_id}' para aceptar este viaje"
+        ),
+        "looking_for_driver": (
+            "Buscando un conductor... ¡Te avisaremos cuando uno acepte tu viaje!\n"
+            "Tarifa estimada: ${fare:.2f}"
+        ),
+        "no_drivers": (
+            "Lo sentimos, no hay conductores disponibles en tu zona en este momento."
+        ),
+        "no_driver_accepted": (
+            "Lo sentimos, ningún conductor aceptó tu viaje. "
+            "Inténtalo de nuevo en unos minutos."
+        ),
+        "ride_accepted": "¡Tu viaje fue aceptado! Completa el pago: {payment_url}",
+        "driver_accepted": (
+            "Aceptaste el viaje. "
+            "Dirígete al punto de recogida cuando se confirme el pago."
+        ),
+        "ride_unavailable": "Este viaje ya no está disponible.",
+        "payment_succeeded": "¡Tu pago se procesó correctamente!",
+        "payment_received": "Se recibió el pago de ${amount:.2f} por el viaje.",
+        "high_demand": (
+            "¡Alta demanda cerca de {area}! Conéctate ahora para recoger pasajeros."
+        ),
+        "welcome": (
+            "¡Bienvenido a WhatsApp Ride Service!\n"
+            "Para pedir un viaje, envía: ride (o comparte tu ubicación)\n"
+            "Para reservar en un mensaje: "
+            "ride pickup_lat,pickup_long to dest_lat,dest_long\n"
+            "Para consultar una tarifa antes, envía: "
+            "quote pickup_lat,pickup_long to dest_lat,dest_long"
+        ),
+        "driver_help": (
+            "Recibirás ofertas de viaje aquí mientras estés disponible.\n"
+            "Para tomar una, responde: accept <id del viaje>"
+        ),
+        "register_first": (
+            "Primero regístrate en nuestra app para usar este servicio."
+        ),
+        "throttled": "Estás enviando mensajes muy rápido. Espera un minuto.",
+        "ride_format": (
+            "Usa el formato: ride pickup_lat,pickup_long to dest_lat,dest_long"
+        ),
+        "quote_format": (
+            "Usa el formato: quote pickup_lat,pickup_long to dest_lat,dest_long"
+        ),
+        "accept_format": "Para aceptar un viaje, responde: accept <id del viaje>",
+        "drivers_only": "Solo los conductores registrados pueden aceptar viajes.",
+        "request_failed": (
+            "Lo sentimos, algo salió mal con tu solicitud. Inténtalo de nuevo."
+        ),
+        "accept_failed": (
+            "Lo sentimos, algo salió mal al aceptar el viaje. Inténtalo de nuevo."
+        ),
+        "pickup_prompt": (
+            "¿Dónde te recogemos? Comparte tu ubicación o envía: lat,long\n"
+            "Envía 'cancel' para salir."
+        ),
+        "dropoff_prompt": "¿A dónde vas? Comparte el destino o envía: lat,long",
+        "booking_cancelled": "Reserva cancelada.",
+        "confirm_fare": (
+            "Tarifa estimada: ${fare:.2f}\n"
+            "Responde 'yes' para reservar este viaje o 'cancel' para salir."
+        ),
+        "confirm_surge_fare": (
+            "Tarifa estimada: ${fare:.2f} "
+            "(incluye tarifa de alta demanda de {surge_multiplier:.1f}x)\n"
+            "Responde 'yes' para reservar este viaje o 'cancel' para salir."
+        ),
+        "driver_progress": (
+            "Tu conductor está a {km:.1f} km, a unos {minutes} min de la recogida."
+        ),
+    },
+    "pt": {
+        "ride_offer": (
+            "Nova solicitação de corrida!\n"
+            "Embarque: {pickup_latitude}, {pickup_longitude}\n"
+            "Destino: {dropoff_latitude}, {dropoff_longitude}\n"
+            "Tarifa: ${fare:.2f}\n"
+            "Responda 'accept {ride_id}' para aceitar esta corrida"
+        ),
+        "looking_for_driver": (
+            "Procurando um motorista... Avisaremos quando um aceitar sua corrida!\n"
+            "Tarifa estimada: ${fare:.2f}"
+        ),
+        "no_drivers": "Desculpe, não há motoristas disponíveis na sua região agora.",
+        "no_driver_accepted": (
+            "Desculpe, nenhum motorista aceitou sua corrida. "
+            "Tente novamente em instantes."
+        ),
+        "ride_accepted": "Sua corrida foi aceita! Conclua o pagamento: {payment_url}",
+        "driver_accepted": (
+            "Você aceitou a corrida. "
+            "Siga para o local de embarque quando o pagamento for confirmado."
+        ),
+        "ride_unavailable": "Esta corrida não está mais disponível.",
+        "payment_succeeded": "Seu pagamento foi processado com sucesso!",
+        "payment_received": "O pagamento de ${amount:.2f} pela corrida foi recebido.",
+        "high_demand": (
+            "Alta demanda perto de {area}! Fique online agora para pegar passageiros."
+        ),
+        "welcome": (
+            "Bem-vindo ao WhatsApp Ride Service!\n"
+            "Para pedir uma corrida, envie: ride (ou compartilhe sua localização)\n"
+            "Para reservar em uma mensagem: "
+            "ride pickup_lat,pickup_long to dest_lat,dest_long\n"
+            "Para consultar uma tarifa antes, envie: "
+            "quote pickup_lat,pickup_long to dest_lat,dest_long"
+        ),
+        "driver_help": (
+            "Você receberá ofertas de corrida aqui enquanto estiver disponível.\n"
+            "Para aceitar uma, responda: accept <id da corrida>"
+        ),
+        "register_first": (
+            "Cadastre-se primeiro pelo nosso app para usar este serviço."
+        ),
+        "throttled": "Você está enviando mensagens rápido demais. Aguarde um minuto.",
+        "ride_format": (
+            "Use o formato: ride pickup_lat,pickup_long to dest_lat,dest_long"
+        ),
+        "quote_format": (
+            "Use o formato: quote pickup_lat,pickup_long to dest_lat,dest_long"
+        ),
+        "accept_format": "Para aceitar uma corrida, responda: accept <id da corrida>",
+        "drivers_only": "Apenas motoristas cadastrados podem aceitar corridas.",
+        "request_failed": (
+            "Desculpe, algo deu errado com sua solicitação. Tente novamente."
+        ),
+        "accept_failed": (
+            "Desculpe, algo deu errado ao aceitar a corrida. Tente novamente."
+        ),
+        "pickup_prompt": (
+            "Onde buscamos você? Compartilhe sua localização ou envie: lat,long\n"
+            "Envie 'cancel' para sair."
+        ),
+        "dropoff_prompt": "Para onde você vai? Compartilhe o destino ou envie: lat,long",
+        "booking_cancelled": "Reserva cancelada.",
+        "confirm_fare": (
+            "Tarifa estimada: ${fare:.2f}\n"
+            "Responda 'yes' para reservar esta corrida ou 'cancel' para sair."
+        ),
+        "confirm_surge_fare": (
+            "Tarifa estimada: ${fare:.2f} "
+            "(inclui tarifa de alta demanda de {surge_multiplier:.1f}x)\n"
+            "Responda 'yes' para reservar esta corrida ou 'cancel' para sair."
+        ),
+        "driver_progress": (
+            "Seu motorista está a {km:.1f} km, cerca de {minutes} min do embarque."
+        ),
+    },
+}
+
+_CONVERSIONS = {"s": "str", "r": "repr", "a": "ascii"}
+
+
+class Template:
+    """A message template compiled into a function of its fields."""
+
+    def __init__(self, text: str):
+        """Compile a template.
+
+        Args:
+            text: A ``str.format`` template whose fields are plain names,
+                optionally with a conversion and format spec.
+        """
+        self.text = text
+        self.fields: Tuple[str, ...] = ()
+        self._render = self._compile()
+
+    def __call__(self, **values: Any) -> str:
+        """Render the template; every field must be given."""
+        return self._render(**values)
+
+    def _compile(self) -> Callable[..., str]:
+        # One concatenation per template: no format-string parsing per send
+        parts = []
+        fields: Dict[str, None] = {}
+        for literal, field, spec, conversion in Formatter().parse(self.text):
+            if literal:
+                parts.append(repr(literal))
+            if field is None:
+                continue
+            if not field.isidentifier():
+                raise ValueError(f"Unsupported template field: {field!r}")
+            fields[field] = None
+            value = field
+            if conversion:
+                value = f"{_CONVERSIONS[conversion]}({value})"
+            parts.append(f"format({value}, {spec!r})" if spec else f"str({value})")
+        self.fields = tuple(fields)
+        arguments = f"*, {', '.join(self.fields)}" if self.fields else ""
+        body = " + ".join(parts) if parts else "''"
+        namespace: Dict[str, Any] = {}
+        exec(f"def render({arguments}):\n    return {body}\n", namespace)
+        return namespace["render"]
+
+
+class TemplateRegistry:
+    """Compiled templates for every message and language."""
+
+    def __init__(
+        self,
+        catalog: Dict[str, Dict[str, str]],
+        default_language: str = Config.MESSAGE_DEFAULT_LANGUAGE,
+        country_languages: Optional[Dict[str, str]] = None,
+    ):
+        """Compile a catalog.
+
+        Args:
+            catalog: Templates by language, then by message key. Messages
+                missing from a language fall back to the default language.
+            default_language: Language used for unknown countries.
+            country_languages: Calling codes (without ``+``) mapped to
+                languages; defaults to ``COUNTRY_LANGUAGES``.
+        """
+        if default_language not in catalog:
+            raise ValueError(f"No templates for language {default_language!r}")
+        self.default_language = default_language
+        self.country_languages = (
+            COUNTRY_LANGUAGES if country_languages is None else country_languages
+        )
+        defaults = {
+            key: Template(text) for key, text in catalog[default_language].items()
+        }
+        self._templates: Dict[Tuple[str, str], Template] = {}
+        for language, messages in catalog.items():
+            for key, default in defaults.items():
+                template = Template(messages[key]) if key in messages else default
+                if set(template.fields) != set(default.fields):
+                    raise ValueError(
+                        f"Template {key!r} in {language!r} has different fields"
+                    )
+                self._templates[language, key] = template
+
+    def language_for(self, phone: Optional[str]) -> str:
+        """Return the language for an E.164 number."""
+        if phone and phone.startswith("+"):
+            for length in (1, 2, 3):
+                language = self.country_languages.get(phone[1 : 1 + length])
+                if language is not None:
+                    return language
+        return self.default_language
+
+    def template(self, key: str, language: str) -> Template:
+        """Return the compiled template of a message in a language."""
+        template = self._templates.get((language, key))
+        if template is None:
+            template = self._templates[self.default_language, key]
+        return template
+
+    def render(
+        self,
+        key: str,
+        phone: Optional[str] = None,
+        language: Optional[str] = None,
+        **values: Any,
+    ) -> str:
+        """Render a message for a recipient.
+
+        Args:
+            key: The message key in the catalog.
+            phone: The recipient's E.164 number, used to pick the language.
+            language: Overrides the language inferred from ``phone``.
+            **values: The template's fields.
+        """
+        return self.template(key, language or self.language_for(phone))(**values)
+
+    def render_batch(
+        self, key: str, phones: Iterable[str], **values: Any
+    ) -> List[Tuple[str, str]]:
+        """Render the same message for many recipients.
+
+        Each language is rendered once and the text shared by all of its
+        recipients, which keeps fan-outs such as broadcasts to every
+        driver in an area proportional to the number of languages.
+
+        Returns:
+            ``(phone, body)`` pairs in the order of ``phones``.
+        """
+        bodies: Dict[str, str] = {}
+        batch = []
+        for phone in phones:
+            language = self.language_for(phone)
+            body = bodies.get(language)
+            if body is None:
+                body = bodies[language] = self.template(key, language)(**values)
+            batch.append((phone, body))
+        return batch
+
+
+TEMPLATES = TemplateRegistry(CATALOG)
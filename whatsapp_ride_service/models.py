@@ -12,8 +12,10 @@ from sqlalchemy import (
     Enum as SQLEnum,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
+    Text,
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -45,12 +47,16 @@ class User(Base):
     """User model for storing user data."""
 
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ux_users_stripe_customer", "stripe_customer_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String(100), nullable=False)
     email = Column(String(120), unique=True, nullable=False)
     phone_number = Column(String(20), unique=True, nullable=False)
     password_hash = Column(String(128), nullable=False)
+    stripe_customer_id = Column(String(255), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     rides = relationship("Ride", back_populates="user")
@@ -70,6 +76,15 @@ class Driver(Base):
     """Driver model for storing driver data."""
 
     __tablename__ = "drivers"
+    __table_args__ = (
+        # Nearby-driver search: availability, then a latitude range
+        Index(
+            "ix_drivers_available_location",
+            "is_available",
+            "current_latitude",
+            "current_longitude",
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String(100), nullable=False)
@@ -86,6 +101,16 @@ class Ride(Base):
     """Ride model for storing ride data."""
 
     __tablename__ = "rides"
+    __table_args__ = (
+        Index("ix_rides_user_created", "user_id", "created_at"),
+        Index("ix_rides_user_status", "user_id", "status"),
+        Index("ix_rides_driver_status", "driver_id", "status"),
+        Index("ix_rides_status", "status"),
+        Index("ix_rides_created", "created_at"),
+        # Never reuse the id of a deleted (e.g. archived) ride. SQLite only
+        # honours this for tables created with it; see archive.py
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -107,14 +132,104 @@ class Payment(Base):
     """Payment model for storing payment data."""
 
     __tablename__ = "payments"
+    __table_args__ = (
+        Index("ix_payments_ride", "ride_id"),
+        Index("ix_payments_user_created", "user_id", "created_at"),
+        Index("ix_payments_status_created", "status", "created_at"),
+        Index("ux_payments_stripe_intent", "stripe_payment_intent_id", unique=True),
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     ride_id = Column(Integer, ForeignKey("rides.id"), nullable=False)
     amount = Column(Float, nullable=False)
+    stripe_payment_intent_id = Column(String(255), nullable=True)
     status = Column(SQLEnum(PaymentStatus), default=PaymentStatus.PENDING)
     created_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
 
     user = relationship("User", back_populates="payments")
     ride = relationship("Ride", back_populates="payment")
+
+
+class RideOffer(Base):
+    """A driver an open ride was offered to.
+
+    Offers are stored rather than kept by the dispatching process, so an
+    accept can be checked whichever worker it reaches.
+    """
+
+    __tablename__ = "ride_offers"
+
+    ride_id = Column(Integer, ForeignKey("rides.id"), primary_key=True)
+    driver_id = Column(Integer, ForeignKey("drivers.id"), primary_key=True)
+    offered_at = Column(DateTime, default=datetime.utcnow)
+
+
+class StripeEvent(Base):
+    """Raw Stripe webhook event, stored once per Stripe event id."""
+
+    __tablename__ = "stripe_events"
+
+    id = Column(Integer, primary_key=True)
+    event_id = Column(String(255), unique=True, nullable=False)
+    type = Column(String(100), nullable=False)
+    payload = Column(Text, nullable=False)
+    received_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True, index=True)
+    error = Column(String(255), nullable=True)  # Why the event was not applied
+
+
+class ArchivedRide(Base):
+    """A terminal ride moved out of the hot ``rides`` table.
+
+    Archive tables carry no foreign keys so they can live in a separate
+    database (``ARCHIVE_DATABASE_URL``).
+    """
+
+    __tablename__ = "archived_rides"
+    __table_args__ = (
+        Index("ix_archived_rides_user_created", "user_id", "created_at"),
+        Index("ix_archived_rides_driver_created", "driver_id", "created_at"),
+        Index("ix_archived_rides_created", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False)
+    driver_id = Column(Integer, nullable=True)
+    pickup_latitude = Column(Float, nullable=False)
+    pickup_longitude = Column(Float, nullable=False)
+    dropoff_latitude = Column(Float, nullable=False)
+    dropoff_longitude = Column(Float, nullable=False)
+    status = Column(SQLEnum(RideStatus), nullable=False)
+    created_at = Column(DateTime)
+    completed_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    payment = relationship(
+        "ArchivedPayment",
+        primaryjoin="ArchivedRide.id == foreign(ArchivedPayment.ride_id)",
+        uselist=False,
+        viewonly=True,
+    )
+
+
+class ArchivedPayment(Base):
+    """The payment of an archived ride."""
+
+    __tablename__ = "archived_payments"
+    __table_args__ = (
+        Index("ix_archived_payments_ride", "ride_id"),
+        Index("ix_archived_payments_user_created", "user_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False)
+    ride_id = Column(Integer, nullable=False)
+    amount = Column(Float, nullable=False)
+    stripe_payment_intent_id = Column(String(255), nullable=True)
+    status = Column(SQLEnum(PaymentStatus), nullable=False)
+    created_at = Column(DateTime)
+    completed_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,92 @@
+"""Background delivery of outgoing WhatsApp messages.
+
+Request handlers and batch jobs put ``(phone_number, body)`` pairs on a
+``NotificationQueue`` and return immediately; a small pool of worker
+threads performs the Twilio calls.
+"""
+
+import queue
+import threading
+from typing import Callable, List, Optional
+
+from .config import Config
+
+_STOP = object()
+
+
+class NotificationQueue:
+    """A bounded outbox drained by worker threads."""
+
+    def __init__(
+        self,
+        send: Callable[[str, str], None],
+        workers: int = Config.NOTIFICATION_WORKERS,
+        max_size: int = Config.NOTIFICATION_QUEUE_SIZE,
+    ):
+        """Create a queue.
+
+        Args:
+            send: Delivers one message, called as ``send(phone_number, body)``.
+            workers: Number of delivery threads.
+            max_size: Messages held before ``enqueue`` blocks.
+        """
+        self.send = send
+        self.workers = workers
+        self.sent = 0
+        self.failed = 0
+        self._queue: "queue.Queue" = queue.Queue(max_size)
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def enqueue(self, phone_number: str, body: str) -> None:
+        """Queue a message, starting the workers on first use."""
+        self.start()
+        self._queue.put((phone_number, body))
+
+    def start(self) -> None:
+        """Start the worker threads if they are not running."""
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._work, name=f"notifications-{index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued message has been attempted.
+
+        Returns:
+            False if messages were still pending after ``timeout`` seconds.
+        """
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(
+                lambda: not self._queue.unfinished_tasks, timeout
+            )
+
+    def stop(self) -> None:
+        """Deliver what is queued, then stop the workers."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join()
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                self.send(*item)
+                with self._lock:
+                    self.sent += 1
+            except Exception:
+                # A failed send must not take the worker down with it
+                with self._lock:
+                    self.failed += 1
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,254 @@
+"""Phone number canonicalization and sender lookup.
+
+Every phone number the service stores or looks up goes through
+``normalize_phone`` first, so ``whatsapp:+1 (555) 000-0001`` from Twilio
+and ``+15550000001`` typed at registration meet as the same E.164 string.
+Parsing uses ``phonenumbers`` (imported on first use) and is memoized in
+a bounded LRU, since the same few senders message over and over.
+
+``PhoneDirectory`` caches recently seen numbers with their user and/or
+driver id, so resolving a repeat WhatsApp sender is a dict lookup. It
+follows committed ORM changes made through its own sessionmaker; entries
+expire after ``PHONE_DIRECTORY_TTL_SECONDS`` so changes made elsewhere,
+e.g. by another process or a bulk load, are picked up, and unknown
+numbers are remembered for ``PHONE_DIRECTORY_MISS_TTL_SECONDS`` so a
+stranger messaging repeatedly does not cost a query each time.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import event, inspect, literal, select
+from sqlalchemy.orm import Session
+
+from .config import Config
+from .models import Driver, User
+
+WHATSAPP_PREFIX = "whatsapp:"
+
+
+@lru_cache(maxsize=Config.PHONE_CACHE_SIZE)
+def _parse(text: str) -> Optional[Tuple[str, bool]]:
+    import phonenumbers
+
+    try:
+        number = phonenumbers.parse(text, Config.PHONE_DEFAULT_REGION)
+    except phonenumbers.NumberParseException:
+        return None
+    return (
+        phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164),
+        phonenumbers.is_valid_number(number),
+    )
+
+
+def _strip(raw: Optional[str]) -> str:
+    text = (raw or "").strip()
+    if text.startswith(WHATSAPP_PREFIX):
+        text = text[len(WHATSAPP_PREFIX) :]
+    return text
+
+
+def normalize_phone(raw: Optional[str]) -> Optional[str]:
+    """Return the E.164 form of a phone number, or None if it cannot be parsed.
+
+    A leading ``whatsapp:`` is dropped. Numbers without a ``+`` country
+    code are read in ``PHONE_DEFAULT_REGION``.
+    """
+    text = _strip(raw)
+    if not text:
+        return None
+    parsed = _parse(text)
+    return parsed[0] if parsed else None
+
+
+def is_valid_phone(raw: Optional[str]) -> bool:
+    """Return whether the number exists in its country's numbering plan."""
+    text = _strip(raw)
+    parsed = _parse(text) if text else None
+    return bool(parsed and parsed[1])
+
+
+class Identity(NamedTuple):
+    """Who a phone number belongs to."""
+
+    user_id: Optional[int]
+    driver_id: Optional[int]
+
+    @property
+    def role(self) -> str:
+        """``"user"``, ``"driver"`` or ``"both"``."""
+        if self.user_id is not None and self.driver_id is not None:
+            return "both"
+        return "driver" if self.driver_id is not None else "user"
+
+
+class PhoneDirectory:
+    """In-memory, expiring map of E.164 phone numbers to users and drivers."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        ttl_seconds: float = Config.PHONE_DIRECTORY_TTL_SECONDS,
+        miss_ttl_seconds: float = Config.PHONE_DIRECTORY_MISS_TTL_SECONDS,
+        max_entries: int = Config.PHONE_DIRECTORY_SIZE,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Create an empty directory.
+
+        Args:
+            session_factory: Returns a new database session, used for
+                numbers missing from the map.
+            ttl_seconds: How long a found number is trusted before it is
+                looked up again, bounding how stale changes made by other
+                processes can be.
+            miss_ttl_seconds: How long an unknown number is remembered as
+                unknown, so repeated messages from it skip the database.
+            max_entries: Numbers kept before the least recently used are
+                dropped.
+            clock: Returns the current time in seconds.
+        """
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+        self.miss_ttl_seconds = miss_ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        # phone -> (identity or None for an unknown number, expiry time)
+        self._entries: "OrderedDict[str, Tuple[Optional[Identity], float]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self._target = None
+        # Pending changes are kept per directory in each session's info
+        self._changes_key = ("phone_changes", id(self))
+
+    @classmethod
+    def from_config(
+        cls, config, session_factory: Callable[[], Session]
+    ) -> "PhoneDirectory":
+        """Build a directory sized and timed by ``PHONE_DIRECTORY_*`` settings."""
+        return cls(
+            session_factory,
+            ttl_seconds=config.PHONE_DIRECTORY_TTL_SECONDS,
+            miss_ttl_seconds=config.PHONE_DIRECTORY_MISS_TTL_SECONDS,
+            max_entries=config.PHONE_DIRECTORY_SIZE,
+        )
+
+    def resolve(self, raw: Optional[str]) -> Optional[Identity]:
+        """Return who a sender is, or None for an unknown number."""
+        phone = normalize_phone(raw)
+        if phone is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(phone)
+            if entry is not None and entry[1] > self.clock():
+                self._entries.move_to_end(phone)
+                return entry[0]
+        return self._lookup(phone)
+
+    def set(self, phone_number: str, kind: str, row_id: Optional[int]) -> None:
+        """Point a number's ``"user"`` or ``"driver"`` side at a row (or None).
+
+        Only a number already known to the directory is updated in place;
+        any other entry, including a cached miss, is dropped so the next
+        ``resolve`` reads both sides from the database.
+        """
+        phone = normalize_phone(phone_number) or phone_number
+        with self._lock:
+            identity, expires_at = self._entries.pop(phone, (None, 0.0))
+            if identity is None or expires_at <= self.clock():
+                return
+            user_id, driver_id = identity
+            if kind == "user":
+                user_id = row_id
+            else:
+                driver_id = row_id
+            if user_id is not None or driver_id is not None:
+                self._entries[phone] = (Identity(user_id, driver_id), expires_at)
+
+    def clear(self) -> None:
+        """Forget every cached number."""
+        with self._lock:
+            self._entries.clear()
+
+    def connect(self, target=None) -> None:
+        """Follow committed inserts, phone changes and deletes of users and drivers.
+
+        Args:
+            target: The ``sessionmaker`` whose sessions are followed,
+                ``session_factory`` by default. Listening on it rather than
+                on ``Session`` keeps each app's directory to its own
+                sessions, and ``disconnect`` can remove the listeners.
+        """
+        self.disconnect()
+        self._target = target or self.session_factory
+        for name, handler in self._listeners():
+            event.listen(self._target, name, handler)
+
+    def disconnect(self) -> None:
+        """Stop following session changes."""
+        if self._target is None:
+            return
+        for name, handler in self._listeners():
+            event.remove(self._target, name, handler)
+        self._target = None
+
+    def _listeners(self):
+        return (
+            ("after_flush", self._collect_changes),
+            ("after_commit", self._apply_changes),
+            ("after_rollback", self._discard_changes),
+        )
+
+    def _lookup(self, phone: str) -> Optional[Identity]:
+        # One round trip, served by the unique phone indexes of both tables
+        statement = (
+            select(literal(0), User.id)
+            .where(User.phone_number == phone)
+            .union_all(
+                select(literal(1), Driver.id).where(Driver.phone_number == phone)
+            )
+        )
+        session = self.session_factory()
+        try:
+            rows = session.execute(statement).all()
+        finally:
+            session.close()
+        identity = None
+        ttl = self.miss_ttl_seconds
+        if rows:
+            ids: List[Optional[int]] = [None, None]
+            for index, row_id in rows:
+                ids[index] = row_id
+            identity = Identity(*ids)
+            ttl = self.ttl_seconds
+        with self._lock:
+            self._entries[phone] = (identity, self.clock() + ttl)
+            self._entries.move_to_end(phone)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return identity
+
+    def _collect_changes(self, session, flush_context):
+        changes = session.info.setdefault(self._changes_key, [])
+        for instance in (*session.new, *session.dirty, *session.deleted):
+            if not isinstance(instance, (User, Driver)):
+                continue
+            kind = "user" if isinstance(instance, User) else "driver"
+            history = inspect(instance).attrs.phone_number.history
+            for old_phone in history.deleted:
+                changes.append((old_phone, kind, None))
+            if instance in session.deleted:
+                changes.append((instance.phone_number, kind, None))
+            else:
+                changes.append((instance.phone_number, kind, instance.id))
+
+    def _apply_changes(self, session):
+        for phone_number, kind, row_id in session.info.pop(self._changes_key, ()):
+            if phone_number:
+                self.set(phone_number, kind, row_id)
+
+    def _discard_changes(self, session):
+        session.info.pop(self._changes_key, None)
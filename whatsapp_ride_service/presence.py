@@ -0,0 +1,399 @@
+"""Driver presence from heartbeats.
+
+``Driver.is_available`` only says a driver *wants* rides; it stays true
+when their phone dies. ``PresenceTracker`` treats every location update
+(``driver_location_updated``) and every WhatsApp message from a driver as
+a heartbeat. Drivers silent for ``PRESENCE_TIMEOUT_SECONDS`` expire from a
+timing wheel, which costs O(1) per heartbeat and per tick however many
+drivers are online.
+
+Expired drivers are marked unavailable in bulk every
+``PRESENCE_FLUSH_SECONDS``, so the spatial driver query and dispatch stop
+offering them rides. A driver we took offline becomes available again
+with their next heartbeat; drivers who were already unavailable (e.g. on a
+ride) are left alone.
+
+Each worker process only hears the heartbeats sent to it, so with several
+workers a driver talking to one of them would be expired by the others.
+Give them a shared ``SQLiteHeartbeats`` file (``PRESENCE_DB_PATH``): a
+worker then only takes a driver offline if no worker has heard from them
+within the timeout, and whichever worker gets their next heartbeat brings
+them back.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from . import signals
+from .config import Config
+from .models import Driver
+from .replica import note_writes
+
+logger = logging.getLogger(__name__)
+
+
+class TimingWheel:
+    """Expires keys ``timeout_seconds`` after they were last touched.
+
+    Keys live in one of a ring of slots, one per tick, chosen by their
+    deadline. Touching a key moves it between two slots and each tick
+    empties a single slot, so neither depends on how many keys there are.
+    Expiry is accurate to one tick.
+    """
+
+    def __init__(self, timeout_seconds: float, tick_seconds: float, now: float):
+        """Create an empty wheel whose clock starts at ``now``."""
+        self.tick_seconds = tick_seconds
+        self.timeout_ticks = max(1, int(-(-timeout_seconds // tick_seconds)))
+        self._slots: List[Set[Hashable]] = [
+            set() for _ in range(self.timeout_ticks + 1)
+        ]
+        self._deadlines: Dict[Hashable, int] = {}
+        self._tick = self._tick_of(now)
+
+    def touch(self, key: Hashable, now: float) -> None:
+        """Restart a key's timeout, adding it if it is new."""
+        deadline = self._tick_of(now) + self.timeout_ticks
+        previous = self._deadlines.get(key)
+        if previous is not None:
+            self._slots[previous % len(self._slots)].discard(key)
+        self._deadlines[key] = deadline
+        self._slots[deadline % len(self._slots)].add(key)
+
+    def remove(self, key: Hashable) -> None:
+        """Stop tracking a key."""
+        deadline = self._deadlines.pop(key, None)
+        if deadline is not None:
+            self._slots[deadline % len(self._slots)].discard(key)
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Move the wheel up to ``now`` and return the keys that expired."""
+        target = self._tick_of(now)
+        # After a long pause every slot is visited once, not once per tick
+        first = max(self._tick + 1, target - len(self._slots) + 1)
+        expired = []
+        for tick in range(first, target + 1):
+            slot = self._slots[tick % len(self._slots)]
+            # A slot also holds keys whose deadline is a full turn later
+            due = [key for key in slot if self._deadlines[key] <= target]
+            for key in due:
+                slot.discard(key)
+                del self._deadlines[key]
+            expired.extend(due)
+        self._tick = max(self._tick, target)
+        return expired
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def _tick_of(self, now: float) -> int:
+        return int(now // self.tick_seconds)
+
+
+class SQLiteHeartbeats:
+    """Last heartbeat of each driver, in a SQLite file shared by worker processes."""
+
+    def __init__(
+        self,
+        path: str,
+        table: str = "heartbeats",
+        batch_size: int = Config.PRESENCE_BATCH_SIZE,
+        clock: Callable[[], float] = time.time,
+    ):
+        """Open the store, creating its table if needed.
+
+        Args:
+            path: SQLite database file. Every worker must use the same one.
+            table: Table holding the heartbeats.
+            batch_size: Driver ids per query, below SQLite's variable limit.
+            clock: Wall-clock time source, in seconds; it must agree
+                across processes.
+        """
+        self.path = path
+        self.table = table
+        self.batch_size = batch_size
+        self.clock = clock
+        self._local = threading.local()
+        self._connection().execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (driver_id INTEGER PRIMARY KEY, "
+            "seen REAL NOT NULL, offline INTEGER NOT NULL DEFAULT 0)"
+        )
+
+    def beat(self, driver_id: int) -> bool:
+        """Record a heartbeat.
+
+        Returns:
+            Whether some worker had taken the driver offline, in which case
+            the caller is now responsible for bringing them back.
+        """
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                f"SELECT offline FROM {self.table} WHERE driver_id = ?", (driver_id,)
+            ).fetchone()
+            connection.execute(
+                f"INSERT OR REPLACE INTO {self.table} (driver_id, seen, offline) "
+                "VALUES (?, ?, 0)",
+                (driver_id, self.clock()),
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return bool(row and row[0])
+
+    def seen_within(self, driver_ids: Iterable[int], seconds: float) -> Set[int]:
+        """Return the drivers any worker has heard from in the last ``seconds``."""
+        since = self.clock() - seconds
+        seen: Set[int] = set()
+        for batch in self._batches(driver_ids):
+            seen.update(
+                driver_id
+                for (driver_id,) in self._connection().execute(
+                    f"SELECT driver_id FROM {self.table} WHERE seen >= ? "
+                    f"AND driver_id IN ({', '.join('?' * len(batch))})",
+                    (since, *batch),
+                )
+            )
+        return seen
+
+    def mark_offline(self, driver_ids: Iterable[int]) -> None:
+        """Record that drivers were taken offline, so any worker can revive them."""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for batch in self._batches(driver_ids):
+                connection.executemany(
+                    f"INSERT INTO {self.table} (driver_id, seen, offline) "
+                    "VALUES (?, 0, 1) ON CONFLICT (driver_id) DO UPDATE SET offline = 1",
+                    [(driver_id,) for driver_id in batch],
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _batches(self, driver_ids: Iterable[int]) -> List[List[int]]:
+        ids = sorted(driver_ids)
+        return [
+            ids[start : start + self.batch_size]
+            for start in range(0, len(ids), self.batch_size)
+        ]
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+
+class PresenceTracker:
+    """Tracks which drivers are reachable and syncs it to ``is_available``."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        timeout_seconds: float = Config.PRESENCE_TIMEOUT_SECONDS,
+        tick_seconds: float = Config.PRESENCE_TICK_SECONDS,
+        flush_seconds: float = Config.PRESENCE_FLUSH_SECONDS,
+        batch_size: int = Config.PRESENCE_BATCH_SIZE,
+        clock: Callable[[], float] = time.monotonic,
+        heartbeats: Optional[SQLiteHeartbeats] = None,
+    ):
+        """Create a tracker with no drivers online.
+
+        Args:
+            session_factory: Returns a new database session.
+            timeout_seconds: Silence after which a driver is taken offline.
+            tick_seconds: Resolution of the timeout.
+            flush_seconds: Interval between bulk availability updates.
+            batch_size: Driver ids per ``UPDATE`` statement.
+            clock: Monotonic time source.
+            heartbeats: Heartbeats shared with other worker processes, if
+                there are any.
+        """
+        self.session_factory = session_factory
+        self.timeout_seconds = timeout_seconds
+        self.tick_seconds = tick_seconds
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self.clock = clock
+        self.heartbeats = heartbeats
+        self._wheel = TimingWheel(timeout_seconds, tick_seconds, clock())
+        # Expired or revived drivers whose availability is not written yet
+        self._pending_offline: Set[int] = set()
+        self._pending_online: Set[int] = set()
+        # Drivers this tracker made unavailable, so a heartbeat undoes it
+        self._offline: Set[int] = set()
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(
+        cls, config, session_factory: Callable[[], Session]
+    ) -> "PresenceTracker":
+        """Build a tracker, sharing heartbeats if ``PRESENCE_DB_PATH`` is set."""
+        heartbeats = None
+        if config.PRESENCE_DB_PATH:
+            heartbeats = SQLiteHeartbeats(
+                config.PRESENCE_DB_PATH, batch_size=config.PRESENCE_BATCH_SIZE
+            )
+        return cls(
+            session_factory,
+            timeout_seconds=config.PRESENCE_TIMEOUT_SECONDS,
+            tick_seconds=config.PRESENCE_TICK_SECONDS,
+            flush_seconds=config.PRESENCE_FLUSH_SECONDS,
+            batch_size=config.PRESENCE_BATCH_SIZE,
+            heartbeats=heartbeats,
+        )
+
+    @property
+    def running(self) -> bool:
+        """Whether the background expiry thread has been started."""
+        return self._timer is not None
+
+    def seed(self, driver_ids: Iterable[int]) -> None:
+        """Start the timeout of drivers already available, e.g. at startup."""
+        now = self.clock()
+        with self._lock:
+            for driver_id in driver_ids:
+                self._wheel.touch(driver_id, now)
+
+    def heartbeat(self, driver_id: int) -> None:
+        """Record that a driver is reachable right now."""
+        # Another worker may have taken the driver offline
+        revived = self.heartbeats.beat(driver_id) if self.heartbeats else False
+        now = self.clock()
+        with self._lock:
+            self._wheel.touch(driver_id, now)
+            self._pending_offline.discard(driver_id)
+            if driver_id in self._offline or revived:
+                self._offline.discard(driver_id)
+                self._pending_online.add(driver_id)
+
+    def online(self, driver_id: int) -> bool:
+        """Return whether a driver has heartbeated within the timeout."""
+        return driver_id in self._wheel
+
+    def expire(self) -> List[int]:
+        """Advance the clock and return the drivers that just went silent."""
+        now = self.clock()
+        with self._lock:
+            expired = self._wheel.advance(now)
+            self._pending_offline.update(expired)
+        return expired
+
+    def flush(self) -> Tuple[int, int]:
+        """Write pending availability changes in bulk.
+
+        Returns:
+            ``(taken_offline, brought_back)`` driver counts.
+        """
+        with self._lock:
+            offline, self._pending_offline = self._pending_offline, set()
+            online, self._pending_online = self._pending_online, set()
+        if not offline and not online:
+            return 0, 0
+
+        try:
+            if self.heartbeats and offline:
+                # Drivers who checked in with another worker restart their timeout
+                alive = self.heartbeats.seen_within(offline, self.timeout_seconds)
+                offline -= alive
+                now = self.clock()
+                with self._lock:
+                    for driver_id in alive:
+                        self._wheel.touch(driver_id, now)
+            session = self.session_factory()
+            try:
+                taken_offline = self._set_available(session, offline, False)
+                brought_back = self._set_available(session, online, True)
+                note_writes(session, driver_ids=taken_offline + brought_back)
+                session.commit()
+            finally:
+                session.close()
+        except Exception:
+            with self._lock:
+                # Retry on the next flush, unless the driver is back already
+                self._pending_offline.update(
+                    driver_id for driver_id in offline if driver_id not in self._wheel
+                )
+                self._pending_online |= online
+            raise
+
+        with self._lock:
+            self._offline.update(taken_offline)
+        for driver_id in taken_offline:
+            signals.driver_availability_changed.send(driver_id, available=False)
+        for driver_id in brought_back:
+            signals.driver_availability_changed.send(driver_id, available=True)
+        if self.heartbeats and taken_offline:
+            self.heartbeats.mark_offline(taken_offline)
+        return len(taken_offline), len(brought_back)
+
+    def run_in_background(self) -> None:
+        """Start a daemon thread that expires drivers and flushes on a timer."""
+        if self._timer is not None:
+            return
+
+        def loop():
+            next_flush = self.clock() + self.flush_seconds
+            while True:
+                time.sleep(self.tick_seconds)
+                try:
+                    self.expire()
+                    if self.clock() >= next_flush:
+                        next_flush = self.clock() + self.flush_seconds
+                        self.flush()
+                except Exception:
+                    # flush() keeps failed changes pending, so keep ticking
+                    logger.exception("Driver presence update failed")
+
+        self._timer = threading.Thread(target=loop, name="presence", daemon=True)
+        self._timer.start()
+
+    def on_driver_location(self, driver, **kwargs) -> None:
+        """Receiver for ``signals.driver_location_updated``."""
+        self.heartbeat(driver.id)
+
+    def on_driver_availability(self, driver_id, **kwargs) -> None:
+        """Receiver for ``signals.driver_availability_changed``."""
+        # Going available (e.g. finishing a ride) is the driver's own doing
+        if kwargs["available"]:
+            self.heartbeat(driver_id)
+
+    def connect(self) -> None:
+        """Subscribe this tracker to the domain signals."""
+        signals.driver_location_updated.connect(self.on_driver_location)
+        signals.driver_availability_changed.connect(self.on_driver_availability)
+
+    def _set_available(
+        self, session: Session, driver_ids: Set[int], available: bool
+    ) -> List[int]:
+        changed: List[int] = []
+        ids = sorted(driver_ids)
+        for start in range(0, len(ids), self.batch_size):
+            changed.extend(
+                session.scalars(
+                    update(Driver)
+                    .where(
+                        Driver.id.in_(ids[start : start + self.batch_size]),
+                        Driver.is_available == (not available),
+                    )
+                    .values(is_available=available)
+                    .returning(Driver.id)
+                )
+            )
+        return changed
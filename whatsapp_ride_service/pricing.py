@@ -0,0 +1,187 @@
+"""Fare quoting with a cell-quantized cache.
+
+Pickup and dropoff points are snapped to a square grid and quotes are
+memoized per ``(pickup_cell, dropoff_cell)`` pair, so the many requests
+between the same popular places (airport, stations) share a single
+distance computation (a road-graph route when an ``EtaEstimator`` is
+configured). Surge is applied per pickup cell at lookup time and
+never cached, so multiplier changes take effect immediately: manual
+per-cell overrides win, otherwise the live ``SurgeEngine`` is consulted.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from .config import Config
+from .geo import cell_center, grid_cell, haversine_km
+
+if TYPE_CHECKING:
+    from .eta import EtaEstimator
+    from .surge import SurgeEngine
+
+Cell = Tuple[int, int]
+Point = Tuple[float, float]
+
+
+class FareQuote(NamedTuple):
+    """A fare quote between two grid cells."""
+
+    fare: float
+    distance_km: float
+    surge_multiplier: float
+    pickup_cell: Cell
+    dropoff_cell: Cell
+
+
+class FareQuoteService:
+    """Quote fares from an LRU/TTL cache keyed on quantized coordinates."""
+
+    def __init__(
+        self,
+        base_fare: float = Config.BASE_FARE,
+        rate_per_km: float = Config.RATE_PER_KM,
+        cell_size_deg: float = Config.FARE_QUOTE_CELL_SIZE_DEG,
+        max_entries: int = Config.FARE_QUOTE_CACHE_SIZE,
+        ttl_seconds: float = Config.FARE_QUOTE_TTL_SECONDS,
+        surge: Optional["SurgeEngine"] = None,
+        eta: Optional["EtaEstimator"] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Create a quote service.
+
+        Args:
+            base_fare: Flat part of every fare.
+            rate_per_km: Price per kilometre travelled.
+            cell_size_deg: Grid cell size in degrees used to quantize points.
+            max_entries: Maximum number of cached cell pairs.
+            ttl_seconds: Lifetime of a cached quote.
+            surge: Live surge engine consulted for cells without an override.
+            eta: Road distance estimator; great-circle distance is used
+                without one.
+            clock: Monotonic time source.
+        """
+        self.base_fare = base_fare
+        self.rate_per_km = rate_per_km
+        self.cell_size_deg = cell_size_deg
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.surge = surge
+        self.eta = eta
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[Tuple[Cell, Cell], Tuple[float, float]]" = (
+            OrderedDict()
+        )
+        self._table: Dict[Tuple[Cell, Cell], float] = {}
+        self._surge: Dict[Cell, float] = {}
+        self._lock = threading.Lock()
+
+    def cell(self, point: Point) -> Cell:
+        """Return the grid cell of a ``(latitude, longitude)`` point."""
+        return grid_cell(point[0], point[1], self.cell_size_deg)
+
+    def quote(self, pickup: Point, dropoff: Point) -> FareQuote:
+        """Quote a fare between two points.
+
+        Args:
+            pickup: ``(latitude, longitude)`` of the pickup.
+            dropoff: ``(latitude, longitude)`` of the dropoff.
+
+        Returns:
+            The quote, including the surge multiplier that was applied.
+        """
+        key = (self.cell(pickup), self.cell(dropoff))
+        distance = self._distance(key)
+        multiplier = self._surge.get(key[0])
+        if multiplier is None:
+            multiplier = self.surge.multiplier(*pickup) if self.surge else 1.0
+        fare = (self.base_fare + distance * self.rate_per_km) * multiplier
+        return FareQuote(round(fare, 2), distance, multiplier, key[0], key[1])
+
+    def precompute(self, routes: Iterable[Tuple[Point, Point]]) -> int:
+        """Pin distances for popular routes so they never expire or get evicted.
+
+        Returns:
+            Number of cell pairs added to the fare table.
+        """
+        added = 0
+        for pickup, dropoff in routes:
+            key = (self.cell(pickup), self.cell(dropoff))
+            if key not in self._table:
+                self._table[key] = self._cell_distance(key)
+                added += 1
+        return added
+
+    def set_surge_multiplier(self, cell: Cell, multiplier: float) -> None:
+        """Override the surge multiplier for quotes picked up in ``cell``."""
+        self._surge[cell] = multiplier
+
+    def clear_surge_multiplier(self, cell: Cell) -> None:
+        """Remove a manual override and fall back to the live surge engine."""
+        self._surge.pop(cell, None)
+
+    def clear(self) -> None:
+        """Drop every cached quote; pinned routes are kept."""
+        with self._lock:
+            self._cache.clear()
+
+    def _distance(self, key: Tuple[Cell, Cell]) -> float:
+        pinned = self._table.get(key)
+        if pinned is not None:
+            self.hits += 1
+            return pinned
+
+        now = self.clock()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        self.misses += 1
+        distance = self._cell_distance(key)
+        with self._lock:
+            self._cache[key] = (now + self.ttl_seconds, distance)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return distance
+
+    def _cell_distance(self, key: Tuple[Cell, Cell]) -> float:
+        pickup = cell_center(key[0], self.cell_size_deg)
+        dropoff = cell_center(key[1], self.cell_size_deg)
+        if self.eta is not None:
+            return self.eta.distance_km(pickup, dropoff)
+        return haversine_km(pickup[0], pickup[1], dropoff[0], dropoff[1])
+
+
+def parse_point(text: str) -> Optional[Point]:
+    """Parse ``"lat,lon"`` into a point, or return None."""
+    try:
+        values = [float(x.strip()) for x in text.split(",")]
+    except ValueError:
+        return None
+    if len(values) != 2:
+        return None
+    return values[0], values[1]
+
+
+def parse_route(message: str) -> Optional[Tuple[Point, Point]]:
+    """Parse ``"<command> lat,lon to lat,lon"`` into pickup and dropoff points.
+
+    Returns:
+        ``((pickup_lat, pickup_lon), (dropoff_lat, dropoff_lon))`` or None if
+        the message does not follow the format.
+    """
+    parts = message.lower().split(" to ")
+    if len(parts) != 2:
+        return None
+    pickup = parse_point(parts[0].strip().split(maxsplit=1)[-1])
+    dropoff = parse_point(parts[1])
+    if pickup is None or dropoff is None:
+        return None
+    return pickup, dropoff
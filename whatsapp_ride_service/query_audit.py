@@ -0,0 +1,233 @@
+"""Check that hot queries are served by indexes.
+
+Every hot ``DatabaseOps`` method, and the user and phone lookups behind
+the login, registration and webhook routes, is run against a seeded
+SQLite database while the SQL it issues is captured; each statement is
+then passed through ``EXPLAIN QUERY PLAN``. A plan step that scans a
+whole table (``SCAN rides``) rather than searching an index is reported,
+and the command exits non-zero::
+
+    python -m whatsapp_ride_service.query_audit --rides 200000
+"""
+
+import argparse
+import random
+import sys
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from .auth import UserManager
+from .database_ops import DatabaseOps
+from .models import Base, Driver, Payment, PaymentStatus, Ride, RideStatus, User
+from .phones import PhoneDirectory
+
+
+def _register_taken_email(ops: DatabaseOps) -> None:
+    # Runs the duplicate email/phone check; the email belongs to user 1
+    try:
+        UserManager(ops.session).create_user(
+            "Audit", "user1@example.com", "+16502530000", "AuditPass123!"
+        )
+    except ValueError:
+        pass
+
+
+# Each hot query, called with a DatabaseOps over the seeded data
+HOT_QUERIES: Dict[str, Callable[[DatabaseOps], object]] = {
+    "get_available_drivers": lambda ops: ops.get_available_drivers(
+        40.75, -73.95, radius_km=2
+    ),
+    "iter_drivers_in_area": lambda ops: list(
+        ops.iter_drivers_in_area(40.75, -73.95, radius_km=2, chunk_size=100)
+    ),
+    "get_user_ride_history": lambda ops: ops.get_user_ride_history(1),
+    "get_user_rides": lambda ops: ops.get_user_rides(1),
+    "get_user_ride_rows": lambda ops: ops.get_user_ride_rows(1),
+    "get_user_payments": lambda ops: ops.get_user_payments(1),
+    "get_user_payment_rows": lambda ops: ops.get_user_payment_rows(1),
+    "get_driver_earnings": lambda ops: ops.get_driver_earnings(1),
+    "get_active_rides": lambda ops: ops.get_active_rides(),
+    "get_user_stats": lambda ops: ops.get_user_stats(1),
+    "get_ride": lambda ops: ops.get_ride(1),
+    "claim_ride": lambda ops: ops.claim_ride(1, 1),
+    "update_ride_status": lambda ops: ops.update_ride_status(2, RideStatus.COMPLETED),
+    # Route and webhook lookups outside DatabaseOps
+    "authenticate_user": lambda ops: UserManager(ops.session).authenticate_user(
+        "+15559999999", "wrong"
+    ),
+    "register_user": _register_taken_email,
+    "resolve_phone": lambda ops: PhoneDirectory(lambda: ops.session).resolve(
+        "+16660000001"
+    ),
+}
+
+
+class Finding(NamedTuple):
+    """A plan step that reads a whole table."""
+
+    query: str
+    statement: str
+    detail: str
+
+
+def seed(
+    engine: Engine,
+    users: int = 20_000,
+    drivers: int = 5_000,
+    rides: int = 200_000,
+    seed_value: int = 42,
+) -> None:
+    """Fill an empty database with a city-sized synthetic dataset."""
+    rng = random.Random(seed_value)
+    start = datetime(2024, 1, 1)
+    statuses = list(RideStatus)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(User),
+            [
+                {
+                    "name": f"User {i}",
+                    "email": f"user{i}@example.com",
+                    "phone_number": f"+1555{i:07d}",
+                    "password_hash": "",
+                }
+                for i in range(1, users + 1)
+            ],
+        )
+        connection.execute(
+            insert(Driver),
+            [
+                {
+                    "name": f"Driver {i}",
+                    "phone_number": f"+1666{i:07d}",
+                    "current_latitude": 40.6 + rng.random() * 0.3,
+                    "current_longitude": -74.1 + rng.random() * 0.3,
+                    "is_available": rng.random() < 0.3,
+                }
+                for i in range(1, drivers + 1)
+            ],
+        )
+        ride_rows = []
+        payment_rows = []
+        for i in range(1, rides + 1):
+            created = start + timedelta(minutes=i)
+            user_id = rng.randint(1, users)
+            ride_rows.append(
+                {
+                    "user_id": user_id,
+                    "driver_id": rng.randint(1, drivers),
+                    "pickup_latitude": 40.7,
+                    "pickup_longitude": -74.0,
+                    "dropoff_latitude": 40.8,
+                    "dropoff_longitude": -73.9,
+                    "status": rng.choice(statuses),
+                    "created_at": created,
+                }
+            )
+            payment_rows.append(
+                {
+                    "user_id": user_id,
+                    "ride_id": i,
+                    "amount": 12.5,
+                    "status": PaymentStatus.COMPLETED,
+                    "created_at": created,
+                }
+            )
+        connection.execute(insert(Ride), ride_rows)
+        connection.execute(insert(Payment), payment_rows)
+        connection.exec_driver_sql("ANALYZE")
+
+
+def capture_statements(
+    engine: Engine, run: Callable[[DatabaseOps], object]
+) -> List[Tuple[str, tuple]]:
+    """Run a query and return the SQL statements it issued."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, tuple(parameters)))
+
+    event.listen(engine, "before_cursor_execute", record)
+    session = Session(engine)
+    try:
+        run(DatabaseOps(session))
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+        session.rollback()
+        session.close()
+    return statements
+
+
+def explain(engine: Engine, statement: str, parameters: tuple) -> List[str]:
+    """Return the ``EXPLAIN QUERY PLAN`` steps of one statement."""
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        ).all()
+    return [row[-1] for row in rows]
+
+
+def audit(
+    engine: Engine, queries: Optional[Dict[str, Callable]] = None
+) -> Tuple[Dict[str, List[Tuple[str, List[str]]]], List[Finding]]:
+    """Explain every statement issued by the hot queries.
+
+    Returns:
+        The plans per query, as ``(statement, steps)`` pairs, and the steps
+        that scan a whole table.
+    """
+    plans = {}
+    findings = []
+    for name, run in (queries or HOT_QUERIES).items():
+        plans[name] = []
+        for statement, parameters in capture_statements(engine, run):
+            steps = explain(engine, statement, parameters)
+            plans[name].append((statement, steps))
+            findings.extend(
+                Finding(name, statement, step)
+                for step in steps
+                if step.startswith("SCAN ")
+            )
+    return plans, findings
+
+
+def in_memory_engine() -> Engine:
+    """Return an engine on a private in-memory database with the schema."""
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point for the query audit."""
+    parser = argparse.ArgumentParser(description="Audit hot query plans")
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--drivers", type=int, default=5_000)
+    parser.add_argument("--rides", type=int, default=200_000)
+    args = parser.parse_args(argv)
+
+    engine = in_memory_engine()
+    seed(engine, users=args.users, drivers=args.drivers, rides=args.rides)
+    plans, findings = audit(engine)
+    for name, statements in plans.items():
+        print(f"== {name}")
+        for statement, steps in statements:
+            print("   " + " ".join(statement.split())[:100])
+            for step in steps:
+                print(f"     {step}")
+
+    if findings:
+        print(f"\n{len(findings)} full table scans:")
+        for finding in findings:
+            print(f"  {finding.query}: {finding.detail}")
+        sys.exit(1)
+    print("\nNo full table scans")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Token-bucket rate limiting for the WhatsApp webhook.
+
+Each key (a sender's phone number or a source IP) owns a bucket holding up
+to ``burst`` tokens that refills at a steady rate; a message spends one
+token and is throttled when the bucket is empty. Checking a key is O(1)
+and needs no database, so a flooding number is turned away before it can
+trigger driver searches or Stripe calls.
+
+``TokenBucketLimiter`` keeps buckets in a bounded LRU in process memory.
+With several worker processes each would grant its own burst, so
+``SQLiteTokenBucketLimiter`` keeps the buckets in a SQLite file shared by
+every worker on the host instead.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Tuple
+
+from .config import Config
+
+
+def _refill(
+    tokens: float, updated: float, now: float, rate: float, burst: float
+) -> float:
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+
+class TokenBucketLimiter:
+    """In-memory token buckets keyed by string, least recently used evicted."""
+
+    def __init__(
+        self,
+        rate_per_minute: float = Config.WEBHOOK_SENDER_RATE_PER_MINUTE,
+        burst: float = Config.WEBHOOK_SENDER_BURST,
+        max_keys: int = Config.RATE_LIMIT_MAX_KEYS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Create a limiter.
+
+        Args:
+            rate_per_minute: Tokens added to each bucket per minute.
+            burst: Bucket capacity, i.e. how many messages may arrive back
+                to back after a quiet period.
+            max_keys: Buckets kept before evicting the least recently used
+                one. An evicted key starts again with a full bucket.
+            clock: Monotonic time source, in seconds.
+        """
+        self.rate = rate_per_minute / 60.0
+        self.burst = float(burst)
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key: str, cost: float = 1.0) -> bool:
+        """Spend ``cost`` tokens from a key's bucket if it holds enough."""
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = self.burst
+            else:
+                tokens = _refill(*bucket, now, self.rate, self.burst)
+                self._buckets.move_to_end(key)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteTokenBucketLimiter:
+    """Token buckets stored in a SQLite file shared by worker processes."""
+
+    def __init__(
+        self,
+        path: str,
+        rate_per_minute: float = Config.WEBHOOK_SENDER_RATE_PER_MINUTE,
+        burst: float = Config.WEBHOOK_SENDER_BURST,
+        table: str = "buckets",
+        prune_every: int = 1000,
+        clock: Callable[[], float] = time.time,
+    ):
+        """Create a limiter, creating its table if needed.
+
+        Args:
+            path: SQLite database file. Workers limiting the same traffic
+                must use the same file and table.
+            rate_per_minute: Tokens added to each bucket per minute.
+            burst: Bucket capacity.
+            table: Table holding the buckets, so several limiters can share
+                one file.
+            prune_every: Checks between deletions of buckets that have
+                refilled completely, which keeps the table bounded.
+            clock: Wall-clock time source, in seconds; it must agree
+                across processes.
+        """
+        self.path = path
+        self.rate = rate_per_minute / 60.0
+        self.burst = float(burst)
+        self.table = table
+        self.prune_every = prune_every
+        self.clock = clock
+        self._checks = 0
+        self._local = threading.local()
+        self._connection().execute(
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def allow(self, key: str, cost: float = 1.0) -> bool:
+        """Spend ``cost`` tokens from a key's bucket if it holds enough."""
+        now = self.clock()
+        connection = self._connection()
+        # BEGIN IMMEDIATE takes the write lock, so no other worker can
+        # spend from the bucket between reading and storing it
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            bucket = connection.execute(
+                f"SELECT tokens, updated FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if bucket is None:
+                tokens = self.burst
+            else:
+                tokens = _refill(*bucket, now, self.rate, self.burst)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            connection.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, tokens, updated) "
+                "VALUES (?, ?, ?)",
+                (key, tokens, now),
+            )
+            self._checks += 1
+            if self._checks % self.prune_every == 0:
+                self._prune(connection, now)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return allowed
+
+    def _prune(self, connection, now):
+        # A bucket idle long enough to refill is the same as no bucket
+        full_after = self.burst / self.rate if self.rate else float("inf")
+        connection.execute(
+            f"DELETE FROM {self.table} WHERE updated < ?", (now - full_after,)
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+
+class WebhookThrottle:
+    """Limits webhook traffic per sender phone number and per source IP."""
+
+    def __init__(self, sender_limiter, ip_limiter):
+        """Create a throttle from two limiters exposing ``allow(key)``."""
+        self.sender_limiter = sender_limiter
+        self.ip_limiter = ip_limiter
+        self.throttled = 0
+
+    @classmethod
+    def from_config(cls, config) -> "WebhookThrottle":
+        """Build in-memory limiters, or SQLite ones if ``RATE_LIMIT_DB_PATH`` is set."""
+        senders = (config.WEBHOOK_SENDER_RATE_PER_MINUTE, config.WEBHOOK_SENDER_BURST)
+        ips = (config.WEBHOOK_IP_RATE_PER_MINUTE, config.WEBHOOK_IP_BURST)
+        if config.RATE_LIMIT_DB_PATH:
+            return cls(
+                SQLiteTokenBucketLimiter(
+                    config.RATE_LIMIT_DB_PATH, *senders, table="sender_buckets"
+                ),
+                SQLiteTokenBucketLimiter(
+                    config.RATE_LIMIT_DB_PATH, *ips, table="ip_buckets"
+                ),
+            )
+        return cls(
+            TokenBucketLimiter(*senders, max_keys=config.RATE_LIMIT_MAX_KEYS),
+            TokenBucketLimiter(*ips, max_keys=config.RATE_LIMIT_MAX_KEYS),
+        )
+
+    def allow(self, sender: str, ip: str) -> bool:
+        """Return whether a message from ``sender`` relayed by ``ip`` may proceed.
+
+        The sender is checked first, so a number that is already throttled
+        does not also drain the budget of the IP relaying everyone else.
+        """
+        allowed = self.sender_limiter.allow(sender or "") and self.ip_limiter.allow(
+            ip or ""
+        )
+        if not allowed:
+            self.throttled += 1
+        return allowed
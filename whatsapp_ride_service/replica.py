@@ -0,0 +1,244 @@
+"""Route staleness-tolerant reads to a read replica.
+
+Sessions made by ``ReplicaRouter.sessionmaker()`` send every write, flush
+and ordinary query to the primary. Inside ``stale_reads(session, ...)``
+queries go to the replica instead, but only when all of these hold:
+
+- the replica's measured lag is within ``REPLICA_MAX_LAG_SECONDS``;
+- the session has no pending or uncommitted writes of its own;
+- the user or driver the read is for has not committed a write within
+  the last ``REPLICA_MAX_LAG_SECONDS``.
+
+Because a replica inside the lag bound has applied everything older than
+the bound, the last rule gives riders and drivers read-your-writes on
+their own history while everyone else is served from the replica.
+
+Recent writes are remembered per router, that is per worker process. With
+several workers, a read handled by a different worker than the write it
+follows may still be served from the replica inside the lag bound. Keep
+``REPLICA_MAX_LAG_SECONDS`` small, or route each sender to one worker, when
+that matters.
+
+Lag is only measured on PostgreSQL standbys. For other databases pass a
+``lag_probe``; without one the replica is treated as unmeasurable and every
+read goes to the primary.
+
+Writes are attributed to users and drivers from the objects a flush
+sends. Core ``update()``/``insert()`` statements bypass the flush, so code
+issuing them names the owners it touched with ``note_writes``.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, Iterable, Iterator, Optional, Set
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker
+
+from .config import Config
+from .models import Driver, User
+
+# Seconds since the standby last replayed a transaction; NULL on a primary
+POSTGRES_LAG = text(
+    "SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())"
+)
+
+
+class ReplicaRouter:
+    """Decides per read whether the replica is fresh enough to serve it."""
+
+    def __init__(
+        self,
+        primary: Engine,
+        replica: Engine,
+        max_lag_seconds: float = Config.REPLICA_MAX_LAG_SECONDS,
+        lag_check_seconds: float = Config.REPLICA_LAG_CHECK_SECONDS,
+        lag_probe: Optional[Callable[[], Optional[float]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Create a router.
+
+        Args:
+            primary: Engine for writes and read-your-writes paths.
+            replica: Engine for reads that tolerate staleness.
+            max_lag_seconds: Staleness bound for replica reads.
+            lag_check_seconds: Minimum interval between lag measurements.
+            lag_probe: Returns the replica lag in seconds, or None when it
+                cannot be measured. Defaults to querying a PostgreSQL
+                replica; other databases must supply one.
+            clock: Monotonic time source.
+        """
+        self.primary = primary
+        self.replica = replica
+        self.max_lag_seconds = max_lag_seconds
+        self.lag_check_seconds = lag_check_seconds
+        self.lag_probe = lag_probe or self._probe_lag
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._lag: Optional[float] = None
+        self._lag_checked_at: Optional[float] = None
+        self._recent_writes: Dict[Hashable, float] = {}
+
+    def sessionmaker(self, **kwargs) -> sessionmaker:
+        """Return a session factory whose sessions route through this router."""
+        return sessionmaker(class_=RoutingSession, info={"router": self}, **kwargs)
+
+    def lag(self) -> Optional[float]:
+        """Return the replica lag, measured at most every lag_check_seconds."""
+        now = self.clock()
+        with self._lock:
+            if (
+                self._lag_checked_at is not None
+                and now - self._lag_checked_at < self.lag_check_seconds
+            ):
+                return self._lag
+            self._lag_checked_at = now
+        lag = self.lag_probe()
+        with self._lock:
+            self._lag = lag
+        return lag
+
+    def replica_fresh(self) -> bool:
+        """Return whether the replica is within the staleness bound."""
+        lag = self.lag()
+        return lag is not None and lag <= self.max_lag_seconds
+
+    def record_writes(self, owners: Set[Hashable]) -> None:
+        """Note that rows belonging to these owners were just committed."""
+        now = self.clock()
+        with self._lock:
+            for owner in owners:
+                self._recent_writes[owner] = now
+            if len(self._recent_writes) > 10000:
+                self._forget_before(now - self.max_lag_seconds)
+
+    def wrote_recently(self, owner: Hashable) -> bool:
+        """Return whether the owner committed a write inside the bound."""
+        with self._lock:
+            written_at = self._recent_writes.get(owner)
+        return (
+            written_at is not None and self.clock() - written_at <= self.max_lag_seconds
+        )
+
+    def read_bind(self, *owners: Hashable) -> Engine:
+        """Pick the engine for a staleness-tolerant read on behalf of owners."""
+        if any(self.wrote_recently(owner) for owner in owners):
+            return self.primary
+        return self.replica if self.replica_fresh() else self.primary
+
+    def _forget_before(self, cutoff: float) -> None:
+        self._recent_writes = {
+            owner: written_at
+            for owner, written_at in self._recent_writes.items()
+            if written_at >= cutoff
+        }
+
+    def _probe_lag(self) -> Optional[float]:
+        if self.replica.dialect.name != "postgresql":
+            return None
+        try:
+            with self.replica.connect() as connection:
+                lag = connection.execute(POSTGRES_LAG).scalar()
+        except DBAPIError:
+            return None
+        return max(float(lag or 0.0), 0.0)
+
+
+class RoutingSession(Session):
+    """Session that sends reads inside ``stale_reads`` to the replica."""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        """Return the replica only for plain reads marked as stale-tolerant."""
+        router = self.info.get("router")
+        if router is None:
+            return super().get_bind(mapper, clause=clause, **kw)
+        replica = self.info.get("read_bind")
+        if (
+            replica is None
+            or self._flushing
+            or getattr(clause, "is_dml", False)
+            or self.info.get("written")
+        ):
+            return router.primary
+        return replica
+
+
+def _owners(instance) -> Set[Hashable]:
+    owners = set()
+    if isinstance(instance, User):
+        owners.add(("user", instance.id))
+    elif isinstance(instance, Driver):
+        owners.add(("driver", instance.id))
+    for attribute, kind in (("user_id", "user"), ("driver_id", "driver")):
+        owner_id = getattr(instance, attribute, None)
+        if owner_id is not None:
+            owners.add((kind, owner_id))
+    return owners
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _collect_writes(session, flush_context):
+    written = session.info.setdefault("written", set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        written |= _owners(instance)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _publish_writes(session):
+    written = session.info.pop("written", None)
+    if written:
+        session.info["router"].record_writes(written)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _discard_writes(session):
+    session.info.pop("written", None)
+
+
+def note_writes(
+    session, user_ids: Iterable[int] = (), driver_ids: Iterable[int] = ()
+) -> None:
+    """Attribute rows changed by Core statements in ``session`` to their owners.
+
+    They are published when the session commits, like flushed changes.
+
+    Args:
+        session: Any session; plain sessions ignore the call.
+        user_ids: Users whose rows the statements changed.
+        driver_ids: Drivers whose rows the statements changed.
+    """
+    if session.info.get("router") is None:
+        return
+    written = session.info.setdefault("written", set())
+    written.update(("user", user_id) for user_id in user_ids)
+    written.update(("driver", driver_id) for driver_id in driver_ids)
+
+
+@contextmanager
+def stale_reads(
+    session, user_id: Optional[int] = None, driver_id: Optional[int] = None
+) -> Iterator[None]:
+    """Serve the enclosed queries from the replica when it is safe to.
+
+    Args:
+        session: Any session; plain sessions simply keep using their bind.
+        user_id: User whose recent writes must stay visible.
+        driver_id: Driver whose recent writes must stay visible.
+    """
+    router = session.info.get("router")
+    if router is None or session.new or session.dirty or session.deleted:
+        yield
+        return
+    owners = []
+    if user_id is not None:
+        owners.append(("user", user_id))
+    if driver_id is not None:
+        owners.append(("driver", driver_id))
+    session.info["read_bind"] = router.read_bind(*owners)
+    try:
+        yield
+    finally:
+        session.info.pop("read_bind", None)
@@ -0,0 +1,197 @@
+"""Per-user cache of serialized read-only responses.
+
+Profile, ride and payment listings are polled far more often than they
+change. ``ResponseCache`` keeps each user's rendered JSON bodies with a
+strong ETag. The ``cached_per_user`` decorator reads the user id from the
+JWT before ``token_required`` runs, so a cached body, or a 304 for a
+matching ``If-None-Match``, is answered without a database round trip.
+
+Entries are dropped when ``ride_status_changed``, ``payment_status_changed``
+or ``user_profile_changed`` fires for their user. Those signals are
+in-process, so with several worker processes (or writes made outside the
+app) an entry can outlive a change by up to ``RESPONSE_CACHE_TTL_SECONDS``.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, NamedTuple, Optional
+
+import jwt
+from flask import current_app, request
+
+from . import signals
+from .auth import get_token_from_header
+from .config import Config
+
+
+class CachedResponse(NamedTuple):
+    """A rendered response body and its ETag."""
+
+    body: bytes
+    etag: str
+    expires_at: float
+
+
+class _UserEntry:
+    __slots__ = ("generation", "views")
+
+    def __init__(self):
+        self.generation = 0
+        self.views: Dict[str, CachedResponse] = {}
+
+
+class ResponseCache:
+    """LRU of users, each holding the rendered bodies of their views."""
+
+    def __init__(
+        self,
+        max_users: int = Config.RESPONSE_CACHE_USERS,
+        ttl_seconds: float = Config.RESPONSE_CACHE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Create a cache.
+
+        Args:
+            max_users: Users whose responses are kept before evicting the
+                least recently used one.
+            ttl_seconds: Lifetime of a cached body.
+            clock: Monotonic time source.
+        """
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._users: "OrderedDict[int, _UserEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, view: str) -> Optional[CachedResponse]:
+        """Return the live cached response for a user's view, if any."""
+        with self._lock:
+            entry = self._users.get(user_id)
+            cached = entry.views.get(view) if entry else None
+            if cached is None or cached.expires_at <= self.clock():
+                self.misses += 1
+                return None
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return cached
+
+    def generation(self, user_id: int) -> int:
+        """Return a token to pass to ``put`` for a response about to be built."""
+        with self._lock:
+            entry = self._users.get(user_id)
+            return entry.generation if entry else 0
+
+    def put(
+        self, user_id: int, view: str, body: bytes, generation: int
+    ) -> CachedResponse:
+        """Store a rendered body and return it with its ETag.
+
+        The body is not cached if the user was invalidated after
+        ``generation`` was taken, since it may predate the change.
+        """
+        cached = CachedResponse(
+            body,
+            hashlib.blake2b(body, digest_size=16).hexdigest(),
+            self.clock() + self.ttl_seconds,
+        )
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                if generation:
+                    return cached
+                entry = self._users[user_id] = _UserEntry()
+            elif entry.generation != generation:
+                return cached
+            entry.views[view] = cached
+            self._users.move_to_end(user_id)
+            self._evict()
+        return cached
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop every cached response of a user."""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                # Remembered so a response being built right now is not cached
+                entry = self._users[user_id] = _UserEntry()
+                self._evict()
+            entry.generation += 1
+            entry.views.clear()
+
+    def clear(self) -> None:
+        """Drop every cached response."""
+        with self._lock:
+            self._users.clear()
+
+    def _evict(self) -> None:
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def on_user_changed(self, user_id: int, **kwargs) -> None:
+        """Signal receiver for changes to a user's rides, payments or profile."""
+        self.invalidate(user_id)
+
+    def connect(self) -> None:
+        """Subscribe this cache to the domain signals."""
+        for signal in (
+            signals.ride_status_changed,
+            signals.payment_status_changed,
+            signals.user_profile_changed,
+        ):
+            signal.connect(self.on_user_changed)
+
+
+def _token_user_id() -> Optional[int]:
+    token = get_token_from_header()
+    if not token:
+        return None
+    try:
+        data = jwt.decode(
+            token, current_app.config["JWT_SECRET_KEY"], algorithms=["HS256"]
+        )
+    except jwt.InvalidTokenError:
+        return None
+    return data.get("user_id")
+
+
+def _respond(cached: CachedResponse):
+    response = current_app.response_class(cached.body, mimetype="application/json")
+    response.set_etag(cached.etag)
+    # Clients may keep the body but must revalidate it on every use
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
+
+
+def cached_per_user(view: str):
+    """Cache a ``token_required`` GET endpoint's 200 responses per user.
+
+    Apply it above ``token_required``. Requests without a valid token are
+    passed through untouched so ``token_required`` can reject them.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            cache = current_app.response_cache
+            user_id = _token_user_id()
+            if user_id is None:
+                return f(*args, **kwargs)
+
+            cached = cache.get(user_id, view)
+            if cached is not None:
+                return _respond(cached)
+
+            generation = cache.generation(user_id)
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            return _respond(cache.put(user_id, view, response.get_data(), generation))
+
+        return decorated
+
+    return decorator
@@ -1,2 +1,2 @@
 """Route blueprints"""
-from . import auth_routes, user_routes, ride_routes
+from . import admin_routes, auth_routes, user_routes, ride_routes
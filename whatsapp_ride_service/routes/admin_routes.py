@@ -0,0 +1,82 @@
+"""Admin routes for the WhatsApp Ride Service application."""
+
+import hmac
+from datetime import datetime
+from functools import wraps
+
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    jsonify,
+    request,
+    stream_with_context,
+)
+
+from ..export import FORMATS, Counter, encode, iter_rows
+from ..models import PaymentStatus, RideStatus
+
+admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
+
+
+def admin_key_required(f):
+    """Require the ``X-Admin-Key`` header to match ``ADMIN_API_KEY``."""
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        expected = current_app.config.get("ADMIN_API_KEY")
+        provided = request.headers.get("X-Admin-Key", "")
+        if not expected or not hmac.compare_digest(provided, expected):
+            return jsonify({"error": "Forbidden"}), 403
+        return f(*args, **kwargs)
+
+    return decorated
+
+
+@admin_bp.route("/exports/rides", methods=["GET"])
+@admin_key_required
+def export_rides():
+    """Stream rides and payments created in a date range as CSV or JSONL."""
+    try:
+        start = datetime.fromisoformat(request.args["start"])
+        end = datetime.fromisoformat(request.args["end"])
+        ride_status = request.args.get("status")
+        ride_status = RideStatus(ride_status) if ride_status else None
+        payment_status = request.args.get("payment_status")
+        payment_status = PaymentStatus(payment_status) if payment_status else None
+    except KeyError as e:
+        return jsonify({"error": f"Missing required field: {e.args[0]}"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    fmt = request.args.get("format", "csv")
+    if fmt not in FORMATS:
+        return jsonify({"error": f"Format must be one of {', '.join(FORMATS)}"}), 400
+
+    counter = Counter(
+        iter_rows(
+            current_app.db_session,
+            start,
+            end,
+            ride_status=ride_status,
+            payment_status=payment_status,
+            archive_session=current_app.archive_session,
+            batch_size=current_app.config["EXPORT_BATCH_SIZE"],
+        )
+    )
+    logger = current_app.logger
+
+    def stream():
+        yield from encode(counter, fmt)
+        logger.info(
+            "Exported %d rides at %.0f rows/s", counter.count, counter.rows_per_second
+        )
+
+    filename = f"rides-{start.date()}-{end.date()}." + (
+        "csv" if fmt == "csv" else "jsonl.gz"
+    )
+    return Response(
+        stream_with_context(stream()),
+        mimetype="text/csv" if fmt == "csv" else "application/gzip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
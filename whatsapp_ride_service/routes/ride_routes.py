@@ -1,11 +1,21 @@
 """Ride routes for the WhatsApp Ride Service application."""
 
-from flask import Blueprint, current_app, jsonify, request
+import json
+
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    jsonify,
+    request,
+    stream_with_context,
+)
 from sqlalchemy.exc import IntegrityError
 
 from ..auth import token_required
 from ..database_ops import DatabaseOps
-from ..models import Ride, Driver
+from ..models import Ride, Driver, RideStatus
+from ..signals import ride_requested, ride_status_changed
 from datetime import datetime
 
 ride_bp = Blueprint("ride", __name__, url_prefix="/rides")
@@ -42,6 +52,14 @@ def create_ride(current_user):
         )
         current_app.db_session.add(ride)
         current_app.db_session.commit()
+        ride_requested.send(
+            current_user.id,
+            latitude=ride.pickup_latitude,
+            longitude=ride.pickup_longitude,
+        )
+        ride_status_changed.send(
+            current_user.id, ride_id=ride.id, status=RideStatus.REQUESTED
+        )
 
         return (
             jsonify(
@@ -64,10 +82,117 @@ def create_ride(current_user):
         return jsonify({"error": "Failed to create ride"}), 500
 
 
+@ride_bp.route("/quote", methods=["GET"])
+@token_required
+def quote_ride(current_user):
+    """Quote a fare without creating a ride or a payment."""
+    fields = [
+        "pickup_latitude",
+        "pickup_longitude",
+        "dropoff_latitude",
+        "dropoff_longitude",
+    ]
+
+    try:
+        values = [float(request.args[field]) for field in fields]
+    except KeyError as e:
+        return jsonify({"error": f"Missing required field: {e.args[0]}"}), 400
+    except ValueError:
+        return jsonify({"error": "Coordinates must be numbers"}), 400
+
+    quote = current_app.fare_quotes.quote(
+        (values[0], values[1]), (values[2], values[3])
+    )
+
+    return (
+        jsonify(
+            {
+                "fare": quote.fare,
+                "distance_km": round(quote.distance_km, 3),
+                "surge_multiplier": quote.surge_multiplier,
+                "currency": current_app.config["CURRENCY"],
+            }
+        ),
+        200,
+    )
+
+
+def _tracked_ride(current_user, ride_id):
+    """Return the hub binding of a ride the current user may track."""
+    binding = current_app.location_hub.ride_binding(ride_id)
+    if not binding or binding.user_id != current_user.id:
+        return None
+    return binding
+
+
+@ride_bp.route("/<int:ride_id>/location", methods=["GET"])
+@token_required
+def poll_ride_location(current_user, ride_id):
+    """Long-poll the driver's position for an active ride."""
+    hub = current_app.location_hub
+    binding = _tracked_ride(current_user, ride_id)
+    if not binding:
+        return jsonify({"error": "Ride is not being tracked"}), 404
+
+    since = request.args.get("since", type=float)
+    latest = hub.latest(binding.driver_id)
+    if latest and (since is None or latest.timestamp > since):
+        return jsonify(latest.to_dict()), 200
+
+    subscription = hub.subscribe(ride_id=ride_id)
+    try:
+        events = subscription.get(current_app.config["TRACKING_POLL_TIMEOUT_SECONDS"])
+    finally:
+        subscription.close()
+
+    if not events:
+        return "", 204
+    return jsonify(events[-1].to_dict()), 200
+
+
+@ride_bp.route("/<int:ride_id>/track", methods=["GET"])
+@token_required
+def track_ride(current_user, ride_id):
+    """Stream the driver's position for an active ride as Server-Sent Events."""
+    if not _tracked_ride(current_user, ride_id):
+        return jsonify({"error": "Ride is not being tracked"}), 404
+
+    subscription = current_app.location_hub.subscribe(ride_id=ride_id)
+    keepalive = current_app.config["TRACKING_KEEPALIVE_SECONDS"]
+
+    def stream():
+        try:
+            while not subscription.closed:
+                events = subscription.get(keepalive)
+                if not events:
+                    yield ": keepalive\n\n"
+                for event in events:
+                    yield f"data: {json.dumps(event.to_dict())}\n\n"
+            yield "event: end\ndata: {}\n\n"
+        finally:
+            subscription.close()
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+def _driver_id(current_user):
+    """Return the driver id registered to the current user's phone, if any."""
+    identity = current_app.phone_directory.resolve(current_user.phone_number)
+    return identity.driver_id if identity else None
+
+
 @ride_bp.route("/<int:ride_id>/accept", methods=["POST"])
 @token_required
 def accept_ride(current_user, ride_id):
     """Accept a ride request."""
+    driver_id = _driver_id(current_user)
+    if driver_id is None:
+        return jsonify({"error": "Not authorized"}), 403
+
     try:
         db_ops = DatabaseOps(current_app.db_session)
         ride = db_ops.get_ride(ride_id)
@@ -75,18 +200,12 @@ def accept_ride(current_user, ride_id):
         if not ride:
             return jsonify({"error": "Ride not found"}), 404
 
-        if ride.status != "pending":
+        if not db_ops.claim_ride(ride_id, driver_id):
             return jsonify({"error": "Ride is not available"}), 400
 
-        updated_ride = db_ops.update_ride_status(ride_id, "accepted", current_user.id)
-
         return (
             jsonify(
-                {
-                    "id": updated_ride.id,
-                    "status": updated_ride.status,
-                    "driver_id": updated_ride.driver_id,
-                }
+                {"id": ride_id, "status": RideStatus.ACCEPTED, "driver_id": driver_id}
             ),
             200,
         )
@@ -106,13 +225,14 @@ def complete_ride(current_user, ride_id):
         if not ride:
             return jsonify({"error": "Ride not found"}), 404
 
-        if ride.driver_id != current_user.id:
+        driver_id = _driver_id(current_user)
+        if driver_id is None or ride.driver_id != driver_id:
             return jsonify({"error": "Not authorized"}), 403
 
-        if ride.status != "accepted":
+        if ride.status not in (RideStatus.ACCEPTED, RideStatus.IN_PROGRESS):
             return jsonify({"error": "Ride cannot be completed"}), 400
 
-        updated_ride = db_ops.update_ride_status(ride_id, "completed")
+        updated_ride = db_ops.update_ride_status(ride_id, RideStatus.COMPLETED)
 
         return jsonify({"id": updated_ride.id, "status": updated_ride.status}), 200
 
@@ -131,13 +251,16 @@ def cancel_ride(current_user, ride_id):
         if not ride:
             return jsonify({"error": "Ride not found"}), 404
 
-        if ride.user_id != current_user.id and ride.driver_id != current_user.id:
+        is_driver = ride.driver_id is not None and ride.driver_id == _driver_id(
+            current_user
+        )
+        if ride.user_id != current_user.id and not is_driver:
             return jsonify({"error": "Not authorized"}), 403
 
-        if ride.status not in ["pending", "accepted"]:
+        if ride.status not in (RideStatus.REQUESTED, RideStatus.ACCEPTED):
             return jsonify({"error": "Ride cannot be cancelled"}), 400
 
-        updated_ride = db_ops.update_ride_status(ride_id, "cancelled")
+        updated_ride = db_ops.update_ride_status(ride_id, RideStatus.CANCELLED)
 
         return jsonify({"id": updated_ride.id, "status": updated_ride.status}), 200
 
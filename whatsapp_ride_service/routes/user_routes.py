@@ -4,6 +4,9 @@ from flask import Blueprint, current_app, jsonify, request
 from sqlalchemy.exc import IntegrityError
 
 from ..auth import UserManager, token_required
+from ..response_cache import cached_per_user
+from ..serializers import PAYMENT, RIDE, USER, json_response
+from ..signals import user_profile_changed
 
 user_bp = Blueprint("user", __name__, url_prefix="/user")
 
@@ -88,6 +91,7 @@ def login():
 
 
 @user_bp.route("/profile", methods=["GET"])
+@cached_per_user("profile")
 @token_required
 def get_profile(current_user):
     """Get the current user's profile."""
@@ -95,17 +99,7 @@ def get_profile(current_user):
         return jsonify({"error": "User not found"}), 404
 
     try:
-        return (
-            jsonify(
-                {
-                    "id": current_user.id,
-                    "name": current_user.name,
-                    "email": current_user.email,
-                    "phone_number": current_user.phone_number,
-                }
-            ),
-            200,
-        )
+        return json_response(USER.from_object(current_user))
 
     except Exception as e:
         return jsonify({"error": "Failed to get user profile"}), 500
@@ -125,6 +119,7 @@ def update_profile(current_user):
             email=data.get("email"),
             phone_number=data.get("phone_number"),
         )
+        user_profile_changed.send(user.id)
 
         return (
             jsonify(
@@ -149,6 +144,7 @@ def delete_profile(current_user):
     try:
         user_manager = UserManager(current_app.db_session)
         user_manager.delete_user(current_user.id)
+        user_profile_changed.send(current_user.id)
         return jsonify({"message": "User deleted successfully"}), 200
 
     except Exception as e:
@@ -176,65 +172,32 @@ def change_password(current_user):
 
 
 @user_bp.route("/rides", methods=["GET"])
+@cached_per_user("rides")
 @token_required
 def get_user_rides(current_user):
     """Get all rides for the current user."""
     from ..database_ops import DatabaseOps
 
     try:
-        db_ops = DatabaseOps(current_app.db_session)
-        rides = db_ops.get_user_rides(current_user.id)
-
-        return (
-            jsonify(
-                {
-                    "rides": [
-                        {
-                            "id": ride.id,
-                            "pickup_location": ride.pickup_location,
-                            "dropoff_location": ride.dropoff_location,
-                            "status": ride.status,
-                            "driver_id": ride.driver_id,
-                            "created_at": str(ride.created_at),
-                        }
-                        for ride in rides
-                    ]
-                }
-            ),
-            200,
-        )
+        db_ops = DatabaseOps(current_app.db_session, current_app.archive_session)
+        rides = db_ops.get_user_ride_rows(current_user.id)
+        return json_response({"rides": RIDE.many(rides)})
 
     except Exception as e:
         return jsonify({"error": "Failed to get user rides"}), 500
 
 
 @user_bp.route("/payments", methods=["GET"])
+@cached_per_user("payments")
 @token_required
 def get_user_payments(current_user):
     """Get all payments for the current user."""
     from ..database_ops import DatabaseOps
 
     try:
-        db_ops = DatabaseOps(current_app.db_session)
-        payments = db_ops.get_user_payments(current_user.id)
-
-        return (
-            jsonify(
-                {
-                    "payments": [
-                        {
-                            "id": payment.id,
-                            "ride_id": payment.ride_id,
-                            "amount": payment.amount,
-                            "status": payment.status,
-                            "created_at": str(payment.created_at),
-                        }
-                        for payment in payments
-                    ]
-                }
-            ),
-            200,
-        )
+        db_ops = DatabaseOps(current_app.db_session, current_app.archive_session)
+        payments = db_ops.get_user_payment_rows(current_user.id)
+        return json_response({"payments": PAYMENT.many(payments)})
 
     except Exception as e:
         return jsonify({"error": "Failed to get user payments"}), 500
@@ -0,0 +1,516 @@
+"""Dispatch shards partitioned by geographic region.
+
+The map is cut into square regions and every region is owned by exactly
+one shard process. A shard keeps the available drivers of its regions in
+memory, indexed by grid cell, and answers match queries from that index.
+Each shard serves all its connections from a single thread, so its state
+needs no locks and shards scale out across cores or machines.
+
+Web workers talk to shards through ``ShardRouter`` over
+``multiprocessing.connection`` sockets. Driver updates go to the shard
+owning the driver's region; match queries go to every shard whose regions
+overlap the search radius, and their shortlists are merged.
+
+Run one shard per address listed in ``DISPATCH_SHARDS``::
+
+    python -m whatsapp_ride_service.sharding serve --index 0
+
+``multiprocessing.connection`` unpickles what it receives, so anyone who
+can reach a shard port with the key can run code in the shard. Shards and
+routers refuse to start without a ``DISPATCH_SHARD_AUTHKEY`` of at least
+``MIN_AUTHKEY_BYTES``, and shard ports belong on a private network.
+"""
+
+import argparse
+import logging
+import queue
+import threading
+from multiprocessing import AuthenticationError, Process
+from multiprocessing.connection import Client, Connection, Listener, wait
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import signals
+from .config import Config
+from .dispatch import Candidate, rank_drivers
+from .geo import bounding_box, grid_cell
+
+logger = logging.getLogger(__name__)
+
+Address = Tuple[str, int]
+
+# Cell size of a shard's in-memory spatial index
+INDEX_CELL_SIZE_DEG = 0.02
+
+# Shortest shared key accepted for shard connections
+MIN_AUTHKEY_BYTES = 16
+
+
+class ShardDriver(NamedTuple):
+    """In-memory driver record; attribute names match the ``Driver`` model."""
+
+    id: int
+    phone_number: str
+    current_latitude: float
+    current_longitude: float
+
+
+class RegionPartitioner:
+    """Map coordinates to regions and regions to shard indexes."""
+
+    def __init__(self, shard_count: int, region_size_deg: float):
+        """Create a partitioner for ``shard_count`` shards."""
+        self.shard_count = shard_count
+        self.region_size_deg = region_size_deg
+
+    def region(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        """Return the region containing a point."""
+        return grid_cell(latitude, longitude, self.region_size_deg)
+
+    def shard_for_region(self, region: Tuple[int, int]) -> int:
+        """Return the shard owning a region.
+
+        Uses integer arithmetic rather than ``hash`` so every process and
+        node agrees on the assignment.
+        """
+        return ((region[0] * 73856093) ^ (region[1] * 19349663)) % self.shard_count
+
+    def shard_for(self, latitude: float, longitude: float) -> int:
+        """Return the shard owning the region containing a point."""
+        return self.shard_for_region(self.region(latitude, longitude))
+
+    def shards_within(
+        self, latitude: float, longitude: float, radius_km: float
+    ) -> Set[int]:
+        """Return every shard owning a region within ``radius_km`` of a point."""
+        min_lat, max_lat, min_lon, max_lon = bounding_box(
+            latitude, longitude, radius_km
+        )
+        low = self.region(min_lat, min_lon)
+        high = self.region(max_lat, max_lon)
+        return {
+            self.shard_for_region((row, col))
+            for row in range(low[0], high[0] + 1)
+            for col in range(low[1], high[1] + 1)
+        }
+
+
+class DispatchShard:
+    """Driver state and matching for the regions owned by one shard."""
+
+    def __init__(self, eta=None):
+        """Create an empty shard; ``eta`` re-ranks matches by travel time."""
+        self.eta = eta
+        self.drivers: Dict[int, ShardDriver] = {}
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+
+    def update_driver(
+        self, driver_id: int, phone_number: str, latitude: float, longitude: float
+    ) -> None:
+        """Insert or move an available driver."""
+        self.remove_driver(driver_id)
+        self.drivers[driver_id] = ShardDriver(
+            driver_id, phone_number, latitude, longitude
+        )
+        cell = grid_cell(latitude, longitude, INDEX_CELL_SIZE_DEG)
+        self._cells.setdefault(cell, set()).add(driver_id)
+
+    def remove_driver(self, driver_id: int) -> None:
+        """Forget a driver, e.g. when it goes offline or is assigned a ride."""
+        driver = self.drivers.pop(driver_id, None)
+        if driver is None:
+            return
+        cell = grid_cell(
+            driver.current_latitude, driver.current_longitude, INDEX_CELL_SIZE_DEG
+        )
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(driver_id)
+            if not members:
+                del self._cells[cell]
+
+    def match(
+        self, latitude: float, longitude: float, limit: int, radius_km: float
+    ) -> List[Candidate]:
+        """Return ranked candidates near a pickup from the in-memory index."""
+        min_lat, max_lat, min_lon, max_lon = bounding_box(
+            latitude, longitude, radius_km
+        )
+        low = grid_cell(min_lat, min_lon, INDEX_CELL_SIZE_DEG)
+        high = grid_cell(max_lat, max_lon, INDEX_CELL_SIZE_DEG)
+        nearby = [
+            self.drivers[driver_id]
+            for row in range(low[0], high[0] + 1)
+            for col in range(low[1], high[1] + 1)
+            for driver_id in self._cells.get((row, col), ())
+        ]
+        return rank_drivers(
+            latitude,
+            longitude,
+            nearby,
+            limit=limit,
+            max_radius_km=radius_km,
+            eta=self.eta,
+        )
+
+    def handle(self, message: tuple):
+        """Apply one request message and return its reply."""
+        command = message[0]
+        if command == "update":
+            self.update_driver(*message[1:])
+        elif command == "remove":
+            self.remove_driver(message[1])
+        elif command == "match":
+            return self.match(*message[1:])
+        elif command == "count":
+            return len(self.drivers)
+        else:
+            raise ValueError(f"Unknown shard command: {command}")
+        return None
+
+
+def serve(
+    address: Address,
+    authkey: bytes,
+    shard: Optional[DispatchShard] = None,
+    ready: Optional[threading.Event] = None,
+) -> None:
+    """Serve a shard on ``address`` until a ``("stop",)`` message arrives.
+
+    A helper thread only accepts connections; every request is handled on
+    the calling thread, so the shard's state is never shared between threads.
+    """
+    check_authkey(authkey)
+    shard = shard or DispatchShard()
+    accepted: "queue.Queue[Connection]" = queue.Queue()
+    listener = Listener(address, authkey=authkey)
+
+    def accept_loop():
+        while True:
+            try:
+                accepted.put(listener.accept())
+            except AuthenticationError:
+                continue
+            except OSError:
+                return
+
+    threading.Thread(target=accept_loop, name="shard-accept", daemon=True).start()
+    if ready is not None:
+        ready.set()
+
+    connections: List[Connection] = []
+    try:
+        while True:
+            if not connections:
+                try:
+                    connections.append(accepted.get(timeout=0.05))
+                except queue.Empty:
+                    continue
+            while not accepted.empty():
+                connections.append(accepted.get_nowait())
+            for connection in wait(connections, timeout=0.05):
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    connections.remove(connection)
+                    continue
+                if message[0] == "stop":
+                    connection.send(None)
+                    return
+                try:
+                    connection.send(shard.handle(message))
+                except Exception as e:
+                    connection.send(e)
+    finally:
+        listener.close()
+        for connection in connections:
+            connection.close()
+
+
+class ShardRouter:
+    """Route driver updates and match queries to the owning shards."""
+
+    def __init__(
+        self,
+        addresses: Sequence[Address],
+        authkey: bytes,
+        region_size_deg: float = Config.DISPATCH_REGION_SIZE_DEG,
+        session_factory: Optional[Callable[[], Session]] = None,
+    ):
+        """Create a router; connections are opened lazily.
+
+        Args:
+            addresses: Shard addresses, in shard index order.
+            authkey: Key shared with the shards.
+            region_size_deg: Region size the shards were partitioned with.
+            session_factory: Returns a new database session, used to place
+                drivers that become available again. Without it they rejoin
+                a shard with their next location update.
+        """
+        check_authkey(authkey)
+        self.addresses = list(addresses)
+        self.authkey = authkey
+        self.session_factory = session_factory
+        self.partitioner = RegionPartitioner(len(self.addresses), region_size_deg)
+        self._connections: Dict[int, Connection] = {}
+        self._locks = [threading.Lock() for _ in self.addresses]
+        self._driver_shards: Dict[int, int] = {}
+
+    @classmethod
+    def from_config(
+        cls, config, session_factory: Optional[Callable[[], Session]] = None
+    ) -> Optional["ShardRouter"]:
+        """Build a router from ``DISPATCH_SHARDS``, or None if it is unset."""
+        if not config.DISPATCH_SHARDS:
+            return None
+        return cls(
+            parse_addresses(config.DISPATCH_SHARDS),
+            authkey_from_config(config),
+            config.DISPATCH_REGION_SIZE_DEG,
+            session_factory,
+        )
+
+    def request(self, shard: int, message: tuple):
+        """Send a message to one shard and wait for its reply.
+
+        A connection broken by a shard restart is replaced and the message
+        sent once more; every shard command is safe to repeat.
+        """
+        with self._locks[shard]:
+            for attempt in range(2):
+                try:
+                    connection = self._connections.get(shard)
+                    if connection is None:
+                        connection = Client(self.addresses[shard], authkey=self.authkey)
+                        self._connections[shard] = connection
+                    connection.send(message)
+                    reply = connection.recv()
+                    break
+                except (EOFError, OSError):
+                    self._drop(shard)
+                    if attempt:
+                        raise
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def update_driver(
+        self,
+        driver_id: int,
+        phone_number: str,
+        latitude: Optional[float],
+        longitude: Optional[float],
+        available: bool = True,
+    ) -> None:
+        """Move a driver to the shard owning its current region."""
+        if not available or latitude is None or longitude is None:
+            self.remove_driver(driver_id)
+            return
+        shard = self.partitioner.shard_for(latitude, longitude)
+        previous = self._driver_shards.get(driver_id)
+        if previous != shard:
+            self.remove_driver(driver_id)
+        self.request(shard, ("update", driver_id, phone_number, latitude, longitude))
+        self._driver_shards[driver_id] = shard
+
+    def remove_driver(self, driver_id: int) -> None:
+        """Remove a driver from whichever shard holds it.
+
+        Every shard is tried even if one fails; the first error is raised
+        afterwards.
+        """
+        previous = self._driver_shards.pop(driver_id, None)
+        # Another web worker may have placed the driver, so ask everyone
+        shards = [previous] if previous is not None else range(len(self.addresses))
+        error = None
+        for shard in shards:
+            try:
+                self.request(shard, ("remove", driver_id))
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    def match(
+        self,
+        latitude: float,
+        longitude: float,
+        limit: int = Config.DISPATCH_MAX_CANDIDATES,
+        radius_km: float = Config.MAX_SEARCH_RADIUS_KM,
+    ) -> List[Candidate]:
+        """Return ranked candidates merged from every shard near the pickup."""
+        candidates: List[Candidate] = []
+        for shard in self.partitioner.shards_within(latitude, longitude, radius_km):
+            candidates.extend(
+                self.request(shard, ("match", latitude, longitude, limit, radius_km))
+            )
+        if any(c.eta_seconds is not None for c in candidates):
+            candidates.sort(key=lambda c: c.eta_seconds)
+        else:
+            candidates.sort(key=lambda c: c.distance_km)
+        # A driver who just crossed into another shard's region may still be
+        # listed by the old shard; keep the best entry
+        unique: Dict[int, Candidate] = {}
+        for candidate in candidates:
+            unique.setdefault(candidate.driver_id, candidate)
+        return list(unique.values())[:limit]
+
+    def stop_all(self) -> None:
+        """Ask every shard to shut down."""
+        for shard in range(len(self.addresses)):
+            self.request(shard, ("stop",))
+        self.close()
+
+    def close(self) -> None:
+        """Close open connections."""
+        for shard in list(self._connections):
+            self._drop(shard)
+
+    # The receivers run after the sender committed its change, so a shard
+    # outage is logged instead of failing the request; the driver is placed
+    # again with their next location update
+
+    def on_driver_location(self, driver, **kwargs) -> None:
+        """Receiver for ``signals.driver_location_updated``."""
+        try:
+            self.update_driver(
+                driver.id,
+                driver.phone_number,
+                kwargs.get("latitude", driver.current_latitude),
+                kwargs.get("longitude", driver.current_longitude),
+                bool(driver.is_available),
+            )
+        except Exception:
+            logger.exception("Could not update the shard of driver %s", driver.id)
+
+    def on_driver_availability(self, driver_id, **kwargs) -> None:
+        """Receiver for ``signals.driver_availability_changed``."""
+        try:
+            self._sync_availability(driver_id, kwargs["available"])
+        except Exception:
+            logger.exception("Could not update the shard of driver %s", driver_id)
+
+    def _sync_availability(self, driver_id: int, available: bool) -> None:
+        if not available:
+            self.remove_driver(driver_id)
+        elif self.session_factory is not None:
+            # e.g. a finished ride; the driver may not move for a while
+            from .models import Driver
+
+            session = self.session_factory()
+            try:
+                driver = session.get(Driver, driver_id)
+            finally:
+                session.close()
+            if driver is not None:
+                self.update_driver(
+                    driver.id,
+                    driver.phone_number,
+                    driver.current_latitude,
+                    driver.current_longitude,
+                    bool(driver.is_available),
+                )
+
+    def connect(self) -> None:
+        """Subscribe this router to the domain signals."""
+        signals.driver_location_updated.connect(self.on_driver_location)
+        signals.driver_availability_changed.connect(self.on_driver_availability)
+
+    def _drop(self, shard: int) -> None:
+        connection = self._connections.pop(shard, None)
+        if connection is not None:
+            connection.close()
+
+
+def check_authkey(authkey: bytes) -> None:
+    """Raise ``ValueError`` unless ``authkey`` is long enough to be a secret."""
+    if not authkey or len(authkey) < MIN_AUTHKEY_BYTES:
+        raise ValueError(
+            f"Dispatch shards need an authkey of at least {MIN_AUTHKEY_BYTES} bytes"
+        )
+
+
+def authkey_from_config(config) -> bytes:
+    """Return ``DISPATCH_SHARD_AUTHKEY``, refusing to run without one."""
+    if not config.DISPATCH_SHARD_AUTHKEY:
+        raise ValueError("DISPATCH_SHARD_AUTHKEY must be set to use dispatch shards")
+    authkey = config.DISPATCH_SHARD_AUTHKEY.encode()
+    check_authkey(authkey)
+    return authkey
+
+
+def parse_addresses(value: str) -> List[Address]:
+    """Parse ``"host:port,host:port"`` into socket addresses."""
+    addresses = []
+    for item in value.split(","):
+        host, _, port = item.strip().rpartition(":")
+        addresses.append((host or "127.0.0.1", int(port)))
+    return addresses
+
+
+def load_shard(
+    index: int, shard_count: int, region_size_deg: float, session=None, eta=None
+):
+    """Create a shard seeded with the available drivers it owns."""
+    from .models import Driver
+
+    shard = DispatchShard(eta=eta)
+    if session is not None:
+        partitioner = RegionPartitioner(shard_count, region_size_deg)
+        drivers = session.query(Driver).filter(
+            Driver.is_available == True,
+            Driver.current_latitude.isnot(None),
+            Driver.current_longitude.isnot(None),
+        )
+        for driver in drivers.yield_per(1000):
+            lat, lon = driver.current_latitude, driver.current_longitude
+            if partitioner.shard_for(lat, lon) == index:
+                shard.update_driver(driver.id, driver.phone_number, lat, lon)
+    return shard
+
+
+def spawn_local_shards(addresses: Sequence[Address], authkey: bytes) -> List[Process]:
+    """Start one empty shard process per address on this machine."""
+    processes = []
+    for address in addresses:
+        process = Process(target=serve, args=(address, authkey), daemon=True)
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point for running a shard."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    from .config import DevelopmentConfig
+    from .eta import EtaEstimator
+
+    parser = argparse.ArgumentParser(description="Run a dispatch shard")
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("--index", type=int, required=True)
+    args = parser.parse_args(argv)
+
+    config = DevelopmentConfig
+    try:
+        authkey = authkey_from_config(config)
+    except ValueError as e:
+        parser.error(str(e))
+    addresses = parse_addresses(config.DISPATCH_SHARDS or "")
+    engine = create_engine(config.SQLALCHEMY_DATABASE_URI)
+    with Session(engine) as session:
+        shard = load_shard(
+            args.index,
+            len(addresses),
+            config.DISPATCH_REGION_SIZE_DEG,
+            session,
+            EtaEstimator.from_file(config.ROAD_GRAPH_PATH),
+        )
+    print(f"Shard {args.index} serving {len(shard.drivers)} drivers")
+    serve(addresses[args.index], authkey, shard)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Domain signals emitted by database operations.
+
+In-memory services (surge pricing, live tracking, presence) subscribe to
+these instead of polling the database. Signals are blinker signals, the
+same mechanism Flask uses for its own signals.
+"""
+
+from blinker import Namespace
+
+_signals = Namespace()
+
+#: Sent with the ``Driver`` as sender and ``latitude``/``longitude`` kwargs.
+driver_location_updated = _signals.signal("driver-location-updated")
+
+#: Sent with the driver id as sender and an ``available`` kwarg.
+driver_availability_changed = _signals.signal("driver-availability-changed")
+
+#: Sent with the user id as sender and the pickup ``latitude``/``longitude``
+#: whenever a rider asks for a ride, even if no driver could be found.
+ride_requested = _signals.signal("ride-requested")
+
+#: Sent with the rider's user id as sender and ``ride_id``/``status`` kwargs
+#: whenever a ride is created or moves to a new status; accepts also carry
+#: the ``driver_id``.
+ride_status_changed = _signals.signal("ride-status-changed")
+
+#: Sent with the payer's user id as sender and a ``status`` kwarg whenever
+#: one of their payments settles or fails.
+payment_status_changed = _signals.signal("payment-status-changed")
+
+#: Sent with the user id as sender when a profile is updated or deleted.
+user_profile_changed = _signals.signal("user-profile-changed")
@@ -0,0 +1,254 @@
+"""Deduplicated, batched processing of Stripe webhook events.
+
+The webhook only verifies the signature and stores the raw event with
+``record_event``; the unique ``event_id`` makes Stripe's retries no-ops.
+``StripeEventConsumer`` later picks up unprocessed events in batches,
+updates every affected payment with one statement per outcome and hands
+the resulting WhatsApp messages to a notification queue.
+
+Several consumers may poll at once: a batch is claimed by a conditional
+update of ``processed_at`` (skipping rows locked by another consumer on
+PostgreSQL), so each event is applied by exactly one of them. Events that
+cannot be parsed are marked processed with an ``error`` instead of
+blocking the events behind them.
+"""
+
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+
+from .config import Config
+from .messages import TEMPLATES
+from .models import Driver, Payment, PaymentStatus, Ride, StripeEvent, User
+from .replica import note_writes
+from .signals import payment_status_changed
+
+PAYMENT_SUCCEEDED = "payment_intent.succeeded"
+PAYMENT_FAILED = "payment_intent.payment_failed"
+
+
+def record_event(session: Session, event_id: str, event_type: str, payload) -> bool:
+    """Store a verified webhook event.
+
+    Args:
+        session: Database session.
+        event_id: Stripe's ``evt_...`` id.
+        event_type: Stripe event type.
+        payload: Raw request body, as bytes or text.
+
+    Returns:
+        True if the event was new, False if it had already been received.
+    """
+    if isinstance(payload, bytes):
+        payload = payload.decode("utf-8")
+    session.add(StripeEvent(event_id=event_id, type=event_type, payload=payload))
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        return False
+    return True
+
+
+class StripeEventConsumer:
+    """Apply stored Stripe events to payments in batches."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        notify: Optional[Callable[[str, str], None]] = None,
+        batch_size: int = Config.STRIPE_EVENT_BATCH_SIZE,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ):
+        """Create a consumer.
+
+        Args:
+            session_factory: Returns a new database session.
+            notify: Queues a WhatsApp message as ``notify(phone_number, body)``.
+            batch_size: Maximum events handled per transaction.
+            clock: Source of ``completed_at`` and ``processed_at`` timestamps.
+        """
+        self.session_factory = session_factory
+        self.notify = notify
+        self.batch_size = batch_size
+        self.clock = clock
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+
+    def process_batch(self) -> int:
+        """Process up to ``batch_size`` pending events in one transaction.
+
+        Returns:
+            The number of events this consumer claimed and marked processed.
+        """
+        session = self.session_factory()
+        try:
+            candidates = session.scalars(
+                select(StripeEvent.id)
+                .where(StripeEvent.processed_at.is_(None))
+                .order_by(StripeEvent.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not candidates:
+                return 0
+
+            # Only events this update marks are ours; a consumer that got
+            # there first has already applied the rest
+            now = self.clock()
+            events = session.execute(
+                update(StripeEvent)
+                .where(
+                    StripeEvent.id.in_(candidates),
+                    StripeEvent.processed_at.is_(None),
+                )
+                .values(processed_at=now)
+                .returning(StripeEvent.id, StripeEvent.type, StripeEvent.payload)
+            ).all()
+
+            intents: Dict[str, List[str]] = {PAYMENT_SUCCEEDED: [], PAYMENT_FAILED: []}
+            for event in events:
+                if event.type not in intents:
+                    continue
+                try:
+                    intents[event.type].append(
+                        json.loads(event.payload)["data"]["object"]["id"]
+                    )
+                except (ValueError, KeyError, TypeError) as e:
+                    session.execute(
+                        update(StripeEvent)
+                        .where(StripeEvent.id == event.id)
+                        .values(error=f"Malformed payload: {e!r}"[:255])
+                    )
+
+            messages, completed = self._complete_payments(
+                session, intents[PAYMENT_SUCCEEDED], now
+            )
+            failed = self._fail_payments(session, intents[PAYMENT_FAILED])
+            note_writes(session, user_ids=completed | failed)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+        # Only notify once the payment changes are durable
+        for status, user_ids in (
+            (PaymentStatus.COMPLETED, completed),
+            (PaymentStatus.FAILED, failed),
+        ):
+            for user_id in user_ids:
+                payment_status_changed.send(user_id, status=status)
+        if self.notify is not None:
+            for phone_number, body in messages:
+                self.notify(phone_number, body)
+        return len(events)
+
+    def drain(self) -> int:
+        """Process batches until no pending events remain.
+
+        Returns:
+            The total number of events processed.
+        """
+        total = 0
+        while True:
+            processed = self.process_batch()
+            total += processed
+            if processed < self.batch_size:
+                return total
+
+    def wake(self) -> None:
+        """Ask the background thread to process new events now."""
+        self._wakeup.set()
+
+    def run_in_background(
+        self, interval: float = Config.STRIPE_EVENT_POLL_SECONDS
+    ) -> None:
+        """Start a daemon thread that drains events on wake or every ``interval``."""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                self._wakeup.wait(interval)
+                self._wakeup.clear()
+                try:
+                    self.drain()
+                except Exception:
+                    # Events stay pending and are retried on the next pass
+                    time.sleep(interval)
+
+        self._thread = threading.Thread(target=loop, name="stripe-events", daemon=True)
+        self._thread.start()
+
+    def _complete_payments(
+        self, session: Session, intent_ids: List[str], now: datetime
+    ) -> Tuple[List[tuple], Set[int]]:
+        if not intent_ids:
+            return [], set()
+        passenger = aliased(User)
+        rows = session.execute(
+            select(
+                Payment.id,
+                Payment.user_id,
+                Payment.amount,
+                passenger.phone_number.label("passenger_phone"),
+                Driver.phone_number.label("driver_phone"),
+            )
+            .join(Ride, Payment.ride_id == Ride.id)
+            .join(passenger, Ride.user_id == passenger.id)
+            .outerjoin(Driver, Ride.driver_id == Driver.id)
+            .where(
+                Payment.stripe_payment_intent_id.in_(intent_ids),
+                Payment.status != PaymentStatus.COMPLETED,
+            )
+        ).all()
+        if not rows:
+            return [], set()
+
+        session.execute(
+            update(Payment)
+            .where(Payment.id.in_([row.id for row in rows]))
+            .values(status=PaymentStatus.COMPLETED, completed_at=now)
+        )
+
+        messages = []
+        for row in rows:
+            messages.append(
+                (
+                    row.passenger_phone,
+                    TEMPLATES.render("payment_succeeded", row.passenger_phone),
+                )
+            )
+            if row.driver_phone:
+                messages.append(
+                    (
+                        row.driver_phone,
+                        TEMPLATES.render(
+                            "payment_received", row.driver_phone, amount=row.amount
+                        ),
+                    )
+                )
+        return messages, {row.user_id for row in rows}
+
+    def _fail_payments(self, session: Session, intent_ids: List[str]) -> Set[int]:
+        if not intent_ids:
+            return set()
+        # A later success wins over an earlier failure, never the reverse
+        pending = (
+            Payment.stripe_payment_intent_id.in_(intent_ids),
+            Payment.status == PaymentStatus.PENDING,
+        )
+        user_ids = set(session.scalars(select(Payment.user_id).where(*pending)))
+        if user_ids:
+            session.execute(
+                update(Payment).where(*pending).values(status=PaymentStatus.FAILED)
+            )
+        return user_ids
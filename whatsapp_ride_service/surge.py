@@ -0,0 +1,224 @@
+"""Surge pricing from live supply and demand per grid cell.
+
+Demand is the number of ride requests picked up in a cell over a sliding
+window. Each cell keeps a ring buffer of per-bucket counts plus a running
+total, so recording an event and reading the window are both O(1) and
+nothing is ever rescanned. Supply is the number of available drivers
+whose last known position is in the cell, maintained incrementally from
+location and availability signals.
+
+Multipliers are recomputed at most every ``recompute_seconds`` (lazily on
+read, or from a background thread) and looked up with a single dict access
+at quote time.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import signals
+from .config import Config
+from .geo import grid_cell
+
+Cell = Tuple[int, int]
+
+
+class RingCounter:
+    """Event count over a sliding window of fixed-size time buckets."""
+
+    __slots__ = ("bucket_seconds", "counts", "total", "_last")
+
+    def __init__(self, window_seconds: float, bucket_seconds: float):
+        """Create a counter covering ``window_seconds`` of history."""
+        buckets = max(1, int(round(window_seconds / bucket_seconds)))
+        self.bucket_seconds = bucket_seconds
+        self.counts: List[int] = [0] * buckets
+        self.total = 0
+        self._last = 0
+
+    def add(self, now: float, amount: int = 1) -> None:
+        """Record ``amount`` events at time ``now``."""
+        epoch = self._advance(now)
+        self.counts[epoch % len(self.counts)] += amount
+        self.total += amount
+
+    def value(self, now: float) -> int:
+        """Return the number of events inside the window ending at ``now``."""
+        self._advance(now)
+        return self.total
+
+    def _advance(self, now: float) -> int:
+        epoch = int(now // self.bucket_seconds)
+        if epoch <= self._last:
+            return self._last
+        size = len(self.counts)
+        # Expire buckets that fell out of the window; never more than one lap
+        for stale in range(max(self._last + 1, epoch - size + 1), epoch + 1):
+            slot = stale % size
+            self.total -= self.counts[slot]
+            self.counts[slot] = 0
+        self._last = epoch
+        return epoch
+
+
+class SurgeEngine:
+    """Compute per-cell surge multipliers from demand and supply."""
+
+    def __init__(
+        self,
+        cell_size_deg: float = Config.SURGE_CELL_SIZE_DEG,
+        window_seconds: float = Config.SURGE_WINDOW_SECONDS,
+        bucket_seconds: float = Config.SURGE_BUCKET_SECONDS,
+        recompute_seconds: float = Config.SURGE_RECOMPUTE_SECONDS,
+        sensitivity: float = Config.SURGE_SENSITIVITY,
+        max_multiplier: float = Config.SURGE_MAX_MULTIPLIER,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Create a surge engine.
+
+        Args:
+            cell_size_deg: Grid cell size in degrees.
+            window_seconds: Length of the demand window.
+            bucket_seconds: Resolution of the demand window.
+            recompute_seconds: Minimum interval between recomputations.
+            sensitivity: Multiplier increase per request in the window in
+                excess of available drivers.
+            max_multiplier: Upper bound for any multiplier.
+            clock: Monotonic time source.
+        """
+        self.cell_size_deg = cell_size_deg
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.recompute_seconds = recompute_seconds
+        self.sensitivity = sensitivity
+        self.max_multiplier = max_multiplier
+        self.clock = clock
+        self._demand: Dict[Cell, RingCounter] = {}
+        self._supply: Dict[Cell, int] = {}
+        self._driver_cells: Dict[int, Cell] = {}
+        self._multipliers: Dict[Cell, float] = {}
+        self._next_recompute = 0.0
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the background recompute thread has been started."""
+        return self._timer is not None
+
+    def cell(self, latitude: float, longitude: float) -> Cell:
+        """Return the surge cell containing a point."""
+        return grid_cell(latitude, longitude, self.cell_size_deg)
+
+    def record_request(self, latitude: float, longitude: float) -> None:
+        """Count a ride request picked up at the given point."""
+        cell = self.cell(latitude, longitude)
+        now = self.clock()
+        with self._lock:
+            counter = self._demand.get(cell)
+            if counter is None:
+                counter = RingCounter(self.window_seconds, self.bucket_seconds)
+                self._demand[cell] = counter
+            counter.add(now)
+
+    def update_driver(
+        self,
+        driver_id: int,
+        latitude: Optional[float],
+        longitude: Optional[float],
+        available: bool = True,
+    ) -> None:
+        """Move a driver's contribution to supply to its current cell."""
+        cell = None
+        if available and latitude is not None and longitude is not None:
+            cell = self.cell(latitude, longitude)
+        with self._lock:
+            previous = self._driver_cells.get(driver_id)
+            if previous == cell:
+                return
+            if previous is not None:
+                self._supply[previous] -= 1
+                if not self._supply[previous]:
+                    del self._supply[previous]
+                del self._driver_cells[driver_id]
+            if cell is not None:
+                self._supply[cell] = self._supply.get(cell, 0) + 1
+                self._driver_cells[driver_id] = cell
+
+    def set_driver_available(self, driver_id: int, available: bool) -> None:
+        """Add or remove a driver from supply without moving it."""
+        if available:
+            # The position is unknown until the next location update
+            return
+        self.update_driver(driver_id, None, None, available=False)
+
+    def seed_drivers(self, drivers: Iterable) -> None:
+        """Initialise supply from driver rows, e.g. at startup."""
+        for driver in drivers:
+            self.update_driver(
+                driver.id,
+                driver.current_latitude,
+                driver.current_longitude,
+                bool(driver.is_available),
+            )
+
+    def multiplier(self, latitude: float, longitude: float) -> float:
+        """Return the surge multiplier for a pickup at the given point."""
+        if self.clock() >= self._next_recompute:
+            self.recompute()
+        return self._multipliers.get(self.cell(latitude, longitude), 1.0)
+
+    def recompute(self) -> Dict[Cell, float]:
+        """Recompute multipliers for every cell with recent demand."""
+        now = self.clock()
+        multipliers = {}
+        with self._lock:
+            for cell, counter in list(self._demand.items()):
+                demand = counter.value(now)
+                if not demand:
+                    del self._demand[cell]
+                    continue
+                excess = demand - self._supply.get(cell, 0)
+                if excess > 0:
+                    value = min(self.max_multiplier, 1.0 + self.sensitivity * excess)
+                    multipliers[cell] = round(value, 1)
+            self._next_recompute = now + self.recompute_seconds
+        # Swap the whole dict so readers never see a half-built table
+        self._multipliers = multipliers
+        return multipliers
+
+    def run_in_background(self) -> None:
+        """Start a daemon thread that recomputes multipliers on a timer."""
+        if self._timer is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(self.recompute_seconds)
+                self.recompute()
+
+        self._timer = threading.Thread(target=loop, name="surge", daemon=True)
+        self._timer.start()
+
+    def on_driver_location(self, driver, **kwargs) -> None:
+        """Receiver for ``signals.driver_location_updated``."""
+        self.update_driver(
+            driver.id,
+            kwargs.get("latitude", driver.current_latitude),
+            kwargs.get("longitude", driver.current_longitude),
+            bool(driver.is_available),
+        )
+
+    def on_driver_availability(self, driver_id, **kwargs) -> None:
+        """Receiver for ``signals.driver_availability_changed``."""
+        self.set_driver_available(driver_id, kwargs["available"])
+
+    def on_ride_requested(self, user_id, **kwargs) -> None:
+        """Receiver for ``signals.ride_requested``."""
+        self.record_request(kwargs["latitude"], kwargs["longitude"])
+
+    def connect(self) -> None:
+        """Subscribe this engine to the domain signals."""
+        signals.driver_location_updated.connect(self.on_driver_location)
+        signals.driver_availability_changed.connect(self.on_driver_availability)
+        signals.ride_requested.connect(self.on_ride_requested)
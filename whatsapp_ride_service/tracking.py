@@ -0,0 +1,270 @@
+"""Live driver tracking over in-process pub/sub.
+
+``LocationHub`` receives driver location updates (via the
+``driver_location_updated`` signal) and fans them out to subscribers keyed
+by driver id or by ride id. Each subscriber owns a bounded buffer, so a
+slow client only ever loses its own oldest updates and never slows the
+publisher. The latest position per driver is kept in memory, which lets
+tracking endpoints answer without reading the database.
+
+Rides are bound to their driver when accepted and unbound when they end,
+from ``ride_status_changed``, so tracking follows a ride whichever app or
+route changed its status. Listeners, such as ``ProgressNotifier``, only
+follow the driver to the pickup and are dropped once the ride starts.
+Publishing runs inside the location write's signal, so listener errors
+are logged rather than raised.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from . import signals
+from .config import Config
+from .geo import haversine_km
+from .messages import TEMPLATES
+from .models import RideStatus
+
+logger = logging.getLogger(__name__)
+
+Topic = Tuple[str, int]
+
+
+class LocationEvent(NamedTuple):
+    """A driver position at a point in time."""
+
+    driver_id: int
+    latitude: float
+    longitude: float
+    timestamp: float
+
+    def to_dict(self) -> dict:
+        """Return the event as a JSON-serialisable dict."""
+        return self._asdict()
+
+
+class RideBinding(NamedTuple):
+    """Who is tracking whom for an active ride."""
+
+    driver_id: int
+    user_id: int
+
+
+class Subscription:
+    """A bounded queue of location events for one client."""
+
+    def __init__(self, hub: "LocationHub", topic: Topic, buffer_size: int):
+        """Create a subscription; use ``LocationHub.subscribe`` instead."""
+        self.hub = hub
+        self.topic = topic
+        self.dropped = 0
+        self._events: Deque[LocationEvent] = deque(maxlen=buffer_size)
+        self._ready = threading.Condition()
+        self._closed = False
+
+    def push(self, event: LocationEvent) -> None:
+        """Queue an event, dropping the oldest one if the buffer is full."""
+        with self._ready:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(event)
+            self._ready.notify()
+
+    def get(self, timeout: Optional[float] = None) -> List[LocationEvent]:
+        """Wait up to ``timeout`` seconds and drain every queued event."""
+        with self._ready:
+            if not self._events and not self._closed:
+                self._ready.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    @property
+    def closed(self) -> bool:
+        """Whether the subscription has been closed."""
+        return self._closed
+
+    def close(self) -> None:
+        """Unsubscribe and wake any waiting reader."""
+        self.hub.unsubscribe(self)
+        with self._ready:
+            self._closed = True
+            self._ready.notify_all()
+
+
+class LocationHub:
+    """Fan out driver locations to ride and driver subscribers."""
+
+    def __init__(
+        self,
+        buffer_size: int = Config.TRACKING_BUFFER_SIZE,
+        clock: Callable[[], float] = time.time,
+    ):
+        """Create a hub whose subscribers buffer up to ``buffer_size`` events."""
+        self.buffer_size = buffer_size
+        self.clock = clock
+        self._subscribers: Dict[Topic, Set[Subscription]] = {}
+        self._listeners: Dict[int, List[Callable[[LocationEvent], None]]] = {}
+        self._latest: Dict[int, LocationEvent] = {}
+        self._rides: Dict[int, RideBinding] = {}
+        self._driver_rides: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def bind_ride(self, ride_id: int, driver_id: int, user_id: int) -> None:
+        """Route a driver's updates to the subscribers of a ride."""
+        with self._lock:
+            self._rides[ride_id] = RideBinding(driver_id, user_id)
+            self._driver_rides[driver_id] = ride_id
+
+    def unbind_ride(self, ride_id: int) -> None:
+        """Stop tracking a ride and close its subscriptions."""
+        with self._lock:
+            binding = self._rides.pop(ride_id, None)
+            if binding and self._driver_rides.get(binding.driver_id) == ride_id:
+                del self._driver_rides[binding.driver_id]
+            self._listeners.pop(ride_id, None)
+            subscriptions = self._subscribers.pop(("ride", ride_id), set())
+        for subscription in subscriptions:
+            subscription.close()
+
+    def ride_binding(self, ride_id: int) -> Optional[RideBinding]:
+        """Return the driver and passenger of a tracked ride."""
+        return self._rides.get(ride_id)
+
+    def add_listener(
+        self, ride_id: int, listener: Callable[[LocationEvent], None]
+    ) -> None:
+        """Call ``listener`` for each update of a ride until it is picked up.
+
+        Listeners run synchronously on the publishing thread, so they should
+        hand slow work, like sending messages, to a queue.
+        """
+        with self._lock:
+            self._listeners.setdefault(ride_id, []).append(listener)
+
+    def subscribe(
+        self, ride_id: Optional[int] = None, driver_id: Optional[int] = None
+    ) -> Subscription:
+        """Subscribe to a ride or to a driver.
+
+        The latest known position, if any, is queued immediately so clients
+        do not wait for the next update to draw the map.
+        """
+        if (ride_id is None) == (driver_id is None):
+            raise ValueError("Subscribe to exactly one of ride_id or driver_id")
+        topic: Topic = (
+            ("ride", ride_id) if ride_id is not None else ("driver", driver_id)
+        )
+        subscription = Subscription(self, topic, self.buffer_size)
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+            if driver_id is None:
+                binding = self._rides.get(ride_id)
+                driver_id = binding.driver_id if binding else None
+            latest = self._latest.get(driver_id)
+        if latest is not None:
+            subscription.push(latest)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove a subscription."""
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.topic]
+
+    def latest(self, driver_id: int) -> Optional[LocationEvent]:
+        """Return the last published position of a driver."""
+        return self._latest.get(driver_id)
+
+    def publish(
+        self, driver_id: int, latitude: float, longitude: float
+    ) -> LocationEvent:
+        """Record a driver position and deliver it to every subscriber."""
+        event = LocationEvent(driver_id, latitude, longitude, self.clock())
+        with self._lock:
+            self._latest[driver_id] = event
+            subscribers = list(self._subscribers.get(("driver", driver_id), ()))
+            ride_id = self._driver_rides.get(driver_id)
+            listeners = []
+            if ride_id is not None:
+                subscribers.extend(self._subscribers.get(("ride", ride_id), ()))
+                listeners = list(self._listeners.get(ride_id, ()))
+        for subscription in subscribers:
+            subscription.push(event)
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception:
+                logger.exception("Location listener for ride %s failed", ride_id)
+        return event
+
+    def on_driver_location(self, driver, **kwargs) -> None:
+        """Receiver for ``signals.driver_location_updated``."""
+        self.publish(driver.id, kwargs["latitude"], kwargs["longitude"])
+
+    def on_ride_status(self, user_id, **kwargs) -> None:
+        """Receiver for ``signals.ride_status_changed``."""
+        status = kwargs["status"]
+        if status == RideStatus.ACCEPTED and kwargs.get("driver_id") is not None:
+            self.bind_ride(kwargs["ride_id"], kwargs["driver_id"], user_id)
+        elif status == RideStatus.IN_PROGRESS:
+            # The passenger is on board; stop "driver is on the way" updates
+            with self._lock:
+                self._listeners.pop(kwargs["ride_id"], None)
+        elif status in (RideStatus.COMPLETED, RideStatus.CANCELLED):
+            self.unbind_ride(kwargs["ride_id"])
+
+    def connect(self) -> None:
+        """Subscribe this hub to the domain signals."""
+        signals.driver_location_updated.connect(self.on_driver_location)
+        signals.ride_status_changed.connect(self.on_ride_status)
+
+
+class ProgressNotifier:
+    """Throttled "your driver is on the way" messages for a passenger."""
+
+    def __init__(
+        self,
+        send: Callable[[str], None],
+        pickup: Tuple[float, float],
+        min_interval: float = Config.TRACKING_PROGRESS_INTERVAL_SECONDS,
+        speed_kmh: float = Config.ETA_FALLBACK_SPEED_KMH,
+        clock: Callable[[], float] = time.monotonic,
+        phone: Optional[str] = None,
+    ):
+        """Create a notifier.
+
+        Args:
+            send: Hands a WhatsApp message for the passenger to a queue,
+                e.g. ``NotificationQueue.enqueue``; it is called while a
+                location update is being published.
+            pickup: ``(latitude, longitude)`` of the pickup.
+            min_interval: Minimum seconds between two messages.
+            speed_kmh: Speed used to turn remaining distance into minutes.
+            clock: Monotonic time source.
+            phone: The passenger's E.164 number, which picks the language.
+        """
+        self.send = send
+        self.pickup = pickup
+        self.phone = phone
+        self.min_interval = min_interval
+        self.speed_kmh = speed_kmh
+        self.clock = clock
+        self._last_sent: Optional[float] = None
+
+    def __call__(self, event: LocationEvent) -> None:
+        """Send a progress message unless one went out recently."""
+        now = self.clock()
+        if self._last_sent is not None and now - self._last_sent < self.min_interval:
+            return
+        self._last_sent = now
+        km = haversine_km(event.latitude, event.longitude, *self.pickup)
+        minutes = max(1, round(km / self.speed_kmh * 60))
+        self.send(
+            TEMPLATES.render("driver_progress", self.phone, km=km, minutes=minutes)
+        )